@@ -0,0 +1,397 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pytz
+from utils.date_parser import DateParserService, LANGUAGES
+from utils.tz_utils import get_timezone
+
+TIMEZONES = ['Europe/Minsk', 'Europe/Moscow', 'Europe/Berlin', 'America/New_York', 'Asia/Tokyo', 'Asia/Kolkata']
+
+# Local reference times with non-zero microseconds, like datetime.now() in the handlers
+REFERENCE_TIMES = [
+    datetime(2026, 1, 15, 23, 50, 0, 250000),
+    datetime(2026, 7, 3, 8, 5, 42, 500000),
+    datetime(2026, 10, 21, 19, 30, 15, 123456),
+    datetime(2026, 12, 31, 21, 10, 3, 999999),
+]
+
+# Local times used in phrases; 02:00-03:59 is left out so no phrase names a time skipped or repeated by DST
+TIMES = [(7, 0), (8, 30), (9, 0), (10, 15), (12, 0), (14, 30), (18, 0), (19, 45), (21, 0), (23, 30)]
+
+RU_WEEKDAYS = ['понедельник', 'вторник', 'среду', 'четверг', 'пятницу', 'субботу', 'воскресенье']
+EN_WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+RU_MONTHS = ['января', 'февраля', 'марта', 'апреля', 'мая', 'июня', 'июля', 'августа', 'сентября', 'октября',
+             'ноября', 'декабря']
+EN_MONTHS = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October',
+             'November', 'December']
+
+RU_UNITS = {
+    'minutes': ('минуту', 'минуты', 'минут'),
+    'hours': ('час', 'часа', 'часов'),
+    'days': ('день', 'дня', 'дней'),
+}
+AMOUNTS = {
+    'minutes': [1, 2, 3, 5, 10, 15, 20, 25, 30, 40, 45, 90],
+    'hours': [1, 2, 3, 4, 5, 6, 8, 12, 24],
+    'days': [1, 2, 3, 5, 7, 10],
+}
+
+
+def ru_plural(n: int, forms: tuple[str, str, str]) -> str:
+    if n % 10 == 1 and n % 100 != 11:
+        return forms[0]
+    if 2 <= n % 10 <= 4 and not 12 <= n % 100 <= 14:
+        return forms[1]
+    return forms[2]
+
+
+def twelve_hour(hour: int) -> tuple[int, str]:
+    return (hour % 12 or 12), ('am' if hour < 12 else 'pm')
+
+
+def reference_times(tz_name: str) -> list[datetime]:
+    tz = get_timezone(tz_name)
+    refs = [tz.localize(ref) for ref in REFERENCE_TIMES]
+    # DST edges: the evening before and the hour after each transition of the year
+    for transition in getattr(tz, '_utc_transition_times', []):
+        if transition.year == 2026:
+            for shift in (timedelta(hours=-20), timedelta(hours=-2), timedelta(hours=1)):
+                refs.append(pytz.utc.localize(transition + shift + timedelta(seconds=17, microseconds=345678))
+                            .astimezone(tz))
+    return refs
+
+
+def local_result(tz, day, hour: int, minute: int) -> datetime:
+    return tz.localize(datetime(day.year, day.month, day.day, hour, minute)).astimezone(pytz.utc)
+
+
+# Each generator returns (category, phrase, expected aware UTC datetime) for a local reference time
+def relative_ru(rng, tz, now):
+    unit = rng.choice(list(AMOUNTS))
+    n = rng.choice(AMOUNTS[unit])
+    if n == 1 and unit != 'days' and rng.random() < 0.5:
+        phrase = f"через {RU_UNITS[unit][0]}"
+    else:
+        phrase = f"через {n} {ru_plural(n, RU_UNITS[unit])}"
+    return 'relative_ru', phrase, now.astimezone(pytz.utc) + timedelta(**{unit: n})
+
+
+def relative_ru_words(rng, tz, now):
+    phrase, delta = rng.choice([
+        ('через полчаса', timedelta(minutes=30)),
+        ('через полтора часа', timedelta(minutes=90)),
+        ('через пять минут', timedelta(minutes=5)),
+        ('через десять минут', timedelta(minutes=10)),
+        ('через два часа', timedelta(hours=2)),
+        ('через три дня', timedelta(days=3)),
+    ])
+    return 'relative_ru_words', phrase, now.astimezone(pytz.utc) + delta
+
+
+def relative_en(rng, tz, now):
+    unit = rng.choice(list(AMOUNTS))
+    n = rng.choice(AMOUNTS[unit])
+    if n == 1:
+        phrase = rng.choice([f"in 1 {unit[:-1]}", f"in a {unit[:-1]}" if unit != 'hours' else 'in an hour'])
+    else:
+        phrase = f"in {n} {unit}"
+    return 'relative_en', phrase, now.astimezone(pytz.utc) + timedelta(**{unit: n})
+
+
+def day_anchor_ru(rng, tz, now):
+    offset, word = rng.choice([(0, 'сегодня'), (1, 'завтра'), (2, 'послезавтра')])
+    hour, minute = rng.choice(TIMES)
+    day = now.date() + timedelta(days=offset)
+    if offset == 0 and (hour, minute) <= (now.hour, now.minute):
+        day += timedelta(days=1)
+        word = 'завтра'
+    return 'day_anchor_ru', f"{word} в {hour:02d}:{minute:02d}", local_result(tz, day, hour, minute)
+
+
+def day_anchor_en(rng, tz, now):
+    hour, minute = rng.choice(TIMES)
+    h12, meridiem = twelve_hour(hour)
+    time_text = f"{h12} {meridiem}" if minute == 0 else f"{h12}:{minute:02d} {meridiem}"
+    day = now.date() + timedelta(days=1)
+    word = 'tomorrow'
+    if rng.random() < 0.4 and (hour, minute) > (now.hour, now.minute):
+        day, word = now.date(), 'today'
+    return 'day_anchor_en', f"{word} at {time_text}", local_result(tz, day, hour, minute)
+
+
+def tomorrow_same_time(rng, tz, now):
+    word = rng.choice(['завтра', 'tomorrow'])
+    day = now.date() + timedelta(days=1)
+    expected = tz.localize(datetime.combine(day, now.time().replace(tzinfo=None))).astimezone(pytz.utc)
+    return 'tomorrow_same_time', word, expected
+
+
+def weekday_ru(rng, tz, now):
+    weekday = rng.randrange(7)
+    hour, minute = rng.choice(TIMES)
+    day = now.date() + timedelta(days=(weekday - now.weekday() - 1) % 7 + 1)
+    preposition = 'во' if weekday == 1 else 'в'
+    if hour >= 12 and minute == 0 and rng.random() < 0.5:
+        phrase = f"{preposition} {RU_WEEKDAYS[weekday]} в {hour - 12 if hour > 12 else hour} " \
+                 f"{'вечера' if hour >= 17 else 'дня'}"
+    else:
+        phrase = f"{preposition} {RU_WEEKDAYS[weekday]} в {hour:02d}:{minute:02d}"
+    return 'weekday_ru', phrase, local_result(tz, day, hour, minute)
+
+
+def weekday_en(rng, tz, now):
+    weekday = rng.randrange(7)
+    hour, minute = rng.choice(TIMES)
+    h12, meridiem = twelve_hour(hour)
+    day = now.date() + timedelta(days=(weekday - now.weekday() - 1) % 7 + 1)
+    phrase = f"on {EN_WEEKDAYS[weekday]} at {h12}:{minute:02d} {meridiem}"
+    return 'weekday_en', phrase, local_result(tz, day, hour, minute)
+
+
+def numeric_date(rng, tz, now):
+    day = now.date() + timedelta(days=rng.randint(1, 300))
+    hour, minute = rng.choice(TIMES)
+    if rng.random() < 0.5:
+        phrase = f"{day.day:02d}.{day.month:02d}.{day.year} {hour:02d}:{minute:02d}"
+    else:
+        phrase = f"{day.day:02d}.{day.month:02d} {hour:02d}:{minute:02d}"
+    return 'numeric_date', phrase, local_result(tz, day, hour, minute)
+
+
+def month_name_date(rng, tz, now):
+    day = now.date() + timedelta(days=rng.randint(1, 300))
+    hour, minute = rng.choice(TIMES)
+    if rng.random() < 0.6:
+        phrase = f"{day.day} {RU_MONTHS[day.month - 1]} в {hour:02d}:{minute:02d}"
+    else:
+        phrase = f"{EN_MONTHS[day.month - 1]} {day.day} at {hour:02d}:{minute:02d}"
+    return 'month_name_date', phrase, local_result(tz, day, hour, minute)
+
+
+def time_only(rng, tz, now):
+    hour, minute = rng.choice(TIMES)
+    day = now.date() if (hour, minute) > (now.hour, now.minute) else now.date() + timedelta(days=1)
+    h12, meridiem = twelve_hour(hour)
+    phrase = rng.choice([
+        f"в {hour:02d}:{minute:02d}",
+        f"at {h12}:{minute:02d} {meridiem}",
+    ])
+    return 'time_only', phrase, local_result(tz, day, hour, minute)
+
+
+GENERATORS = [
+    (relative_ru, 5), (relative_ru_words, 1), (relative_en, 2), (day_anchor_ru, 4), (day_anchor_en, 2),
+    (tomorrow_same_time, 1), (weekday_ru, 2), (weekday_en, 1), (numeric_date, 2), (month_name_date, 2),
+    (time_only, 2),
+]
+
+
+# Written out by hand rather than derived from the generators above (which follow the fast path's own rules),
+# so the fast path is also checked against phrasings and answers it wasn't built from.
+# (timezone, local reference, phrase, expected local time)
+HANDWRITTEN = [
+    ('Europe/Minsk', datetime(2026, 10, 19, 14, 20, 5, 123456), 'завтра в 9', datetime(2026, 10, 20, 9, 0)),
+    ('Europe/Minsk', datetime(2026, 10, 19, 14, 20, 5, 123456), 'Завтра в 9:00', datetime(2026, 10, 20, 9, 0)),
+    ('Europe/Minsk', datetime(2026, 10, 19, 14, 20, 5, 123456), 'послезавтра в 18:00', datetime(2026, 10, 21, 18, 0)),
+    ('Europe/Minsk', datetime(2026, 10, 19, 14, 20, 5, 123456), 'сегодня в 23:59', datetime(2026, 10, 19, 23, 59)),
+    ('Europe/Minsk', datetime(2026, 10, 19, 14, 20, 5, 123456), 'в 19:00', datetime(2026, 10, 19, 19, 0)),
+    ('Europe/Minsk', datetime(2026, 10, 19, 14, 20, 5, 123456), 'в 9:00', datetime(2026, 10, 20, 9, 0)),
+    ('Europe/Minsk', datetime(2026, 10, 19, 14, 20, 5, 123456), 'через час', datetime(2026, 10, 19, 15, 20, 5, 123456)),
+    ('Europe/Minsk', datetime(2026, 10, 19, 14, 20, 5, 123456), 'через 2 дня',
+     datetime(2026, 10, 21, 14, 20, 5, 123456)),
+    ('Europe/Minsk', datetime(2026, 10, 19, 14, 20, 5, 123456), 'в пятницу в 10:30', datetime(2026, 10, 23, 10, 30)),
+    ('Europe/Minsk', datetime(2026, 10, 19, 14, 20, 5, 123456), 'в понедельник в 8:00', datetime(2026, 10, 26, 8, 0)),
+    ('Europe/Minsk', datetime(2026, 10, 19, 14, 20, 5, 123456), 'в субботу в 7 вечера', datetime(2026, 10, 24, 19, 0)),
+    ('Europe/Minsk', datetime(2026, 10, 19, 14, 20, 5, 123456), '25 декабря в 12:00', datetime(2026, 12, 25, 12, 0)),
+    ('Europe/Minsk', datetime(2026, 10, 19, 14, 20, 5, 123456), '1 января в 00:30', datetime(2027, 1, 1, 0, 30)),
+    ('Europe/Minsk', datetime(2026, 10, 19, 14, 20, 5, 123456), '05.11.2026 17:15', datetime(2026, 11, 5, 17, 15)),
+    ('Asia/Tokyo', datetime(2026, 7, 3, 8, 5, 42, 500000), '10.07 15:00', datetime(2026, 7, 10, 15, 0)),
+    ('Asia/Tokyo', datetime(2026, 7, 3, 8, 5, 42, 500000), 'через 45 минут', datetime(2026, 7, 3, 8, 50, 42, 500000)),
+    ('Asia/Tokyo', datetime(2026, 7, 3, 8, 5, 42, 500000), 'в 07:30', datetime(2026, 7, 4, 7, 30)),
+    ('Asia/Tokyo', datetime(2026, 7, 3, 8, 5, 42, 500000), 'at 6:00 pm', datetime(2026, 7, 3, 18, 0)),
+    # Across the end of DST in New York (1 November 2026, 02:00)
+    ('America/New_York', datetime(2026, 10, 30, 20, 0, 0, 500000), 'tomorrow at 8 am', datetime(2026, 10, 31, 8, 0)),
+    ('America/New_York', datetime(2026, 10, 30, 20, 0, 0, 500000), 'on sunday at 9:00 am', datetime(2026, 11, 1, 9, 0)),
+    ('America/New_York', datetime(2026, 10, 30, 20, 0, 0, 500000), 'on monday at 10:00 am',
+     datetime(2026, 11, 2, 10, 0)),
+    ('America/New_York', datetime(2026, 10, 30, 20, 0, 0, 500000), 'in 15 minutes',
+     datetime(2026, 10, 30, 20, 15, 0, 500000)),
+    ('America/New_York', datetime(2026, 10, 30, 20, 0, 0, 500000), 'tomorrow', datetime(2026, 10, 31, 20, 0, 0, 500000)),
+    # Across the start of DST in Berlin (29 March 2026, 02:00): a calendar day keeps the wall clock,
+    # a number of hours keeps the elapsed time
+    ('Europe/Berlin', datetime(2026, 3, 28, 21, 0, 0, 250000), 'завтра в 10:00', datetime(2026, 3, 29, 10, 0)),
+    ('Europe/Berlin', datetime(2026, 3, 28, 21, 0, 0, 250000), 'завтра', datetime(2026, 3, 29, 21, 0, 0, 250000)),
+    ('Europe/Berlin', datetime(2026, 3, 28, 21, 0, 0, 250000), 'через 12 часов',
+     datetime(2026, 3, 29, 10, 0, 0, 250000)),
+]
+
+
+def handwritten_cases() -> list[dict]:
+    corpus = []
+    for tz_name, reference, phrase, expected in HANDWRITTEN:
+        tz = get_timezone(tz_name)
+        corpus.append({
+            'category': 'handwritten',
+            'text': phrase,
+            'timezone': tz_name,
+            'reference': tz.localize(reference).isoformat(),
+            'expected': tz.localize(expected).astimezone(pytz.utc).isoformat(),
+        })
+    return corpus
+
+
+def add_noise(rng, phrase: str) -> str:
+    roll = rng.random()
+    if roll < 0.15:
+        return phrase.capitalize()
+    if roll < 0.2:
+        return phrase.replace(' ', '  ', 1)
+    return phrase
+
+
+def build_corpus(size: int, seed: int) -> list[dict]:
+    rng = random.Random(seed)
+    contexts = [(tz_name, ref) for tz_name in TIMEZONES for ref in reference_times(tz_name)]
+    generators = [generator for generator, weight in GENERATORS for _ in range(weight)]
+
+    corpus = []
+    for i in range(size):
+        tz_name, ref = contexts[i % len(contexts)]
+        category, phrase, expected = rng.choice(generators)(rng, get_timezone(tz_name), ref)
+        corpus.append({
+            'category': category,
+            'text': add_noise(rng, phrase),
+            'timezone': tz_name,
+            'reference': ref.isoformat(),
+            'expected': expected.isoformat(),
+        })
+    return corpus
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_sync(parse, corpus: list[dict]) -> tuple[list, list[float], float]:
+    results, latencies = [], []
+    started = time.perf_counter()
+    for case in corpus:
+        reference = datetime.fromisoformat(case['reference'])
+        t0 = time.perf_counter()
+        results.append(parse(case['text'], case['timezone'], reference))
+        latencies.append(time.perf_counter() - t0)
+    return results, latencies, time.perf_counter() - started
+
+
+async def run_pool(service: DateParserService, corpus: list[dict], concurrency: int) -> tuple[list, list[float], float]:
+    await service.start()
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = [0.0] * len(corpus)
+
+    async def parse(index: int, case: dict):
+        async with semaphore:
+            t0 = time.perf_counter()
+            result = await service.parse_natural_text_async(
+                case['text'], case['timezone'], datetime.fromisoformat(case['reference']))
+            latencies[index] = time.perf_counter() - t0
+            return result
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(parse(i, case) for i, case in enumerate(corpus)))
+    elapsed = time.perf_counter() - started
+    service.close()
+    return results, latencies, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Latency, throughput and accuracy of natural-language date parsing')
+    parser.add_argument('--size', type=int, default=3000, help='number of generated cases')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--corpus', help='read cases from this JSONL file instead of generating them')
+    parser.add_argument('--write-corpus', help='write the generated cases to this JSONL file and exit')
+    parser.add_argument('--mode', choices=['service', 'no-cache', 'dateparser', 'pool'], default='service',
+                        help='service: cache + fast path + dateparser; no-cache: without the memo; '
+                             'dateparser: plain dateparser.parse; pool: async API through the process pool')
+    parser.add_argument('--repeat', type=int, default=1, help='run the corpus this many times (exercises the memo)')
+    parser.add_argument('--concurrency', type=int, default=8, help='in-flight parses in pool mode')
+    parser.add_argument('--show-failures', type=int, default=10)
+    args = parser.parse_args()
+
+    if args.corpus:
+        with open(args.corpus, encoding='utf-8') as f:
+            corpus = [json.loads(line) for line in f if line.strip()]
+    else:
+        corpus = build_corpus(args.size, args.seed) + handwritten_cases()
+
+    if args.write_corpus:
+        with open(args.write_corpus, 'w', encoding='utf-8') as f:
+            for case in corpus:
+                f.write(json.dumps(case, ensure_ascii=False) + '\n')
+        print(f"Wrote {len(corpus)} cases to {args.write_corpus}")
+        return
+
+    corpus = corpus * args.repeat
+
+    if args.mode == 'pool':
+        service = DateParserService(cache_size=0)
+        results, latencies, elapsed = asyncio.run(run_pool(service, corpus, args.concurrency))
+    elif args.mode == 'dateparser':
+        import dateparser
+
+        def parse(text, tz_name, reference):
+            settings = DateParserService._dateparser_settings(tz_name, reference.astimezone(get_timezone(tz_name)))
+            return dateparser.parse(text, settings=settings, languages=LANGUAGES)
+
+        parse('завтра в 10:00', 'UTC', datetime.now(pytz.utc))
+        results, latencies, elapsed = run_sync(parse, corpus)
+    else:
+        service = DateParserService(cache_size=0 if args.mode == 'no-cache' else None)
+        service.parse_natural_text('завтра в 10:00', 'UTC', datetime.now(pytz.utc))
+        results, latencies, elapsed = run_sync(service.parse_natural_text, corpus)
+        print(f"Parser stats: {service.stats()}")
+
+    totals, correct = Counter(), Counter()
+    failures = []
+    for case, result in zip(corpus, results):
+        expected = datetime.fromisoformat(case['expected'])
+        totals[case['category']] += 1
+        if result is not None and result == expected:
+            correct[case['category']] += 1
+        elif len(failures) < args.show_failures:
+            failures.append((case, result))
+
+    latencies.sort()
+    print(f"\nMode: {args.mode}, cases: {len(corpus)}")
+    print(f"Throughput: {len(corpus) / elapsed:,.0f} parses/s ({elapsed:.2f} s total)")
+    print("Latency (us): " + ", ".join(
+        f"{label} {percentile(latencies, q) * 1e6:,.0f}"
+        for label, q in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('max', 1.0))
+    ) + f", mean {statistics.fmean(latencies) * 1e6:,.0f}")
+
+    print(f"\n{'category':<20}{'cases':>8}{'accuracy':>10}")
+    for category in sorted(totals):
+        print(f"{category:<20}{totals[category]:>8}{correct[category] / totals[category]:>10.1%}")
+    print(f"{'total':<20}{sum(totals.values()):>8}{sum(correct.values()) / sum(totals.values()):>10.1%}")
+
+    if failures:
+        print("\nFirst failures:")
+        for case, result in failures:
+            got = result.isoformat() if result else None
+            print(f"  [{case['timezone']} @ {case['reference']}] {case['text']!r}: "
+                  f"expected {case['expected']}, got {got}")
+
+
+if __name__ == '__main__':
+    main()
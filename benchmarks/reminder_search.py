@@ -0,0 +1,175 @@
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects import postgresql
+from benchmarks.webhook_replay import percentile
+from database.database import db
+from database.models import Reminder
+from database.reminder_queries import search_reminders, search_statement
+
+# Benchmark users live far above real Telegram ids so they can be told apart and removed
+BASE_USER_ID = 9_000_000_000_000
+HEAVY_USER_ID = BASE_USER_ID - 1
+
+VERBS = ['купить', 'позвонить', 'оплатить', 'записаться', 'проверить', 'забрать', 'отправить', 'подготовить',
+         'buy', 'call', 'pay', 'book', 'review', 'send']
+NOUNS = ['молоко', 'маме', 'интернет', 'врачу', 'отчёт', 'посылку', 'квартиру', 'документы', 'билеты', 'подарок',
+         'машину', 'страховку', 'презентацию', 'договор', 'ключи', 'meeting', 'invoice', 'tickets', 'report', 'dentist',
+         'groceries', 'flowers', 'passport', 'insurance', 'deadline']
+DETAILS = ['до пятницы', 'не забыть', 'срочно', 'после работы', 'утром', 'вместе с детьми', 'в центре города',
+           'before lunch', 'at the office', 'asap', 'next week', 'on the way home']
+
+# (kind, query): inflected forms of the stored words check that stemming happens on both sides
+QUERIES = [
+    ('word', 'интернет'),
+    ('inflected', 'молока'),
+    ('inflected', 'документов'),
+    ('english', 'meetings'),
+    ('two words', 'оплатить страховка'),
+    ('phrase', '"позвонить маме"'),
+    ('exclude', 'билеты -срочно'),
+    ('mixed', 'buy ключей'),
+    ('miss', 'вертолёт'),
+]
+
+SEED_SQL = text("""
+    INSERT INTO reminders (user_id, title, description, reminder_time, timezone, is_recurring, recurring_pattern,
+                           is_sent, created_at)
+    SELECT CASE WHEN random() < CAST(:heavy_share AS float) THEN CAST(:heavy_user AS bigint)
+                ELSE CAST(:base_user AS bigint) + g % CAST(:users AS int) END,
+           verbs[1 + floor(random() * array_length(verbs, 1))::int] || ' ' ||
+               nouns[1 + floor(random() * array_length(nouns, 1))::int],
+           CASE WHEN random() < 0.5 THEN details[1 + floor(random() * array_length(details, 1))::int] || ', ' ||
+               nouns[1 + floor(random() * array_length(nouns, 1))::int] END,
+           now() + random() * interval '365 days', 'Europe/Minsk', false, NULL, random() < 0.1, now()
+    FROM generate_series(CAST(:start AS int), CAST(:stop AS int)) AS g,
+         CAST(:verbs AS text[]) AS verbs, CAST(:nouns AS text[]) AS nouns, CAST(:details AS text[]) AS details
+""")
+
+
+async def seed(args):
+    async with db.get_session() as session:
+        existing = await session.scalar(
+            select(func.count()).select_from(Reminder).where(Reminder.user_id >= HEAVY_USER_ID))
+    if existing == args.rows:
+        print(f"Reusing {existing} seeded reminders")
+        return
+
+    await cleanup()
+    started = time.perf_counter()
+    async with db.get_session() as session:
+        await session.execute(text(
+            "INSERT INTO users (telegram_id, username, name, city, timezone, is_active) "
+            "SELECT id, 'bench_' || id, 'bench', 'Minsk', 'Europe/Minsk', true "
+            "FROM generate_series(CAST(:heavy AS bigint), CAST(:last AS bigint)) AS id"
+        ), {'heavy': HEAVY_USER_ID, 'last': BASE_USER_ID + args.users - 1})
+
+        batch = 100_000
+        for start in range(0, args.rows, batch):
+            await session.execute(SEED_SQL, {
+                'heavy_share': args.heavy_share, 'heavy_user': HEAVY_USER_ID, 'base_user': BASE_USER_ID,
+                'users': args.users, 'start': start, 'stop': min(start + batch, args.rows) - 1,
+                'verbs': VERBS, 'nouns': NOUNS, 'details': DETAILS,
+            })
+            await session.commit()
+            print(f"  seeded {min(start + batch, args.rows)}/{args.rows}", end='\r')
+        await session.execute(text("ANALYZE reminders"))
+        await session.commit()
+    print(f"Seeded {args.rows} reminders in {time.perf_counter() - started:.1f}s")
+
+
+async def cleanup():
+    async with db.get_session() as session:
+        await session.execute(text("DELETE FROM reminders WHERE user_id >= :first"), {'first': HEAVY_USER_ID})
+        await session.execute(text("DELETE FROM users WHERE telegram_id >= :first"), {'first': HEAVY_USER_ID})
+        await session.commit()
+
+
+async def ilike_search(session, user_id: int, query: str, limit: int):
+    # What /find would do without the index: scan the user's rows and match substrings
+    pattern = '%' + query.strip('"').split()[0] + '%'
+    stmt = (
+        select(Reminder.id)
+        .filter_by(user_id=user_id, is_sent=False)
+        .where(Reminder.title.ilike(pattern) | Reminder.description.ilike(pattern))
+        .order_by(Reminder.reminder_time, Reminder.id)
+        .limit(limit)
+    )
+    return (await session.scalars(stmt)).all()
+
+
+async def measure(args) -> list[tuple[str, str, str, list[float], float]]:
+    rng = random.Random(args.seed)
+    results = []
+    async with db.get_session() as session:
+        for kind, query in QUERIES:
+            for user_kind, pick in (('typical', lambda: BASE_USER_ID + rng.randrange(args.users)),
+                                    ('heavy', lambda: HEAVY_USER_ID)):
+                timings, found = [], 0
+                for _ in range(args.repeat):
+                    user_id = pick()
+                    started = time.perf_counter()
+                    if args.baseline:
+                        hits = await ilike_search(session, user_id, query, args.page_size)
+                        total = len(hits)
+                    else:
+                        hits, total = await search_reminders(session, user_id, query, 0, args.page_size)
+                    timings.append(time.perf_counter() - started)
+                    found += total
+                results.append((kind, query, user_kind, sorted(timings), found / args.repeat))
+    return results
+
+
+async def explain(query: str, user_id: int, page_size: int) -> list[str]:
+    stmt = search_statement(user_id, query, 0, page_size)
+    compiled = stmt.compile(dialect=postgresql.dialect(), compile_kwargs={'literal_binds': True})
+    async with db.get_session() as session:
+        return (await session.scalars(text(f"EXPLAIN (ANALYZE, BUFFERS) {compiled}"))).all()
+
+
+async def run(args):
+    if not await db.init_db():
+        sys.exit(1)
+    try:
+        await seed(args)
+        results = await measure(args)
+        if args.explain:
+            for line in await explain(QUERIES[0][1], HEAVY_USER_ID, args.page_size):
+                print(line)
+        if args.cleanup:
+            await cleanup()
+    finally:
+        await db.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Latency of /find full-text search on a large reminders table')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--heavy-share', type=float, default=0.2, help='share of rows owned by one power user')
+    parser.add_argument('--repeat', type=int, default=50, help='searches per query and user kind')
+    parser.add_argument('--page-size', type=int, default=10)
+    parser.add_argument('--baseline', action='store_true', help='time an unindexed ILIKE search instead')
+    parser.add_argument('--explain', action='store_true', help='print the plan of one search')
+    parser.add_argument('--cleanup', action='store_true', help='remove the seeded rows afterwards')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print(f"\n{'query':<32}{'user':<9}{'matches':>9}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for kind, query, user_kind, timings, found in results:
+        print(f"{kind + ': ' + query:<32}{user_kind:<9}{found:>9.0f}{percentile(timings, 0.5) * 1000:>9.2f}"
+              f"{percentile(timings, 0.99) * 1000:>9.2f}{timings[-1] * 1000:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded on first use or by the post-polling warm-up, never while main.py is imported
+DEFERRED_MODULES = ['dateparser', 'geopy', 'timezonefinderL', 'aiohttp']
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def measure() -> dict[str, tuple[int, int]]:
+    # Dummy credentials: only module-level code runs, nothing connects
+    env = {**os.environ, 'TELEGRAM_BOT_TOKEN': os.environ.get('TELEGRAM_BOT_TOKEN', '0:startup-benchmark')}
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import main'],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            modules[match.group(4)] = (int(match.group(1)), int(match.group(2)))
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cold import time of main.py, checked against a budget')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=float(os.getenv('STARTUP_BUDGET_MS', '1000')))
+    parser.add_argument('--top', type=int, default=10, help='slowest top-level packages to list')
+    args = parser.parse_args()
+
+    samples = [measure() for _ in range(args.runs)]
+    totals = [sample['main'][1] / 1000 for sample in samples]
+    median_ms = statistics.median(totals)
+
+    # Self time summed per top-level package, from the median run
+    median_sample = sorted(samples, key=lambda sample: sample['main'][1])[len(samples) // 2]
+    packages: dict[str, int] = {}
+    for name, (self_us, _) in median_sample.items():
+        package = name.split('.')[0]
+        packages[package] = packages.get(package, 0) + self_us
+
+    print(f"import main: median {median_ms:.0f} ms, min {min(totals):.0f} ms, max {max(totals):.0f} ms "
+          f"({args.runs} runs, budget {args.budget_ms:.0f} ms)")
+    print(f"\n{'package':<24}{'self ms':>10}")
+    for package, self_us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{package:<24}{self_us / 1000:>10.1f}")
+
+    failed = False
+    eager = [module for module in DEFERRED_MODULES if module in median_sample]
+    if eager:
+        print(f"\nFAIL: imported at startup, should be deferred: {', '.join(eager)}")
+        failed = True
+    if median_ms > args.budget_ms:
+        print(f"\nFAIL: startup {median_ms:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+        failed = True
+
+    if failed:
+        sys.exit(1)
+    print("\nOK")
+
+
+if __name__ == '__main__':
+    main()
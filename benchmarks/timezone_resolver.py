@@ -0,0 +1,68 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Every scenario imports the same modules, so the numbers differ only in how the finder/geocoder are built
+PRELUDE = """
+import json, resource, time
+start = time.perf_counter()
+from utils.timezone_service import TimezoneService, timezone_resolver
+"""
+
+SCENARIOS = {
+    # What main.py + ReminderScheduler used to do: two services, each with its own finder and geocoder
+    'duplicated': """
+from timezonefinderL import TimezoneFinder
+from geopy.geocoders import Nominatim
+services = [(TimezoneFinder(), Nominatim(user_agent="smart_planner_bot")) for _ in range(2)]
+services[0][0].timezone_at(lng=27.5615, lat=53.9045)
+""",
+    'shared': """
+services = [TimezoneService(), TimezoneService()]
+timezone_resolver.timezone_at(53.9045, 27.5615)
+""",
+    # Startup cost when nothing resolves a timezone before the first request
+    'shared-lazy': """
+services = [TimezoneService(), TimezoneService()]
+""",
+}
+
+EPILOGUE = """
+print(json.dumps({
+    'seconds': time.perf_counter() - start,
+    'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+}))
+"""
+
+
+def run_scenario(code: str) -> dict:
+    result = subprocess.run(
+        [sys.executable, '-c', PRELUDE + code + EPILOGUE],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare startup time and RSS of shared vs duplicated timezone resolvers')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'scenario':<14}{'median ms':>12}{'max RSS MiB':>14}")
+    for name, code in SCENARIOS.items():
+        samples = [run_scenario(code) for _ in range(args.runs)]
+        seconds = statistics.median(sample['seconds'] for sample in samples)
+        rss = statistics.median(sample['max_rss_kb'] for sample in samples) / 1024
+        print(f"{name:<14}{seconds * 1000:>12.1f}{rss:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from telegram import Update
+from telegram.ext import Application, MessageHandler, filters
+from benchmarks.webhook_replay import FakeBotApi, percentile, synthetic_updates
+from utils.update_processor import PerUserUpdateProcessor
+
+MODES = ['sequential', 'concurrent', 'per-user']
+
+
+def build_stream(count: int, users: int, slow_fraction: float, seed: int) -> tuple[list[dict], set[int]]:
+    # Senders are drawn at random, so a user's updates are interleaved with everyone else's
+    rng = random.Random(seed)
+    updates = synthetic_updates(count, users)
+    for update in updates:
+        user_id = 100000 + rng.randrange(users)
+        update['message']['from']['id'] = user_id
+        update['message']['chat']['id'] = user_id
+    slow = {update['update_id'] for update in updates if rng.random() < slow_fraction}
+    return updates, slow
+
+
+async def run(mode: str, args, updates: list[dict], slow: set[int]) -> dict:
+    builder = Application.builder().token('0:update-processing').request(FakeBotApi(args.api_latency_ms / 1000))
+    builder = builder.get_updates_request(FakeBotApi(0)).updater(None)
+    if mode == 'concurrent':
+        builder = builder.concurrent_updates(args.concurrency)
+    elif mode == 'per-user':
+        builder = builder.concurrent_updates(PerUserUpdateProcessor(args.concurrency))
+    application = builder.build()
+
+    enqueued: dict[int, float] = {}
+    latencies: list[float] = []
+    last_seen: dict[int, int] = {}
+    out_of_order = 0
+    all_handled = asyncio.Event()
+
+    async def handle(update, context):
+        nonlocal out_of_order
+        # A slow step (a geocode, a group fan-out) or an ordinary one; both end with a reply
+        delay = args.slow_ms if update.update_id in slow else args.handler_ms
+        await asyncio.sleep(delay / 1000)
+        await update.message.reply_text('ok')
+
+        user_id = update.effective_user.id
+        if last_seen.get(user_id, 0) > update.update_id:
+            out_of_order += 1
+        last_seen[user_id] = update.update_id
+        latencies.append(time.perf_counter() - enqueued[update.update_id])
+        if len(latencies) == len(updates):
+            all_handled.set()
+
+    application.add_handler(MessageHandler(filters.ALL, handle))
+    await application.initialize()
+    await application.start()
+
+    started = time.perf_counter()
+    for data in updates:
+        enqueued[data['update_id']] = time.perf_counter()
+        await application.update_queue.put(Update.de_json(data, application.bot))
+    await asyncio.wait_for(all_handled.wait(), timeout=args.timeout)
+    elapsed = time.perf_counter() - started
+
+    await application.stop()
+    await application.shutdown()
+
+    return {'elapsed': elapsed, 'latencies': sorted(latencies), 'out_of_order': out_of_order}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Throughput and ordering of update processing modes on mixed-user streams')
+    parser.add_argument('--count', type=int, default=1000)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--handler-ms', type=float, default=5, help='work per ordinary update')
+    parser.add_argument('--slow-ms', type=float, default=500, help='work per slow update')
+    parser.add_argument('--slow-fraction', type=float, default=0.02)
+    parser.add_argument('--api-latency-ms', type=float, default=30, help='simulated Bot API round trip')
+    parser.add_argument('--mode', choices=MODES, action='append', help='modes to run (default: all)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--timeout', type=float, default=600)
+    args = parser.parse_args()
+
+    updates, slow = build_stream(args.count, args.users, args.slow_fraction, args.seed)
+    print(f"{len(updates)} updates from {args.users} users, {len(slow)} slow ({args.slow_ms:g} ms), "
+          f"others {args.handler_ms:g} ms, Bot API {args.api_latency_ms:g} ms, concurrency {args.concurrency}")
+    print(f"\n{'mode':<12}{'updates/s':>11}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}{'out of order':>14}")
+    for mode in args.mode or MODES:
+        result = asyncio.run(run(mode, args, updates, slow))
+        latencies = result['latencies']
+        print(f"{mode:<12}{len(updates) / result['elapsed']:>11.0f}"
+              f"{percentile(latencies, 0.5) * 1000:>10.0f}{percentile(latencies, 0.99) * 1000:>10.0f}"
+              f"{latencies[-1] * 1000:>10.0f}{result['out_of_order']:>14}")
+
+
+if __name__ == '__main__':
+    main()
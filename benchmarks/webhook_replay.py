@@ -0,0 +1,187 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import aiohttp
+from telegram.ext import Application, MessageHandler, filters
+from telegram.request import BaseRequest
+from utils.webhook_server import SECRET_TOKEN_HEADER, InFlightLimitedQueue, WebhookServer
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'Planner', 'username': 'planner_bot'}
+
+
+# Answers Bot API calls in-process, so the numbers cover the webhook server, the update queue and the
+# handlers' outgoing calls, but no real network
+class FakeBotApi(BaseRequest):
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None) -> tuple[int, bytes]:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        endpoint = url.rsplit('/', 1)[-1]
+        if endpoint == 'getMe':
+            result = BOT_USER
+        elif endpoint == 'sendMessage':
+            params = request_data.parameters if request_data else {}
+            result = {'message_id': self.calls, 'date': int(time.time()), 'from': BOT_USER,
+                      'chat': {'id': int(params.get('chat_id', 0)), 'type': 'private'}, 'text': params.get('text', '')}
+        else:
+            result = True
+        return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+
+def synthetic_updates(count: int, users: int) -> list[dict]:
+    updates = []
+    for update_id in range(1, count + 1):
+        user_id = 100000 + update_id % users
+        updates.append({
+            'update_id': update_id,
+            'message': {
+                'message_id': update_id,
+                'date': int(time.time()),
+                'chat': {'id': user_id, 'type': 'private'},
+                'from': {'id': user_id, 'is_bot': False, 'first_name': f'User {user_id}'},
+                'text': f'напомни через {update_id % 50 + 1} минут',
+            },
+        })
+    return updates
+
+
+def load_updates(path: str) -> list[dict]:
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_client(url: str, bodies: list[bytes], connections: int, secret_token: str) -> tuple[float, list[float]]:
+    # Runs in its own process so sending the load doesn't compete with the server for the event loop
+    return asyncio.run(post_updates(url, bodies, connections, secret_token))
+
+
+async def post_updates(url: str, bodies: list[bytes], connections: int, secret_token: str) -> tuple[float, list[float]]:
+    latencies = [0.0] * len(bodies)
+    next_index = 0
+
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=connections)) as session:
+        async with session.post(url, data=bodies[0], headers={SECRET_TOKEN_HEADER: 'wrong'}) as response:
+            if response.status != 403:
+                raise RuntimeError(f"request with a wrong secret token got {response.status}, expected 403")
+
+        # Like Telegram: each connection sends its next update only after the previous one was answered
+        async def connection():
+            nonlocal next_index
+            headers = {SECRET_TOKEN_HEADER: secret_token, 'Content-Type': 'application/json'}
+            while next_index < len(bodies):
+                index = next_index
+                next_index += 1
+                t0 = time.perf_counter()
+                async with session.post(url, data=bodies[index], headers=headers) as response:
+                    await response.read()
+                    if response.status != 200:
+                        raise RuntimeError(f"update {index} got HTTP {response.status}")
+                latencies[index] = time.perf_counter() - t0
+
+        started = time.perf_counter()
+        await asyncio.gather(*(connection() for _ in range(connections)))
+        return time.perf_counter() - started, latencies
+
+
+async def replay(args, updates: list[dict]):
+    api = FakeBotApi(args.api_latency_ms / 1000)
+    application = (
+        Application.builder().token('0:webhook-replay').request(api).get_updates_request(FakeBotApi(0))
+        .updater(None).update_queue(InFlightLimitedQueue(args.connections))
+        .concurrent_updates(args.concurrent_updates).build()
+    )
+
+    handled = 0
+    in_flight = peak_in_flight = 0
+    all_handled = asyncio.Event()
+
+    async def handle(update, context):
+        nonlocal handled, in_flight, peak_in_flight
+        in_flight += 1
+        peak_in_flight = max(peak_in_flight, in_flight)
+        if args.handler_ms:
+            await asyncio.sleep(args.handler_ms / 1000)
+        if update.effective_message:
+            await update.effective_message.reply_text('ok')
+        in_flight -= 1
+        handled += 1
+        if handled == len(updates):
+            all_handled.set()
+
+    application.add_handler(MessageHandler(filters.ALL, handle))
+
+    server = WebhookServer(application, url='http://127.0.0.1', path='/telegram', listen='127.0.0.1',
+                           port=args.port, secret_token='replay-secret', max_connections=args.connections)
+    await application.initialize()
+    await application.start()
+    await server.start()
+
+    url = f"http://127.0.0.1:{args.port}/telegram"
+    bodies = [json.dumps(update).encode() for update in updates]
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=1) as client:
+        accepted, latencies = await asyncio.get_running_loop().run_in_executor(
+            client, run_client, url, bodies, args.connections, server.secret_token)
+    await asyncio.wait_for(all_handled.wait(), timeout=args.timeout)
+    elapsed = time.perf_counter() - started
+
+    await server.stop()
+    await application.stop()
+    await application.shutdown()
+    return accepted, elapsed, sorted(latencies), api.calls, peak_in_flight
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay update JSON through the webhook server and measure updates/sec')
+    parser.add_argument('--updates', help='JSONL file with one recorded Update per line (default: synthetic messages)')
+    parser.add_argument('--count', type=int, default=5000, help='number of synthetic updates')
+    parser.add_argument('--users', type=int, default=500, help='distinct senders of synthetic updates')
+    parser.add_argument('--connections', type=int, default=40, help='parallel connections, like max_connections')
+    parser.add_argument('--concurrent-updates', type=int, default=1, help='updates the Application handles at once')
+    parser.add_argument('--handler-ms', type=float, default=0, help='simulated work per update')
+    parser.add_argument('--api-latency-ms', type=float, default=0, help='simulated Bot API round trip')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--timeout', type=float, default=300)
+    args = parser.parse_args()
+
+    updates = load_updates(args.updates) if args.updates else synthetic_updates(args.count, args.users)
+    accepted, elapsed, latencies, api_calls, peak_in_flight = asyncio.run(replay(args, updates))
+
+    print(f"{len(updates)} updates over {args.connections} connections, "
+          f"concurrent_updates={args.concurrent_updates}, handler {args.handler_ms:g} ms, "
+          f"Bot API {args.api_latency_ms:g} ms")
+    print(f"accepted:  {accepted:.2f} s, {len(updates) / accepted:.0f} updates/s")
+    print(f"handled:   {elapsed:.2f} s, {len(updates) / elapsed:.0f} updates/s end to end")
+    print(f"POST latency: p50 {percentile(latencies, 0.5) * 1000:.2f} ms, "
+          f"p95 {percentile(latencies, 0.95) * 1000:.2f} ms, p99 {percentile(latencies, 0.99) * 1000:.2f} ms")
+    print(f"Bot API calls: {api_calls}, peak updates in flight: {peak_in_flight}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+from telegram import Update
+from telegram.ext import ContextTypes
+from config.settings import settings
+from database.user_queries import stream_active_user_ids
+from utils.broadcaster import Broadcaster
+
+
+class AdminHandlers:
+    def __init__(self, broadcaster: Broadcaster):
+        self.broadcaster = broadcaster
+
+    @staticmethod
+    def is_admin(user_id: int) -> bool:
+        return bool(settings.ADMIN_USER_ID) and settings.ADMIN_USER_ID.strip() == str(user_id)
+
+    async def broadcast(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        if not self.is_admin(update.effective_user.id):
+            await update.message.reply_text("Эта команда доступна только администратору.")
+            return
+
+        # The text after the command, with its line breaks kept
+        parts = update.message.text.split(maxsplit=1)
+        if len(parts) < 2 or not parts[1].strip():
+            await update.message.reply_text(
+                "Использование: /broadcast <сообщение>\n"
+                "Сообщение получат все активные пользователи."
+            )
+            return
+
+        progress_message = await update.message.reply_text("📤 Подготовка рассылки всем активным пользователям...")
+        await self.broadcaster.create(
+            kind='users',
+            sender_id=update.effective_user.id,
+            text=f"📣 Сообщение от администратора:\n\n{parts[1].strip()}",
+            recipients=stream_active_user_ids(exclude=update.effective_user.id),
+            progress_chat_id=progress_message.chat_id,
+            progress_message_id=progress_message.message_id
+        )
@@ -6,12 +6,16 @@ from telegram import Update
 from telegram.ext import ContextTypes, ConversationHandler
 from datetime import datetime
 from database.database import db
+from database.group_queries import get_active_memberships, get_group_members
 from database.models import User, Reminder
 from weather.weather_service import WeatherService
 from utils.reminder_scheduler import ReminderScheduler
 from utils.timezone_service import TimezoneService
 from utils.date_parser import DateParserService
-from sqlalchemy import select
+from utils.broadcaster import Broadcaster
+from utils.membership_cache import membership_cache
+from utils.tz_utils import get_timezone, format_local_time
+from sqlalchemy import delete, select
 
 # Conversation states for group creation
 CREATE_GROUP_NAME, CREATE_GROUP_DESCRIPTION = range(2)
@@ -24,11 +28,13 @@ class GroupHandlers:
                  weather_service: WeatherService,
                  scheduler: ReminderScheduler,
                  timezone_service: TimezoneService,
-                 date_parser: DateParserService):
+                 date_parser: DateParserService,
+                 broadcaster: Broadcaster):
         self.weather_service = weather_service
         self.scheduler = scheduler
         self.timezone_service = timezone_service
         self.date_parser = date_parser
+        self.broadcaster = broadcaster
 
     async def create_group_start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         async with db.get_session() as session:
@@ -80,6 +86,7 @@ class GroupHandlers:
             session.add(new_member)
 
             await session.commit()
+            membership_cache.invalidate(new_group.id)
 
             await update.message.reply_text(
                 f"🎉 Группа '{new_group.name}' успешно создана!\n"
@@ -93,34 +100,22 @@ class GroupHandlers:
         user_id = update.effective_user.id
 
         async with db.get_session() as session:
-            stmt = select(GroupMember).filter_by(
-                user_id=user_id
-            )
-            memberships = await session.scalars(stmt)
-            memberships = memberships.all()
-
-            if not memberships:
-                await update.message.reply_text("Вы не состоите ни в одной активной группе.")
-                return
+            memberships = await get_active_memberships(session, user_id)
 
-            text = "👥 Ваши группы:\n\n"
-            group_list = []
-
-            for membership in memberships:
-                group = await session.get(Group, membership.group_id)
-                if group and group.is_active:
-                    role = "Администратор" if membership.is_admin else "Участник"
-                    group_list.append(
-                        f"*{group.name}* (ID: `{group.id}`)\n"
-                        f"  Роль: {role}"
-                    )
+        if not memberships:
+            await update.message.reply_text("Вы не состоите ни в одной активной группе.")
+            return
 
-            if not group_list:
-                await update.message.reply_text("Вы не состоите ни в одной активной группе.")
-                return
+        group_list = []
+        for membership in memberships:
+            role = "Администратор" if membership.is_admin else "Участник"
+            group_list.append(
+                f"*{membership.group.name}* (ID: `{membership.group.id}`)\n"
+                f"  Роль: {role}"
+            )
 
-            text += "\n\n".join(group_list)
-            await update.message.reply_text(text, parse_mode='Markdown')
+        text = "👥 Ваши группы:\n\n" + "\n\n".join(group_list)
+        await update.message.reply_text(text, parse_mode='Markdown')
 
     async def invite_to_group_start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         args = context.args
@@ -138,35 +133,23 @@ class GroupHandlers:
             await update.message.reply_text("ID группы должен быть числом.")
             return
 
-        async with db.get_session() as session:
-            group = await session.get(Group, group_id)
-            if not group or not group.is_active:
-                await update.message.reply_text(f"Группа с ID {group_id} не найдена или неактивна.")
-                return
-
-            stmt_admin = select(GroupMember).filter_by(
-                group_id=group_id,
-                user_id=update.effective_user.id
-            )
-            membership = await session.scalar(stmt_admin)
+        group = await membership_cache.get(group_id)
+        if not group or not group.is_active:
+            await update.message.reply_text(f"Группа с ID {group_id} не найдена или неактивна.")
+            return
 
-            if not membership or not membership.is_admin:
-                await update.message.reply_text("Только администраторы могут приглашать в эту группу.")
-                return
+        if not group.is_admin(update.effective_user.id):
+            await update.message.reply_text("Только администраторы могут приглашать в эту группу.")
+            return
 
+        async with db.get_session() as session:
             stmt_user = select(User).filter_by(username=username)
             invited_user = await session.scalar(stmt_user)
             if not invited_user:
                 await update.message.reply_text(f"Пользователь @{username} не найден.")
                 return
 
-            stmt_existing = select(GroupMember).filter_by(
-                group_id=group_id,
-                user_id=invited_user.telegram_id
-            )
-            existing_membership = await session.scalar(stmt_existing)
-
-            if existing_membership:
+            if group.is_member(invited_user.telegram_id):
                 await update.message.reply_text(f"Пользователь @{username} уже состоит в группе '{group.name}'.")
                 return
 
@@ -177,6 +160,7 @@ class GroupHandlers:
             )
             session.add(new_member)
             await session.commit()
+            membership_cache.invalidate(group_id)
 
             await update.message.reply_text(
                 f"✅ Пользователь @{username} успешно приглашен и добавлен в группу '{group.name}'."
@@ -207,46 +191,42 @@ class GroupHandlers:
             await update.message.reply_text("ID группы должен быть числом.")
             return
 
-        async with db.get_session() as session:
-            stmt_membership = select(GroupMember).filter_by(
-                group_id=group_id,
-                user_id=update.effective_user.id
-            )
-            membership = await session.scalar(stmt_membership)
-
-            if not membership:
-                await update.message.reply_text("Вы не состоите в этой группе и не можете отправлять сообщения.")
-                return
-
-            group_entity = await session.get(Group, group_id)
-            if not group_entity or not group_entity.is_active:
-                await update.message.reply_text(f"Группа с ID {group_id} не найдена или неактивна.")
-                return
+        group_entity = await membership_cache.get(group_id)
+        if not group_entity:
+            await update.message.reply_text(f"Группа с ID {group_id} не найдена или неактивна.")
+            return
+        if not group_entity.is_member(update.effective_user.id):
+            await update.message.reply_text("Вы не состоите в этой группе и не можете отправлять сообщения.")
+            return
 
-            stmt_members = select(GroupMember).filter_by(
-                group_id=group_id
-            )
-            members = await session.scalars(stmt_members)
-            members = members.all()
+        if not group_entity.is_active:
+            await update.message.reply_text(f"Группа с ID {group_id} не найдена или неактивна.")
+            return
 
+        async with db.get_session() as session:
             stmt = select(User).filter_by(telegram_id=update.effective_user.id)
             sender_user = await session.scalar(stmt)
             sender_name = f"{sender_user.name} @{sender_user.username}" if sender_user else 'Неизвестный'
 
-            sent_count = 0
-            for member in members:
-                if member.user_id != update.effective_user.id:
-                    try:
-                        await context.bot.send_message(
-                            chat_id=member.user_id,
-                            text=f"📢 Сообщение от {sender_name} в группе *'{group_entity.name}'*:\n\n{message}",
-                            parse_mode='Markdown'
-                        )
-                        sent_count += 1
-                    except Exception as e:
-                        print(f"Error sending message to user {member.user_id}: {e}")
-
-        await update.message.reply_text(f"✅ Сообщение отправлено {sent_count} участникам группы '{group_entity.name}'.")
+        recipients = [user_id for user_id in group_entity.members if user_id != update.effective_user.id]
+        if not recipients:
+            await update.message.reply_text(f"В группе '{group_entity.name}' нет других участников.")
+            return
+
+        # Delivery runs in the background; this message is edited with the progress
+        progress_message = await update.message.reply_text(
+            f"📤 Отправка сообщения {len(recipients)} участникам группы '{group_entity.name}'..."
+        )
+        await self.broadcaster.create(
+            kind='group',
+            sender_id=update.effective_user.id,
+            text=f"📢 Сообщение от {sender_name} в группе *'{group_entity.name}'*:\n\n{message}",
+            parse_mode='Markdown',
+            recipients=recipients,
+            group_id=group_id,
+            progress_chat_id=progress_message.chat_id,
+            progress_message_id=progress_message.message_id
+        )
 
     async def leave_group(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         args = context.args
@@ -263,34 +243,27 @@ class GroupHandlers:
             await update.message.reply_text("ID группы должен быть числом.")
             return
 
-        async with db.get_session() as session:
-            stmt_membership = select(GroupMember).filter_by(
-                group_id=group_id,
-                user_id=update.effective_user.id
-            )
-            membership = await session.scalar(stmt_membership)
-
-            if not membership:
-                await update.message.reply_text("Вы не состоите в этой группе.")
-                return
-
-            group = await session.get(Group, group_id)
-            if not group:
-                await update.message.reply_text("Ошибка: Группа не найдена.")
-                return
+        group = await membership_cache.get(group_id)
+        if not group:
+            await update.message.reply_text(f"Группа с ID {group_id} не найдена или неактивна.")
+            return
+        if not group.is_member(update.effective_user.id):
+            await update.message.reply_text("Вы не состоите в этой группе.")
+            return
 
+        async with db.get_session() as session:
             if group.creator_id == update.effective_user.id:
-                stmt_members = select(GroupMember).filter_by(group_id=group_id)
-                members = await session.scalars(stmt_members)
-
-                await session.delete(group)
-                await session.commit()
-
-                for member in members.all():
-                    if member.user_id != update.effective_user.id:
+                group_entity = await session.get(Group, group_id)
+                if group_entity:
+                    await session.delete(group_entity)
+                    await session.commit()
+                membership_cache.invalidate(group_id)
+
+                for member_id in group.members:
+                    if member_id != update.effective_user.id:
                         try:
                             await context.bot.send_message(
-                                chat_id=member.user_id,
+                                chat_id=member_id,
                                 text=f"Группа *'{group.name}'* была удалена ее создателем.",
                                 parse_mode='Markdown'
                             )
@@ -300,8 +273,10 @@ class GroupHandlers:
                 await update.message.reply_text(
                     f"❌ Вы были создателем, поэтому группа '{group.name}' удалена для всех.")
             else:
-                await session.delete(membership)
+                await session.execute(
+                    delete(GroupMember).filter_by(group_id=group_id, user_id=update.effective_user.id))
                 await session.commit()
+                membership_cache.invalidate(group_id)
 
                 await update.message.reply_text(f"👋 Вы успешно покинули группу '{group.name}'.")
 
@@ -329,40 +304,30 @@ class GroupHandlers:
             await update.message.reply_text("ID группы должен быть числом.")
             return
 
-        async with db.get_session() as session:
-            stmt_membership = select(GroupMember).filter_by(
-                group_id=group_id,
-                user_id=update.effective_user.id
-            )
-            membership = await session.scalar(stmt_membership)
-
-            if not membership:
-                await update.message.reply_text("Вы не состоите в этой группе.")
-                return
-
-            group_entity = await session.get(Group, group_id)
+        group_entity = await membership_cache.get(group_id)
+        if not group_entity:
+            await update.message.reply_text(f"Группа с ID {group_id} не найдена или неактивна.")
+            return
+        if not group_entity.is_member(update.effective_user.id):
+            await update.message.reply_text("Вы не состоите в этой группе.")
+            return
 
-            stmt_members = select(GroupMember).filter_by(
-                group_id=group_id
-            )
-            members = await session.scalars(stmt_members)
-            members = members.all()
+        async with db.get_session() as session:
+            members = await get_group_members(session, group_id)
 
-            text = f"Информация о группе *'{group_entity.name}'* (ID: `{group_entity.id}`):\n\n"
-            if group_entity.description:
-                text += f"Описание: {group_entity.description}\n\n"
+        text = f"Информация о группе *'{group_entity.name}'* (ID: `{group_entity.id}`):\n\n"
+        if group_entity.description:
+            text += f"Описание: {group_entity.description}\n\n"
 
-            text += f"Участников: {len(members)}\n"
-            text += "Участники:\n"
+        text += f"Участников: {len(members)}\n"
+        text += "Участники:\n"
 
-            for member in members:
-                stmt = select(User).filter_by(telegram_id=member.user_id)
-                user = await session.scalar(stmt)
-                if user:
-                    role = "Админ" if member.is_admin else "Участник"
-                    text += f"- {user.name} (@{user.username}) - {role}\n"
+        for member in members:
+            if member.user:
+                role = "Админ" if member.is_admin else "Участник"
+                text += f"- {member.user.name} (@{member.user.username}) - {role}\n"
 
-            await update.message.reply_text(text, parse_mode='Markdown')
+        await update.message.reply_text(text, parse_mode='Markdown')
 
     async def add_group_reminder_start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         args = context.args
@@ -376,21 +341,17 @@ class GroupHandlers:
             group_id = int(args[0])
             context.user_data['group'] = group_id
 
-            async with db.get_session() as session:
-                stmt_membership = select(GroupMember).filter_by(
-                    group_id=group_id,
-                    user_id=update.effective_user.id
-                )
-                membership = await session.scalar(stmt_membership)
-
-                if not membership:
-                    await update.message.reply_text("Вы не состоите в этой группе и не можете отправлять сообщения.")
-                    return ConversationHandler.END
+            group = await membership_cache.get(group_id)
+            if not group:
+                await update.message.reply_text(f"Группа с ID {group_id} не найдена или неактивна.")
+                return ConversationHandler.END
+            if not group.is_member(update.effective_user.id):
+                await update.message.reply_text("Вы не состоите в этой группе и не можете отправлять сообщения.")
+                return ConversationHandler.END
 
-                group = await session.get(Group, group_id)
-                if not group or not group.is_active:
-                    await update.message.reply_text(f"Группа с ID {group_id} не найдена или неактивна.")
-                    return ConversationHandler.END
+            if not group.is_active:
+                await update.message.reply_text(f"Группа с ID {group_id} не найдена или неактивна.")
+                return ConversationHandler.END
         except ValueError:
             await update.message.reply_text("ID группы должен быть числом.")
             return ConversationHandler.END
@@ -455,14 +416,15 @@ class GroupHandlers:
                 return ConversationHandler.END
 
             user_timezone = user.timezone
+            user_city = user.city
 
         try:
             reminder_dt_local = datetime.strptime(time_str, '%d.%m.%Y %H:%M')
-            user_tz = pytz.timezone(user_timezone)
+            user_tz = get_timezone(user_timezone)
             reminder_dt_local = user_tz.localize(reminder_dt_local)
             reminder_dt_utc_aware = reminder_dt_local.astimezone(pytz.utc)
         except ValueError:
-            reminder_dt_utc_aware = self.date_parser.parse_natural_text(time_str, user_timezone)
+            reminder_dt_utc_aware = await self.date_parser.parse_natural_text_async(time_str, user_timezone)
 
         if not reminder_dt_utc_aware:
             await update.message.reply_text(
@@ -477,22 +439,21 @@ class GroupHandlers:
 
         reminder_dt_utc_naive = reminder_dt_utc_aware.replace(tzinfo=None)
 
-        user_display_tz = pytz.timezone(user_timezone)
-        display_time = reminder_dt_utc_aware.astimezone(user_display_tz)
+        display_time = format_local_time(reminder_dt_utc_aware, user_timezone)
 
         group_id = context.user_data.get('group')
 
+        group = await membership_cache.get(group_id)
+        if not group:
+            await update.message.reply_text(f"Группа с ID {group_id} не найдена или неактивна.")
+            context.user_data.clear()
+            return ConversationHandler.END
+
         sent_count = 0
         async with db.get_session() as session:
-            stmt_members = select(GroupMember).filter_by(
-                group_id=group_id
-            )
-            members = await session.scalars(stmt_members)
-            members = members.all()
-
-            for member in members:
+            for member_id in group.members:
                 new_reminder = Reminder(
-                    user_id=member.user_id,
+                    user_id=member_id,
                     title=context.user_data['title'],
                     description=context.user_data['description'],
                     reminder_time=reminder_dt_utc_naive,
@@ -503,10 +464,16 @@ class GroupHandlers:
 
             await session.commit()
 
-        await update.message.reply_text(
+        text = (
             f"🎉 Напоминание '{new_reminder.title}' успешно добавлено для {sent_count} участников группы!\n"
-            f"⏰ Сработает: {display_time.strftime('%d.%m.%Y %H:%M')} ({user_timezone})."
+            f"⏰ Сработает: {display_time} ({user_timezone})."
         )
 
+        forecast = await self.weather_service.get_forecast_at(user_city, reminder_dt_utc_aware)
+        if forecast:
+            text += f"\n🌤️ Прогноз в {user_city} на это время: {forecast['temperature']}°C, {forecast['description']}"
+
+        await update.message.reply_text(text)
+
         context.user_data.clear()
         return ConversationHandler.END
\ No newline at end of file
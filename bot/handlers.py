@@ -1,15 +1,24 @@
 import pytz
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
 from telegram.ext import ContextTypes, ConversationHandler
-from datetime import datetime
+from telegram.helpers import escape_markdown
+from datetime import datetime, timedelta
 import re
+import tempfile
+import zlib
+from config.settings import settings
 from database.database import db
 from database.models import User, Reminder
+from database.reminder_queries import search_reminders
 from weather.weather_service import WeatherService
 from utils.reminder_scheduler import ReminderScheduler
 from utils.timezone_service import TimezoneService
 from utils.date_parser import DateParserService
-from sqlalchemy import select
+from utils.reminder_export import write_calendar
+from utils.reminder_import import ReminderImporter
+from utils.tz_utils import get_timezone, format_local_time, format_local_times
+from sqlalchemy import select, tuple_
 
 # Conversation states
 REGISTRATION_USERNAME, REGISTRATION_NAME, REGISTRATION_CITY = range(3)
@@ -18,6 +27,26 @@ ADD_REMINDER_TITLE, ADD_REMINDER_DESCRIPTION, ADD_REMINDER_TIME, ADD_REMINDER_RE
 # Profile edit states
 EDIT_NAME, EDIT_CITY = range(2)
 
+REMINDERS_PAGE_SIZE = 10
+FIND_QUERY_MAX_LENGTH = 200
+FIND_RECENT_QUERIES = 10
+EPOCH = datetime(1970, 1, 1)
+
+
+# Keyset anchors travel in callback_data (64 bytes max) as integer microseconds of the naive UTC time
+def _to_microseconds(dt: datetime) -> int:
+    return (dt - EPOCH) // timedelta(microseconds=1)
+
+
+def _from_microseconds(value: int) -> datetime:
+    return EPOCH + timedelta(microseconds=value)
+
+
+# The search text doesn't fit in callback_data, so /find keeps its last few queries in chat_data by checksum and its
+# buttons carry the checksum. chat_data, because the conversations clear user_data when they start
+def _query_checksum(text: str) -> str:
+    return format(zlib.crc32(text.encode()), 'x')
+
 class BotHandlers:
     def __init__(self,
                  weather_service: WeatherService,
@@ -37,6 +66,11 @@ class BotHandlers:
             existing_user = await session.scalar(stmt)
 
             if existing_user:
+                if not existing_user.is_active:
+                    # Marked inactive after a failed delivery; writing to the bot again means it was unblocked
+                    existing_user.is_active = True
+                    await session.commit()
+
                 await update.message.reply_text(
                     f"Привет, {existing_user.name}! 👋\n"
                     f"Вы уже зарегистрированы в системе.\n\n"
@@ -114,6 +148,7 @@ class BotHandlers:
                 f"Не удалось определить часовой пояс для города '{city}'.\n"
                 f"Пожалуйста, введите название города более точно (на английском или русском):\n"
                 f"(Например: 'Москва', 'Saint Petersburg' и т.п.)"
+                f"{await self._city_suggestions_text(city)}"
             )
             return REGISTRATION_CITY
 
@@ -141,6 +176,12 @@ class BotHandlers:
         context.user_data.clear()
         return ConversationHandler.END
 
+    async def _city_suggestions_text(self, city: str) -> str:
+        suggestions = await self.timezone_service.suggest_cities(city)
+        if not suggestions:
+            return ""
+        return "\n\nВозможно, вы имели в виду: " + ", ".join(suggestions)
+
     async def cancel_registration(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text('Действие отменено.')
         context.user_data.clear()
@@ -211,6 +252,7 @@ class BotHandlers:
             await update.message.reply_text(
                 f"Не удалось определить часовой пояс для города '{new_city}'.\n"
                 f"Попробуйте еще раз:"
+                f"{await self._city_suggestions_text(new_city)}"
             )
             return EDIT_CITY
 
@@ -241,6 +283,7 @@ class BotHandlers:
                 )
                 return ConversationHandler.END
             context.user_data['timezone'] = user.timezone
+            context.user_data['city'] = user.city
 
         await update.message.reply_text("Введите название (заголовок) напоминания:")
         return ADD_REMINDER_TITLE
@@ -285,11 +328,11 @@ class BotHandlers:
         reminder_dt_utc_aware = None
         try:
             reminder_dt_local = datetime.strptime(time_str, '%d.%m.%Y %H:%M')
-            user_tz = pytz.timezone(user_tz_name)
+            user_tz = get_timezone(user_tz_name)
             reminder_dt_local = user_tz.localize(reminder_dt_local)
             reminder_dt_utc_aware = reminder_dt_local.astimezone(pytz.utc)
         except ValueError:
-            reminder_dt_utc_aware = self.date_parser.parse_natural_text(time_str, user_tz_name)
+            reminder_dt_utc_aware = await self.date_parser.parse_natural_text_async(time_str, user_tz_name)
 
         if not reminder_dt_utc_aware or reminder_dt_utc_aware < datetime.now(pytz.utc):
             await update.message.reply_text("Некорректное время или время в прошлом. Попробуйте еще раз:")
@@ -336,16 +379,23 @@ class BotHandlers:
             session.add(new_reminder)
             await session.commit()
 
-        user_tz = pytz.timezone(context.user_data['timezone'])
-        display_time = dt_utc.astimezone(user_tz).strftime('%d.%m.%Y %H:%M')
+        display_time = format_local_time(dt_utc, context.user_data['timezone'])
         rec_text = "Без повтора" if not is_recurring else ("Ежедневно" if pattern == 'daily' else "Еженедельно")
 
-        await query.edit_message_text(
+        text = (
             f"✅ Напоминание создано!\n"
             f"📌 {context.user_data['title']}\n"
             f"⏰ {display_time}\n"
             f"🔄 {rec_text}"
         )
+
+        city = context.user_data.get('city')
+        if city:
+            forecast = await self.weather_service.get_forecast_at(city, dt_utc)
+            if forecast:
+                text += f"\n🌤️ Прогноз на это время: {forecast['temperature']}°C, {forecast['description']}"
+
+        await query.edit_message_text(text)
         context.user_data.clear()
         return ConversationHandler.END
 
@@ -353,34 +403,232 @@ class BotHandlers:
         user_id = update.effective_user.id
 
         async with db.get_session() as session:
-            stmt = select(Reminder).filter_by(user_id=user_id, is_sent=False).order_by(Reminder.reminder_time)
-            reminders = (await session.scalars(stmt)).all()
+            user = await session.scalar(select(User).filter_by(telegram_id=user_id))
+            if not user: return
+
+            page = await self._reminders_page(session, user, 'c', None)
+
+        if not page:
+            await update.message.reply_text("У вас нет активных напоминаний.")
+            return
+
+        text, keyboard = page
+        await update.message.reply_text(text, parse_mode='Markdown', reply_markup=keyboard)
+
+    async def reminders_page_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        query = update.callback_query
+        await query.answer()
+
+        try:
+            _, _, direction, anchor_us, anchor_id = query.data.split('_')
+            anchor = (_from_microseconds(int(anchor_us)), int(anchor_id))
+        except ValueError:
+            await query.edit_message_text("Ошибка обработки команды.")
+            return
+
+        await self._show_reminders_page(query, direction, anchor)
+
+    async def delete_reminder_from_page_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        query = update.callback_query
+
+        try:
+            _, _, reminder_id, anchor_us, anchor_id = query.data.split('_')
+            reminder_id = int(reminder_id)
+            anchor = (_from_microseconds(int(anchor_us)), int(anchor_id))
+        except ValueError:
+            await query.answer()
+            await query.edit_message_text("Ошибка обработки команды.")
+            return
+
+        async with db.get_session() as session:
+            owner_id = await session.scalar(select(Reminder.user_id).filter_by(id=reminder_id))
+
+        if owner_id == query.from_user.id and await self.scheduler.cancel_reminder(reminder_id):
+            await query.answer("✅ Напоминание удалено.")
+        else:
+            await query.answer("⚠️ Напоминание уже удалено или не найдено.")
+
+        # Re-render the page the button was on; rows after the deleted one move up
+        await self._show_reminders_page(query, 'c', anchor)
 
-            stmt_user = select(User).filter_by(telegram_id=user_id)
-            user = await session.scalar(stmt_user)
+    async def _show_reminders_page(self, query, direction: str, anchor: tuple[datetime, int]):
+        async with db.get_session() as session:
+            user = await session.scalar(select(User).filter_by(telegram_id=query.from_user.id))
             if not user: return
 
-            user_tz = pytz.timezone(user.timezone)
+            page = await self._reminders_page(session, user, direction, anchor)
+            if not page and direction != 'p':
+                # The page emptied (e.g. its last reminder was deleted): fall back to the one before it
+                page = await self._reminders_page(session, user, 'p', anchor)
 
-            if not reminders:
-                await update.message.reply_text("У вас нет активных напоминаний.")
-                return
+        if not page:
+            await query.edit_message_text("У вас нет активных напоминаний.")
+            return
 
-            await update.message.reply_text("🔔 Ваши активные напоминания:")
+        text, keyboard = page
+        try:
+            await query.edit_message_text(text, parse_mode='Markdown', reply_markup=keyboard)
+        except BadRequest as e:
+            # Pressing a button that leads to the page already shown
+            if 'not modified' not in str(e).lower():
+                raise
+
+    @staticmethod
+    async def _reminders_page(session, user: User, direction: str,
+                              anchor: tuple[datetime, int] | None) -> tuple[str, InlineKeyboardMarkup] | None:
+        # Keyset pagination over (reminder_time, id): 'n' rows after the anchor, 'p' rows before it,
+        # 'c' rows from the anchor on. The anchor always comes from the page the button was on.
+        key = tuple_(Reminder.reminder_time, Reminder.id)
+        pending = select(Reminder).filter_by(user_id=user.telegram_id, is_sent=False)
+
+        if direction == 'p':
+            stmt = pending.where(key < tuple_(*anchor)).order_by(Reminder.reminder_time.desc(), Reminder.id.desc())
+        else:
+            if anchor is not None:
+                stmt = pending.where(key > tuple_(*anchor) if direction == 'n' else key >= tuple_(*anchor))
+            else:
+                stmt = pending
+            stmt = stmt.order_by(Reminder.reminder_time, Reminder.id)
+
+        reminders = (await session.scalars(stmt.limit(REMINDERS_PAGE_SIZE + 1))).all()
+        has_more = len(reminders) > REMINDERS_PAGE_SIZE
+        reminders = reminders[:REMINDERS_PAGE_SIZE]
+        if not reminders:
+            return None
+
+        first, last = reminders[0], reminders[-1]
+        if direction == 'p':
+            reminders.reverse()
+            first, last = last, first
+            has_prev = has_more
+            has_next = await session.scalar(select(pending.where(key > tuple_(last.reminder_time, last.id)).exists()))
+        else:
+            has_next = has_more
+            has_prev = await session.scalar(select(pending.where(key < tuple_(first.reminder_time, first.id)).exists()))
+
+        lines = ["🔔 Ваши активные напоминания:\n"]
+        local_times = format_local_times((r.reminder_time for r in reminders), user.timezone)
+        for number, (r, local_time) in enumerate(zip(reminders, local_times), 1):
+            rec_info = f" 🔄 {r.recurring_pattern}" if r.is_recurring else ""
+            # One unescaped title would fail the whole page; titles stay out of entities, where Markdown can't escape
+            lines.append(f"{number}. 📌 {escape_markdown(r.title)}\n⏰ {local_time}{rec_info}")
+            if r.description:
+                lines.append(escape_markdown(r.description[:100]))
+            lines.append("")
+
+        page_anchor = f"{_to_microseconds(first.reminder_time)}_{first.id}"
+        delete_buttons = [
+            InlineKeyboardButton(f"🗑️ {number}", callback_data=f"rem_del_{r.id}_{page_anchor}")
+            for number, r in enumerate(reminders, 1)
+        ]
+        keyboard = [delete_buttons[i:i + 5] for i in range(0, len(delete_buttons), 5)]
+
+        navigation = []
+        if has_prev:
+            navigation.append(InlineKeyboardButton("⬅️ Назад", callback_data=f"rem_pg_p_{page_anchor}"))
+        if has_next:
+            navigation.append(InlineKeyboardButton(
+                "Вперед ➡️", callback_data=f"rem_pg_n_{_to_microseconds(last.reminder_time)}_{last.id}"))
+        if navigation:
+            keyboard.append(navigation)
+
+        return "\n".join(lines).rstrip(), InlineKeyboardMarkup(keyboard)
+
+    async def find_reminders(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        text = ' '.join(context.args).strip()
+        if not text:
+            await update.message.reply_text(
+                "Использование: /find <текст>\n\n"
+                "Ищет по названию и описанию активных напоминаний. "
+                "Фраза в кавычках ищется целиком, слово с минусом исключается."
+            )
+            return
+        if len(text) > FIND_QUERY_MAX_LENGTH:
+            await update.message.reply_text(f"Слишком длинный запрос: максимум {FIND_QUERY_MAX_LENGTH} символов.")
+            return
+
+        async with db.get_session() as session:
+            user = await session.scalar(select(User).filter_by(telegram_id=update.effective_user.id))
+            if not user: return
+
+            page = await self._find_page(session, user, text, 0)
+
+        if not page:
+            await update.message.reply_text(f"🔎 По запросу «{text}» ничего не найдено.")
+            return
+
+        recent = context.chat_data.setdefault('find_queries', {})
+        recent.pop(_query_checksum(text), None)
+        recent[_query_checksum(text)] = text
+        while len(recent) > FIND_RECENT_QUERIES:
+            del recent[next(iter(recent))]
+        page_text, keyboard = page
+        await update.message.reply_text(page_text, parse_mode='Markdown', reply_markup=keyboard)
+
+    async def find_page_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        query = update.callback_query
+        await query.answer()
 
-            for r in reminders:
-                utc_aware = r.reminder_time.replace(tzinfo=pytz.utc)
-                local_time = utc_aware.astimezone(user_tz).strftime('%d.%m.%Y %H:%M')
+        try:
+            _, _, offset, checksum = query.data.split('_')
+            offset = int(offset)
+        except ValueError:
+            await query.edit_message_text("Ошибка обработки команды.")
+            return
+
+        text = context.chat_data.get('find_queries', {}).get(checksum)
+        if not text:
+            await query.edit_message_reply_markup(None)
+            await query.message.reply_text("Этот поиск устарел, повторите /find.")
+            return
+
+        async with db.get_session() as session:
+            user = await session.scalar(select(User).filter_by(telegram_id=query.from_user.id))
+            if not user: return
 
-                rec_info = ""
-                if r.is_recurring:
-                    rec_info = f"\n🔄 {r.recurring_pattern}"
+            page = await self._find_page(session, user, text, offset)
 
-                text = f"📌 *{r.title}*\n{r.description or ''}\n⏰ {local_time}{rec_info}"
+        if not page:
+            await query.edit_message_text(f"🔎 По запросу «{text}» ничего не найдено.")
+            return
 
-                keyboard = [[InlineKeyboardButton("🗑️ Удалить", callback_data=f"del_rem_{r.id}")]]
-                await update.message.reply_text(text, parse_mode='Markdown',
-                                                reply_markup=InlineKeyboardMarkup(keyboard))
+        page_text, keyboard = page
+        try:
+            await query.edit_message_text(page_text, parse_mode='Markdown', reply_markup=keyboard)
+        except BadRequest as e:
+            if 'not modified' not in str(e).lower():
+                raise
+
+    @staticmethod
+    async def _find_page(session, user: User, text: str, offset: int) -> tuple[str, InlineKeyboardMarkup] | None:
+        hits, total = await search_reminders(session, user.telegram_id, text, offset, REMINDERS_PAGE_SIZE)
+        if not hits and offset:
+            # Matches were deleted or sent since the page was shown: start over
+            offset = 0
+            hits, total = await search_reminders(session, user.telegram_id, text, offset, REMINDERS_PAGE_SIZE)
+        if not hits:
+            return None
+
+        lines = [f"🔎 По запросу «{escape_markdown(text)}» найдено: {total}\n"]
+        local_times = format_local_times((hit.reminder_time for hit in hits), user.timezone)
+        for number, (hit, local_time) in enumerate(zip(hits, local_times), offset + 1):
+            rec_info = f" 🔄 {hit.recurring_pattern}" if hit.recurring_pattern else ""
+            # Titles are arbitrary text: escaped, and kept out of entities, where legacy Markdown can't escape
+            lines.append(f"{number}. 📌 {escape_markdown(hit.title)}\n⏰ {local_time}{rec_info}")
+            if hit.description:
+                lines.append(escape_markdown(hit.description[:100]))
+            lines.append("")
+
+        checksum = _query_checksum(text)
+        navigation = []
+        if offset:
+            navigation.append(InlineKeyboardButton(
+                "⬅️ Назад", callback_data=f"find_pg_{max(0, offset - REMINDERS_PAGE_SIZE)}_{checksum}"))
+        if offset + len(hits) < total:
+            navigation.append(InlineKeyboardButton(
+                "Вперед ➡️", callback_data=f"find_pg_{offset + len(hits)}_{checksum}"))
+
+        return "\n".join(lines).rstrip(), InlineKeyboardMarkup([navigation] if navigation else [])
 
     async def delete_reminder_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         query = update.callback_query
@@ -408,15 +656,19 @@ class BotHandlers:
                 return
 
             weather_data = await self.weather_service.get_current_weather(user.city)
-            time_of_day = self.weather_service.get_time_of_day()
-            recommendation = await self.weather_service.get_weather_recommendation(user.city, time_of_day)
 
             if weather_data:
+                time_of_day = self.weather_service.get_time_of_day()
+                recommendation = await self.weather_service.get_weather_recommendation(
+                    user.city, time_of_day, weather_data)
+
                 text = f"🌤️ Погода в {user.city}: \n\n"
                 text += f"🌡️ Температура: {weather_data['temperature']}°C\n"
                 text += f"☁️ Описание: {weather_data['description']}\n"
                 text += f"💧 Влажность: {weather_data['humidity']}%\n"
                 text += f"💨 Скорость ветра: {weather_data['wind_speed']} м/с\n\n"
+                if weather_data.get('stale'):
+                    text += "⚠️ Сервис погоды недоступен, показаны последние сохраненные данные.\n\n"
 
                 if recommendation:
                     text += f"💡 Рекомендация: {recommendation}"
@@ -426,6 +678,86 @@ class BotHandlers:
 
             await update.message.reply_text(text)
 
+    async def import_help(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        await update.message.reply_text(
+            "📥 Импорт напоминаний\n\n"
+            "Отправьте боту файл .ics (экспорт из Google Календаря, Outlook, Apple Календаря) "
+            "или .csv со столбцами:\n"
+            "название, время, описание, повтор\n\n"
+            "Время: ДД.ММ.ГГГГ ЧЧ:ММ или ГГГГ-ММ-ДД ЧЧ:ММ, в вашем часовом поясе.\n"
+            "Повтор: ежедневно, еженедельно, ежемесячно или пусто.\n"
+            "Строка заголовка необязательна."
+        )
+
+    async def import_reminders(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        document = update.message.document
+        async with db.get_session() as session:
+            user = await session.scalar(select(User).filter_by(telegram_id=update.effective_user.id))
+        if not user:
+            await update.message.reply_text("Сначала /start")
+            return
+
+        if document.file_size and document.file_size > settings.IMPORT_MAX_FILE_SIZE:
+            await update.message.reply_text(
+                f"Файл слишком большой: максимум {settings.IMPORT_MAX_FILE_SIZE // (1024 * 1024)} МБ.")
+            return
+
+        progress_message = await update.message.reply_text(f"📥 Импорт файла {document.file_name}...")
+        importer = ReminderImporter(user.telegram_id, user.timezone)
+
+        # Small files stay in memory, larger ones spill to disk; rows are parsed while reading
+        with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as buffer:
+            telegram_file = await document.get_file()
+            await telegram_file.download_to_memory(out=buffer)
+            buffer.seek(0)
+
+            if document.file_name.lower().endswith('.ics'):
+                rows = importer.ics_rows(buffer)
+            else:
+                rows = importer.csv_rows(buffer)
+            summary = await importer.run(rows)
+
+        text = (
+            f"✅ Импорт завершён\n"
+            f"Добавлено напоминаний: {summary.accepted}\n"
+            f"Отклонено строк: {summary.rejected}"
+        )
+        if summary.simplified:
+            text += f"\nБез повторения (правило календаря не поддерживается): {summary.simplified}"
+        if summary.errors:
+            text += "\n\nОшибки:\n" + "\n".join(f"• строка {error.line}: {error.reason}" for error in summary.errors)
+            if summary.rejected > len(summary.errors):
+                text += f"\n… и ещё {summary.rejected - len(summary.errors)}"
+        await progress_message.edit_text(text)
+
+    async def export_reminders(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        async with db.get_session() as session:
+            user = await session.scalar(select(User).filter_by(telegram_id=update.effective_user.id))
+        if not user:
+            await update.message.reply_text("Сначала /start")
+            return
+
+        # Events are written as rows arrive; small calendars stay in memory, larger ones spill to disk
+        with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as buffer:
+            summary = await write_calendar(user.telegram_id, buffer, "Умный Планировщик")
+            if not summary.events:
+                await update.message.reply_text("У вас нет активных напоминаний.")
+                return
+
+            caption = f"📤 Напоминаний: {summary.events}. Откройте файл, чтобы добавить их в календарь."
+            if summary.monthly:
+                caption += (
+                    f"\n\nЕжемесячных: {summary.monthly}. В календаре они повторяются в то же число каждого месяца, "
+                    f"а бот напоминает каждые 30 дней, поэтому даты со временем могут расходиться."
+                )
+
+            buffer.seek(0)
+            await update.message.reply_document(
+                document=buffer,
+                filename='reminders.ics',
+                caption=caption
+            )
+
     async def user_info(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         username = context.args[0]
         async with db.get_session() as session:
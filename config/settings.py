@@ -3,19 +3,107 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
 class Settings:
     TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
     OPENWEATHER_API_KEY = os.getenv('OPENWEATHER_API_KEY')
     DATABASE_URL = os.getenv('DATABASE_URL')
     ADMIN_USER_ID = os.getenv('ADMIN_USER_ID')
     
-    WEATHER_API_URL = "https://api.openweathermap.org/data/2.5/weather"
-    WEATHER_FORECAST_URL = "https://api.openweathermap.org/data/2.5/forecast"
+    OPENWEATHER_BASE_URL = os.getenv('OPENWEATHER_BASE_URL', 'https://api.openweathermap.org/data/2.5').rstrip('/')
+    WEATHER_API_URL = f"{OPENWEATHER_BASE_URL}/weather"
+    WEATHER_FORECAST_URL = f"{OPENWEATHER_BASE_URL}/forecast"
+    WEATHER_GROUP_URL = f"{OPENWEATHER_BASE_URL}/group"
+    WEATHER_GROUP_SIZE = 20
+    WEATHER_BATCH_CONCURRENCY = int(os.getenv('WEATHER_BATCH_CONCURRENCY', '5'))
+    WEATHER_REQUEST_TIMEOUT = float(os.getenv('WEATHER_REQUEST_TIMEOUT', '5'))
+    WEATHER_REQUESTS_PER_MINUTE = int(os.getenv('WEATHER_REQUESTS_PER_MINUTE', '60'))
+    WEATHER_CIRCUIT_FAILURE_THRESHOLD = 5
+    WEATHER_CIRCUIT_RESET_TIMEOUT = 60
+    WEATHER_HISTORY_ENABLED = os.getenv('WEATHER_HISTORY_ENABLED', 'false').lower() == 'true'
+    WEATHER_HISTORY_RETENTION_DAYS = int(os.getenv('WEATHER_HISTORY_RETENTION_DAYS', '90'))
     
     REMINDER_CHECK_INTERVAL = 60
     WEATHER_CHECK_INTERVAL = 3600
+    WEATHER_FORECAST_REFRESH_INTERVAL = 3 * 3600
     
     DEFAULT_TIMEZONE = 'Europe/Minsk'
+
+    # hybrid: bundled gazetteer first, then Nominatim; offline: gazetteer only; online: Nominatim only
+    GEOCODER_MODE = os.getenv('GEOCODER_MODE', 'hybrid').lower()
+    GAZETTEER_SOURCE_PATH = os.getenv('GAZETTEER_SOURCE_PATH', os.path.join(BASE_DIR, 'data', 'cities.tsv'))
+    GAZETTEER_INDEX_PATH = os.getenv('GAZETTEER_INDEX_PATH', os.path.join(BASE_DIR, 'data', 'cities.idx'))
+
+    # Nominatim's usage policy allows at most one request per second
+    GEOCODER_MIN_INTERVAL = float(os.getenv('GEOCODER_MIN_INTERVAL', '1.1'))
+    # Resolved cities kept in memory; the geocode_cache table holds the rest
+    GEOCODER_MEMORY_CACHE_SIZE = int(os.getenv('GEOCODER_MEMORY_CACHE_SIZE', '10000'))
+    
+    # Broadcasts: Telegram allows about 30 messages per second per bot
+    BROADCAST_RATE_PER_SECOND = float(os.getenv('BROADCAST_RATE_PER_SECOND', '25'))
+    BROADCAST_CONCURRENCY = int(os.getenv('BROADCAST_CONCURRENCY', '10'))
+    BROADCAST_PROGRESS_INTERVAL = 3
+    BROADCAST_FLUSH_BATCH_SIZE = 50
+    
+    MEMBERSHIP_CACHE_MAX_GROUPS = int(os.getenv('MEMBERSHIP_CACHE_MAX_GROUPS', '10000'))
+    
+    # Reminder import from CSV/ICS uploads
+    IMPORT_MAX_FILE_SIZE = int(os.getenv('IMPORT_MAX_FILE_SIZE', str(10 * 1024 * 1024)))
+    IMPORT_MAX_ROWS = int(os.getenv('IMPORT_MAX_ROWS', '20000'))
+    IMPORT_CHUNK_SIZE = 250
+    IMPORT_ERRORS_SHOWN = 10
+    # Local hour for reminders created from all-day calendar events
+    IMPORT_ALL_DAY_HOUR = 9
+    # Rows fetched per round trip by /export
+    EXPORT_BATCH_SIZE = 500
+    
+    # Updates handled at once; each user's updates still run one at a time in order. 1 (default) handles everything
+    # sequentially; e.g. 16 lets slow handlers of one user stop blocking everyone else
+    CONCURRENT_UPDATES = int(os.getenv('CONCURRENT_UPDATES', '1'))
+    
+    # Flood protection: each user may send THROTTLE_BURST updates at once, refilled at THROTTLE_RATE per second
+    THROTTLE_ENABLED = os.getenv('THROTTLE_ENABLED', 'true').lower() == 'true'
+    THROTTLE_RATE = float(os.getenv('THROTTLE_RATE', '1'))
+    THROTTLE_BURST = int(os.getenv('THROTTLE_BURST', '10'))
+    # Commands that query the database, OpenWeather or fan out: (uses per second, burst)
+    THROTTLE_COMMAND_LIMITS = {
+        'my_reminders': (0.2, 3),
+        'find': (0.5, 5),
+        'weather': (0.1, 2),
+        'group_message': (0.05, 3),
+        'add_group_reminder': (0.05, 3),
+        'group_info': (0.2, 3),
+        'export': (0.02, 2),
+    }
+    
+    # polling: long polling via getUpdates; webhook: Telegram pushes updates to an embedded HTTP server
+    BOT_MODE = os.getenv('BOT_MODE', 'polling').lower()
+    # Public HTTPS base URL Telegram posts to, e.g. https://bot.example.com (TLS is terminated by a proxy)
+    WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+    WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+    WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+    WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8080'))
+    WEBHOOK_SECRET_TOKEN = os.getenv('WEBHOOK_SECRET_TOKEN')
+    # Simultaneous connections Telegram may open to the webhook (1-100); also the most updates in flight at once
+    WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', '40'))
+    
+    # Conversation state and user_data: postgres, file (development) or none (memory only).
+    # user_data, chat_data and bot_data are re-read from postgres before every update, so instances can share them;
+    # conversation states are only read at startup, so a user's conversation must stay on one instance
+    PERSISTENCE_BACKEND = os.getenv('PERSISTENCE_BACKEND', 'postgres').lower()
+    PERSISTENCE_FILE_PATH = os.getenv('PERSISTENCE_FILE_PATH', os.path.join(BASE_DIR, 'data', 'persistence.pickle'))
+    # How often changed state is collected, and how long a flush waits to batch what was collected
+    PERSISTENCE_UPDATE_INTERVAL = float(os.getenv('PERSISTENCE_UPDATE_INTERVAL', '5'))
+    PERSISTENCE_FLUSH_DELAY = 0.5
+    
+    # dateparser runs in worker processes; a parse that takes longer than the timeout is abandoned
+    DATE_PARSER_WORKERS = int(os.getenv('DATE_PARSER_WORKERS', '2'))
+    DATE_PARSER_TIMEOUT = float(os.getenv('DATE_PARSER_TIMEOUT', '2'))
+    DATE_PARSER_CACHE_SIZE = int(os.getenv('DATE_PARSER_CACHE_SIZE', '4096'))
+    
+    # Load the date parser workers, geocoder and HTTP client in the background once polling has started
+    STARTUP_WARM_UP = os.getenv('STARTUP_WARM_UP', 'true').lower() == 'true'
     
     IS_DOCKER = os.getenv('IS_DOCKER', 'false').lower() == 'true'
 
@@ -1,7 +1,53 @@
+from datetime import datetime
+from sqlalchemy import text
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from config.settings import settings
-from database.models import Base
+from database.models import Base, REMINDER_SEARCH_VECTOR
+
+# create_all only creates missing tables; these bring tables created by older versions up to date
+SCHEMA_UPGRADES = [
+    # weather_data used to be cleared with DELETE before every insert; the upsert needs a unique key on city
+    "DELETE FROM weather_data a USING weather_data b WHERE a.city = b.city AND a.id < b.id",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_weather_data_city ON weather_data (city)",
+    # Keyset pagination of /my_reminders walks (reminder_time, id) over one user's pending reminders
+    "CREATE INDEX IF NOT EXISTS ix_reminders_user_pending ON reminders (user_id, reminder_time, id) "
+    "WHERE is_sent = false",
+    # Deleting a group used to fail once it had a broadcast; its broadcasts now lose the group reference instead
+    "DO $$ BEGIN "
+    "IF EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'broadcasts_group_id_fkey' AND confdeltype <> 'n') THEN "
+    "ALTER TABLE broadcasts DROP CONSTRAINT broadcasts_group_id_fkey; "
+    "ALTER TABLE broadcasts ADD CONSTRAINT broadcasts_group_id_fkey "
+    "FOREIGN KEY (group_id) REFERENCES groups (id) ON DELETE SET NULL; "
+    "END IF; END $$",
+    # Full-text search of /find. Adding the stored column rewrites the table once.
+    "ALTER TABLE reminders ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    f"GENERATED ALWAYS AS ({REMINDER_SEARCH_VECTOR}) STORED",
+    # user_id has no GIN operator class without the btree_gin extension, but a one-element array does: the scan
+    # intersects the user's rows with the matching words instead of filtering every user's matches
+    "CREATE INDEX IF NOT EXISTS ix_reminders_search ON reminders USING gin ((ARRAY[user_id]), search_vector) "
+    "WHERE is_sent = false",
+]
+
+
+def month_start(year: int, month: int) -> datetime:
+    year += (month - 1) // 12
+    month = (month - 1) % 12 + 1
+    return datetime(year, month, 1)
+
+
+# Monthly partitions of weather_history for the current and next month, so inserts always have a partition
+def weather_history_partitions(now: datetime) -> list[str]:
+    statements = []
+    for offset in (0, 1):
+        start = month_start(now.year, now.month + offset)
+        end = month_start(start.year, start.month + 1)
+        statements.append(
+            f"CREATE TABLE IF NOT EXISTS weather_history_{start:%Y%m} PARTITION OF weather_history "
+            f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')"
+        )
+    return statements
+
 
 class Database:
     def __init__(self):
@@ -24,6 +70,12 @@ class Database:
             
             async with self.async_engine.begin() as conn:
                 await conn.run_sync(Base.metadata.create_all)
+                for statement in SCHEMA_UPGRADES:
+                    await conn.execute(text(statement))
+                # The scheduler's maintenance loop keeps them ahead later; the first weather save can't wait for it
+                if settings.WEATHER_HISTORY_ENABLED:
+                    for statement in weather_history_partitions(datetime.utcnow()):
+                        await conn.execute(text(statement))
             
             print("Database initialized successfully")
             return True
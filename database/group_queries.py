@@ -0,0 +1,27 @@
+from sqlalchemy import select
+from sqlalchemy.orm import contains_eager
+from database.models import Group, GroupMember
+
+
+# Each helper is a single joined SELECT; the related rows arrive already attached to the members
+async def get_group_members(session, group_id: int) -> list[GroupMember]:
+    # Outer join: a member whose user row is gone still counts, with .user set to None
+    stmt = (
+        select(GroupMember)
+        .outerjoin(GroupMember.user)
+        .options(contains_eager(GroupMember.user))
+        .where(GroupMember.group_id == group_id)
+        .order_by(GroupMember.joined_at, GroupMember.id)
+    )
+    return (await session.scalars(stmt)).all()
+
+
+async def get_active_memberships(session, user_id: int) -> list[GroupMember]:
+    stmt = (
+        select(GroupMember)
+        .join(GroupMember.group)
+        .options(contains_eager(GroupMember.group))
+        .where(GroupMember.user_id == user_id, Group.is_active.is_(True))
+        .order_by(Group.id)
+    )
+    return (await session.scalars(stmt)).all()
@@ -1,10 +1,18 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text, Float, BigInteger
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text, Float, BigInteger, LargeBinary, \
+    Computed
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import deferred, relationship
 from datetime import datetime
 
 Base = declarative_base()
 
+# Reminder text as searched by /find, stemmed for both Russian and English
+REMINDER_SEARCH_CONFIGS = ('russian', 'english')
+REMINDER_SEARCH_VECTOR = ' || '.join(
+    f"to_tsvector('{config}', title || ' ' || coalesce(description, ''))" for config in REMINDER_SEARCH_CONFIGS
+)
+
 class User(Base):
     __tablename__ = 'users'
     
@@ -18,7 +26,9 @@ class User(Base):
     is_active = Column(Boolean, default=True)
     
     reminders = relationship("Reminder", back_populates="user", cascade="all, delete-orphan")
-    group_memberships = relationship("GroupMember", back_populates="user", cascade="all, delete-orphan")
+    # Never loaded implicitly: load it with the query (contains_eager/selectinload) instead of once per row
+    group_memberships = relationship("GroupMember", back_populates="user", cascade="all, delete-orphan",
+                                     lazy="raise_on_sql")
     created_groups = relationship("Group", back_populates="creator")
 
 class Reminder(Base):
@@ -34,6 +44,8 @@ class Reminder(Base):
     recurring_pattern = Column(String(50))
     is_sent = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Stored, so ranking search results doesn't re-parse every match; only loaded when asked for
+    search_vector = deferred(Column(TSVECTOR, Computed(REMINDER_SEARCH_VECTOR, persisted=True)))
     
     user = relationship("User", back_populates="reminders")
 
@@ -48,7 +60,7 @@ class Group(Base):
     is_active = Column(Boolean, default=True)
     
     creator = relationship("User", back_populates="created_groups")
-    members = relationship("GroupMember", back_populates="group", cascade="all, delete-orphan")
+    members = relationship("GroupMember", back_populates="group", cascade="all, delete-orphan", lazy="raise_on_sql")
 
 class GroupMember(Base):
     __tablename__ = 'group_members'
@@ -66,9 +78,64 @@ class WeatherData(Base):
     __tablename__ = 'weather_data'
     
     id = Column(BigInteger, primary_key=True)
-    city = Column(String(100), nullable=False)
+    city = Column(String(100), nullable=False, unique=True, index=True)
+    temperature = Column(Float)
+    weather_condition = Column(String(50))
+    humidity = Column(BigInteger)
+    wind_speed = Column(Float)
+    timestamp = Column(DateTime, default=datetime.utcnow)
+
+class GeocodeCache(Base):
+    __tablename__ = 'geocode_cache'
+
+    query = Column(String(200), primary_key=True)
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
+    timezone = Column(String(50), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class WeatherHistory(Base):
+    __tablename__ = 'weather_history'
+    __table_args__ = {'postgresql_partition_by': 'RANGE (observed_at)'}
+
+    city = Column(String(100), primary_key=True)
+    observed_at = Column(DateTime, primary_key=True)
     temperature = Column(Float)
     weather_condition = Column(String(50))
     humidity = Column(BigInteger)
     wind_speed = Column(Float)
-    timestamp = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+
+class Broadcast(Base):
+    __tablename__ = 'broadcasts'
+
+    id = Column(BigInteger, primary_key=True)
+    kind = Column(String(20), nullable=False)
+    # Kept when the group is deleted, like the deliveries
+    group_id = Column(BigInteger, ForeignKey('groups.id', ondelete='SET NULL'))
+    sender_id = Column(BigInteger, nullable=False)
+    text = Column(Text, nullable=False)
+    parse_mode = Column(String(20))
+    status = Column(String(20), nullable=False, default='pending', index=True)
+    progress_chat_id = Column(BigInteger)
+    progress_message_id = Column(BigInteger)
+    total = Column(Integer, nullable=False, default=0)
+    sent = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+class BroadcastDelivery(Base):
+    __tablename__ = 'broadcast_deliveries'
+
+    broadcast_id = Column(BigInteger, ForeignKey('broadcasts.id', ondelete='CASCADE'), primary_key=True)
+    user_id = Column(BigInteger, primary_key=True)
+    status = Column(String(20), nullable=False, default='pending')
+
+class PersistenceEntry(Base):
+    __tablename__ = 'bot_persistence'
+
+    kind = Column(String(100), primary_key=True)
+    key = Column(String(100), primary_key=True)
+    data = Column(LargeBinary, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,47 @@
+from typing import NamedTuple
+from datetime import datetime
+from sqlalchemy import BigInteger, func, literal, literal_column, select
+from sqlalchemy.dialects.postgresql import array
+from database.models import REMINDER_SEARCH_CONFIGS, Reminder
+
+
+class SearchHit(NamedTuple):
+    id: int
+    title: str
+    description: str | None
+    reminder_time: datetime
+    recurring_pattern: str | None
+
+
+def _search_query(text: str):
+    # websearch syntax never fails to parse: "quoted phrases", -excluded words, or
+    queries = [func.websearch_to_tsquery(literal_column(f"'{config}'::regconfig"), text)
+               for config in REMINDER_SEARCH_CONFIGS]
+    query = queries[0]
+    for other in queries[1:]:
+        query = query.op('||')(other)
+    # As a subquery it is evaluated once per search; inline, a generic plan of the prepared statement would
+    # rebuild it for every matching row
+    return select(query).scalar_subquery()
+
+
+def search_statement(user_id: int, text: str, offset: int, limit: int):
+    query = _search_query(text)
+    return (
+        select(Reminder.id, Reminder.title, Reminder.description, Reminder.reminder_time, Reminder.recurring_pattern,
+               func.count().over().label('total'))
+        # is_sent = false, not IS false, so the partial index predicate matches
+        .filter_by(user_id=user_id, is_sent=False)
+        # Same as the user_id condition, in the form ix_reminders_search indexes
+        .where(array([Reminder.user_id]).contains(array([literal(user_id, BigInteger)])))
+        .where(Reminder.search_vector.op('@@')(query))
+        .order_by(func.ts_rank(Reminder.search_vector, query).desc(), Reminder.reminder_time, Reminder.id)
+        .offset(offset)
+        .limit(limit)
+    )
+
+
+# Ranked page of the user's pending reminders matching text, plus the total number of matches
+async def search_reminders(session, user_id: int, text: str, offset: int, limit: int) -> tuple[list[SearchHit], int]:
+    rows = (await session.execute(search_statement(user_id, text, offset, limit))).all()
+    return [SearchHit(*row[:-1]) for row in rows], rows[0].total if rows else 0
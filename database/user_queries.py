@@ -0,0 +1,18 @@
+from typing import AsyncIterator
+from sqlalchemy import select
+from database.database import db
+from database.models import User
+
+ACTIVE_USERS_BATCH = 1000
+
+
+# Server-side cursor: rows are fetched in batches as the caller consumes them, never all at once
+async def stream_active_user_ids(exclude: int = None) -> AsyncIterator[int]:
+    stmt = select(User.telegram_id).where(User.is_active.is_(True)).order_by(User.telegram_id)
+    if exclude is not None:
+        stmt = stmt.where(User.telegram_id != exclude)
+
+    async with db.get_session() as session:
+        result = await session.stream_scalars(stmt.execution_options(yield_per=ACTIVE_USERS_BATCH))
+        async for user_id in result:
+            yield user_id
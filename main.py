@@ -1,16 +1,26 @@
 import asyncio
+import importlib
 import logging
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ConversationHandler, CallbackQueryHandler
+import signal
+from telegram import Update
+from telegram.ext import Application, CommandHandler, MessageHandler, filters, ConversationHandler, CallbackQueryHandler, \
+    TypeHandler
 from config.settings import settings
 from database.database import db
+from bot.admin_handlers import AdminHandlers
 from bot.handlers import BotHandlers, REGISTRATION_USERNAME, REGISTRATION_NAME, REGISTRATION_CITY
 from bot.handlers import ADD_REMINDER_TITLE, ADD_REMINDER_DESCRIPTION, ADD_REMINDER_TIME, ADD_REMINDER_RECURRENCE
 from bot.handlers import EDIT_NAME, EDIT_CITY
 from bot.group_handlers import GroupHandlers, CREATE_GROUP_NAME, CREATE_GROUP_DESCRIPTION, ADD_GROUP_REMINDER_TITLE, \
     ADD_GROUP_REMINDER_DESCRIPTION, ADD_GROUP_REMINDER_TIME
+from utils.broadcaster import Broadcaster
 from utils.date_parser import DateParserService
+from utils.persistence import build_persistence
 from utils.reminder_scheduler import ReminderScheduler
-from utils.timezone_service import TimezoneService
+from utils.throttling import Throttler
+from utils.timezone_service import TimezoneService, timezone_resolver
+from utils.update_processor import PerUserUpdateProcessor
+from utils.webhook_server import InFlightLimitedQueue, WebhookServer
 from weather.weather_service import WeatherService
 
 logging.basicConfig(
@@ -19,10 +29,11 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-scheduler = ReminderScheduler()
 weather_service = WeatherService()
 timezone_service = TimezoneService()
+scheduler = ReminderScheduler(weather_service, timezone_service)
 date_parser = DateParserService()
+broadcaster = Broadcaster()
 
 
 async def main():
@@ -33,10 +44,24 @@ async def main():
         return
 
     logger.info("Creating Telegram bot application...")
-    application = Application.builder().token(settings.TELEGRAM_BOT_TOKEN).build()
+    builder = Application.builder().token(settings.TELEGRAM_BOT_TOKEN)
+    persistence = build_persistence()
+    if persistence:
+        builder = builder.persistence(persistence)
+    if settings.CONCURRENT_UPDATES > 1:
+        builder = builder.concurrent_updates(PerUserUpdateProcessor(settings.CONCURRENT_UPDATES))
+    if settings.BOT_MODE == 'webhook':
+        # Updates arrive through WebhookServer, so the polling updater is never created
+        builder = builder.updater(None).update_queue(InFlightLimitedQueue(settings.WEBHOOK_MAX_CONNECTIONS))
+    application = builder.build()
 
     bot_handlers = BotHandlers(weather_service, scheduler, timezone_service, date_parser)
-    group_handlers = GroupHandlers(weather_service, scheduler, timezone_service, date_parser)
+    group_handlers = GroupHandlers(weather_service, scheduler, timezone_service, date_parser, broadcaster)
+    admin_handlers = AdminHandlers(broadcaster)
+
+    if settings.THROTTLE_ENABLED:
+        # Group -1 runs before every other handler; a throttled update stops there
+        application.add_handler(TypeHandler(Update, Throttler().check), group=-1)
 
     reg_conv = ConversationHandler(
         entry_points=[CommandHandler('start', bot_handlers.start)],
@@ -46,7 +71,9 @@ async def main():
             REGISTRATION_CITY: [MessageHandler(filters.TEXT & ~filters.COMMAND, bot_handlers.register_city)]
         },
         fallbacks=[CommandHandler('cancel', bot_handlers.cancel_registration)],
-        per_user=True
+        per_user=True,
+        name='registration',
+        persistent=persistence is not None
     )
 
     reminder_conv = ConversationHandler(
@@ -59,7 +86,9 @@ async def main():
             ADD_REMINDER_RECURRENCE: [CallbackQueryHandler(bot_handlers.add_reminder_recurrence, pattern='^rec_')]
         },
         fallbacks=[CommandHandler('cancel', bot_handlers.cancel_registration)],
-        per_user=True
+        per_user=True,
+        name='add_reminder',
+        persistent=persistence is not None
     )
 
     profile_edit_conv = ConversationHandler(
@@ -70,6 +99,8 @@ async def main():
         },
         fallbacks=[CommandHandler('cancel', bot_handlers.cancel_registration)],
         per_user=True,
+        name='profile_edit',
+        persistent=persistence is not None,
         allow_reentry=True
     )
 
@@ -81,7 +112,9 @@ async def main():
                 MessageHandler(filters.TEXT & ~filters.COMMAND, group_handlers.create_group_description)]
         },
         fallbacks=[CommandHandler('cancel', bot_handlers.cancel_registration)],
-        per_user=True
+        per_user=True,
+        name='create_group',
+        persistent=persistence is not None
     )
 
     group_reminder_conv = ConversationHandler(
@@ -95,7 +128,9 @@ async def main():
                 MessageHandler(filters.TEXT & ~filters.COMMAND, group_handlers.add_group_reminder_time)]
         },
         fallbacks=[CommandHandler('cancel', bot_handlers.cancel_registration)],
-        per_user=True
+        per_user=True,
+        name='add_group_reminder',
+        persistent=persistence is not None
     )
 
     application.add_handler(reg_conv)
@@ -105,11 +140,19 @@ async def main():
     application.add_handler(group_reminder_conv)
 
     application.add_handler(CallbackQueryHandler(bot_handlers.delete_reminder_callback, pattern='^del_rem_'))
+    application.add_handler(CallbackQueryHandler(bot_handlers.reminders_page_callback, pattern='^rem_pg_'))
+    application.add_handler(CallbackQueryHandler(bot_handlers.find_page_callback, pattern='^find_pg_'))
+    application.add_handler(CallbackQueryHandler(bot_handlers.delete_reminder_from_page_callback, pattern='^rem_del_'))
 
     application.add_handler(CommandHandler('help', help_command))
     application.add_handler(CommandHandler('profile', bot_handlers.profile))
     application.add_handler(CommandHandler('my_reminders', bot_handlers.my_reminders))
+    application.add_handler(CommandHandler('find', bot_handlers.find_reminders))
     application.add_handler(CommandHandler('weather', bot_handlers.weather))
+    application.add_handler(CommandHandler('import', bot_handlers.import_help))
+    application.add_handler(MessageHandler(
+        filters.Document.FileExtension('csv') | filters.Document.FileExtension('ics'), bot_handlers.import_reminders))
+    application.add_handler(CommandHandler('export', bot_handlers.export_reminders))
 
     application.add_handler(CommandHandler('my_groups', group_handlers.my_groups))
     application.add_handler(CommandHandler('invite_to_group', group_handlers.invite_to_group_start))
@@ -118,6 +161,7 @@ async def main():
     application.add_handler(CommandHandler('group_info', group_handlers.group_info))
 
     application.add_handler(CommandHandler('user_info', bot_handlers.user_info))
+    application.add_handler(CommandHandler('broadcast', admin_handlers.broadcast))
 
     logger.info("Starting bot...")
 
@@ -126,12 +170,34 @@ async def main():
     scheduler.set_bot(application.bot)
     await scheduler.start()
 
+    broadcaster.set_bot(application.bot)
+    await broadcaster.resume()
+
     await application.start()
-    await application.updater.start_polling()
+
+    webhook_server = None
+    if settings.BOT_MODE == 'webhook':
+        webhook_server = WebhookServer(application)
+        await webhook_server.start()
+        await webhook_server.set_webhook()
+    else:
+        await application.updater.start_polling()
 
     logger.info("Bot is running. Press Ctrl-C to stop.")
 
+    if settings.STARTUP_WARM_UP:
+        asyncio.create_task(warm_up())
+
     stop_signal = asyncio.Event()
+    # docker stop / systemd send SIGTERM; without a handler the process dies before the cleanup below runs
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(signum, stop_signal.set)
+        except NotImplementedError:
+            # Windows: Ctrl-C still arrives as KeyboardInterrupt
+            pass
+
     try:
         await stop_signal.wait()
     except (asyncio.CancelledError, KeyboardInterrupt):
@@ -139,8 +205,13 @@ async def main():
     finally:
         logger.info("Cleaning up...")
         await scheduler.stop()
+        await broadcaster.stop()
+        await timezone_service.close()
+        date_parser.close()
 
-        if application.updater.running:
+        if webhook_server:
+            await webhook_server.stop()
+        if application.updater and application.updater.running:
             await application.updater.stop()
         if application.running:
             await application.stop()
@@ -149,6 +220,19 @@ async def main():
         await db.close()
         logger.info("Bot stopped successfully.")
 
+async def warm_up():
+    # Heavy dependencies are imported on first use; load them here so the first user doesn't wait
+    results = await asyncio.gather(
+        date_parser.start(),
+        timezone_resolver.warm_up(),
+        asyncio.to_thread(importlib.import_module, 'aiohttp'),
+        return_exceptions=True
+    )
+    for result in results:
+        if isinstance(result, Exception):
+            logger.warning(f"Warm-up step failed: {result}")
+    logger.info("Warm-up finished")
+
 async def help_command(update, context):
     help_text = """
 🤖 Умный Планировщик - Помощь
@@ -162,6 +246,9 @@ async def help_command(update, context):
 🔔 Напоминания:
 /add_reminder - Добавить новое напоминание
 /my_reminders - Мои напоминания
+/find <текст> - Поиск по напоминаниям
+/import - Импорт напоминаний из файла .csv или .ics
+/export - Выгрузить напоминания в календарь (.ics)
 
 👥 Группы:
 /create_group - Создать новую группу
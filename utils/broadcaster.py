@@ -0,0 +1,331 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import AsyncIterable, Iterable
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from telegram import Bot
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+from config.settings import settings
+from database.database import db
+from database.models import Broadcast, BroadcastDelivery, User
+
+logger = logging.getLogger(__name__)
+
+DELIVERY_INSERT_CHUNK = 1000
+DELIVERY_READ_PAGE = 500
+
+
+def _seconds(value) -> float:
+    # RetryAfter.retry_after is an int in PTB 21 and a timedelta in later releases
+    return value.total_seconds() if hasattr(value, 'total_seconds') else float(value)
+
+
+# Spaces sends evenly at a fixed rate shared by every running broadcast, since Telegram's limit is per bot
+class RateLimiter:
+    def __init__(self, rate_per_second: float):
+        self.interval = 1 / rate_per_second
+        self.next_slot = 0.0
+
+    async def acquire(self):
+        now = time.monotonic()
+        slot = max(now, self.next_slot)
+        self.next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def pause(self, seconds: float):
+        self.next_slot = max(self.next_slot, time.monotonic() + seconds)
+
+
+class BroadcastRun:
+    def __init__(self, broadcast: Broadcast, started: float, sent: int, failed: int):
+        self.broadcast = broadcast
+        self.started = started
+        self.sent = sent
+        self.failed = failed
+        # Reached by an earlier run before a restart; excluded from this run's send rate
+        self.resumed_from = sent + failed
+        # Outcomes not yet written to broadcast_deliveries, flushed in batches
+        self.outcomes: dict[str, list[int]] = {}
+        self.unflushed = 0
+        self.last_progress_text = None
+
+
+class Broadcaster:
+    def __init__(self):
+        self.bot = None
+        self.concurrency = settings.BROADCAST_CONCURRENCY
+        self.rate_limiter = RateLimiter(settings.BROADCAST_RATE_PER_SECOND)
+        self.progress_interval = settings.BROADCAST_PROGRESS_INTERVAL
+        self.flush_batch_size = settings.BROADCAST_FLUSH_BATCH_SIZE
+        self.tasks: dict[int, asyncio.Task] = {}
+
+    def set_bot(self, bot: Bot):
+        self.bot = bot
+
+    async def create(self, kind: str, sender_id: int, text: str,
+                     recipients: Iterable[int] | AsyncIterable[int],
+                     group_id: int = None, parse_mode: str = None,
+                     progress_chat_id: int = None, progress_message_id: int = None) -> int:
+        async with db.get_session() as session:
+            broadcast = Broadcast(
+                kind=kind,
+                group_id=group_id,
+                sender_id=sender_id,
+                text=text,
+                parse_mode=parse_mode,
+                progress_chat_id=progress_chat_id,
+                progress_message_id=progress_message_id
+            )
+            session.add(broadcast)
+            await session.flush()
+
+            chunk = []
+            if hasattr(recipients, '__aiter__'):
+                async for user_id in recipients:
+                    chunk.append(user_id)
+                    if len(chunk) >= DELIVERY_INSERT_CHUNK:
+                        await self._insert_deliveries(session, broadcast.id, chunk)
+                        chunk = []
+            else:
+                for user_id in recipients:
+                    chunk.append(user_id)
+                    if len(chunk) >= DELIVERY_INSERT_CHUNK:
+                        await self._insert_deliveries(session, broadcast.id, chunk)
+                        chunk = []
+            if chunk:
+                await self._insert_deliveries(session, broadcast.id, chunk)
+
+            broadcast.total = await session.scalar(
+                select(func.count()).select_from(BroadcastDelivery).filter_by(broadcast_id=broadcast.id))
+            await session.commit()
+            broadcast_id = broadcast.id
+
+        self.start(broadcast_id)
+        return broadcast_id
+
+    @staticmethod
+    async def _insert_deliveries(session, broadcast_id: int, user_ids: list[int]):
+        stmt = insert(BroadcastDelivery).values(
+            [{'broadcast_id': broadcast_id, 'user_id': user_id, 'status': 'pending'} for user_id in user_ids]
+        ).on_conflict_do_nothing()
+        await session.execute(stmt)
+
+    def start(self, broadcast_id: int):
+        if not self.bot:
+            raise RuntimeError("Bot instance must be set using set_bot() before starting broadcasts.")
+        if broadcast_id in self.tasks:
+            return
+
+        task = asyncio.create_task(self._run(broadcast_id))
+        self.tasks[broadcast_id] = task
+        task.add_done_callback(lambda _: self.tasks.pop(broadcast_id, None))
+
+    async def resume(self):
+        async with db.get_session() as session:
+            stmt = select(Broadcast.id).where(Broadcast.status.in_(('pending', 'running'))).order_by(Broadcast.id)
+            broadcast_ids = (await session.scalars(stmt)).all()
+
+        for broadcast_id in broadcast_ids:
+            logger.info(f"Resuming broadcast {broadcast_id}")
+            self.start(broadcast_id)
+
+    async def stop(self):
+        tasks = list(self.tasks.values())
+        for task in tasks:
+            task.cancel()
+        # Each run flushes its outcomes on cancellation; recipients claimed before the stop are never sent again
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(self, broadcast_id: int):
+        async with db.get_session() as session:
+            broadcast = await session.get(Broadcast, broadcast_id)
+            if not broadcast or broadcast.status == 'done':
+                return
+            broadcast.status = 'running'
+            broadcast.started_at = broadcast.started_at or datetime.utcnow()
+
+            # A process killed mid-send leaves its claimed recipients at 'sending' with the outcome unknown.
+            # They may already have the message, so they are settled as 'unknown' rather than sent again
+            await session.execute(
+                update(BroadcastDelivery).filter_by(broadcast_id=broadcast_id, status='sending')
+                .values(status='unknown'))
+            counts = dict((await session.execute(
+                select(BroadcastDelivery.status, func.count()).filter_by(broadcast_id=broadcast_id)
+                .group_by(BroadcastDelivery.status))).all())
+            await session.commit()
+
+        sent = counts.get('sent', 0)
+        failed = sum(count for status, count in counts.items() if status not in ('pending', 'sent'))
+        run = BroadcastRun(broadcast, time.monotonic(), sent, failed)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        workers = [asyncio.create_task(self._worker(run, queue)) for _ in range(self.concurrency)]
+        progress = asyncio.create_task(self._progress_loop(run))
+
+        try:
+            await self._produce(run, queue)
+            await queue.join()
+        finally:
+            for task in workers + [progress]:
+                task.cancel()
+            await asyncio.gather(*workers, progress, return_exceptions=True)
+            await self._flush(run)
+
+        await self._finish(run)
+
+    async def _produce(self, run: BroadcastRun, queue: asyncio.Queue):
+        # Only deliveries still pending in the database are read, so a resumed run skips everyone already reached
+        last_user_id = None
+        while True:
+            stmt = select(BroadcastDelivery.user_id).filter_by(
+                broadcast_id=run.broadcast.id, status='pending'
+            ).order_by(BroadcastDelivery.user_id).limit(DELIVERY_READ_PAGE)
+            if last_user_id is not None:
+                stmt = stmt.where(BroadcastDelivery.user_id > last_user_id)
+
+            async with db.get_session() as session:
+                user_ids = (await session.scalars(stmt)).all()
+            if not user_ids:
+                return
+
+            for user_id in user_ids:
+                await queue.put(user_id)
+            last_user_id = user_ids[-1]
+
+    async def _worker(self, run: BroadcastRun, queue: asyncio.Queue):
+        while True:
+            user_id = await queue.get()
+            try:
+                if await self._claim(run, user_id):
+                    status = await self._deliver(run.broadcast, user_id)
+                    await self._record(run, user_id, status)
+            finally:
+                queue.task_done()
+
+    @staticmethod
+    async def _claim(run: BroadcastRun, user_id: int) -> bool:
+        # Committed before the send: outcomes are saved in batches, and a recipient still 'pending' after a crash
+        # would get the message twice on resume
+        try:
+            async with db.get_session() as session:
+                result = await session.execute(
+                    update(BroadcastDelivery)
+                    .filter_by(broadcast_id=run.broadcast.id, user_id=user_id, status='pending')
+                    .values(status='sending'))
+                await session.commit()
+            return result.rowcount == 1
+        except Exception as e:
+            # Left pending: the broadcast isn't marked done, and the next resume tries this recipient
+            logger.error(f"Broadcast {run.broadcast.id}: cannot claim delivery to {user_id}: {e}")
+            return False
+
+    async def _deliver(self, broadcast: Broadcast, user_id: int) -> str:
+        while True:
+            await self.rate_limiter.acquire()
+            try:
+                await self.bot.send_message(chat_id=user_id, text=broadcast.text, parse_mode=broadcast.parse_mode)
+                return 'sent'
+            except RetryAfter as e:
+                # Flood control applies to the whole bot: hold every worker, then retry this recipient
+                self.rate_limiter.pause(_seconds(e.retry_after))
+            except Forbidden:
+                return 'blocked'
+            except Exception as e:
+                logger.warning(f"Broadcast {broadcast.id}: failed to send to {user_id}: {e}")
+                return 'failed'
+
+    async def _record(self, run: BroadcastRun, user_id: int, status: str):
+        run.outcomes.setdefault(status, []).append(user_id)
+        run.unflushed += 1
+        if status == 'sent':
+            run.sent += 1
+        else:
+            run.failed += 1
+
+        if run.unflushed >= self.flush_batch_size:
+            await self._flush(run)
+
+    async def _flush(self, run: BroadcastRun):
+        if not run.unflushed:
+            return
+
+        outcomes, run.outcomes, run.unflushed = run.outcomes, {}, 0
+        try:
+            async with db.get_session() as session:
+                for status, user_ids in outcomes.items():
+                    await session.execute(
+                        update(BroadcastDelivery)
+                        .where(BroadcastDelivery.broadcast_id == run.broadcast.id,
+                               BroadcastDelivery.user_id.in_(user_ids))
+                        .values(status=status)
+                    )
+                if outcomes.get('blocked'):
+                    # Forbidden means the user blocked the bot or deleted the account; skip them from now on
+                    await session.execute(
+                        update(User).where(User.telegram_id.in_(outcomes['blocked'])).values(is_active=False))
+                await session.execute(
+                    update(Broadcast).where(Broadcast.id == run.broadcast.id).values(sent=run.sent, failed=run.failed)
+                )
+                await session.commit()
+        except Exception as e:
+            logger.error(f"Broadcast {run.broadcast.id}: failed to save delivery progress: {e}")
+            for status, user_ids in outcomes.items():
+                run.outcomes.setdefault(status, []).extend(user_ids)
+                run.unflushed += len(user_ids)
+
+    async def _progress_loop(self, run: BroadcastRun):
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            await self._edit_progress(run, self.progress_text(run, finished=False))
+
+    async def _edit_progress(self, run: BroadcastRun, text: str):
+        broadcast = run.broadcast
+        if not broadcast.progress_chat_id or not broadcast.progress_message_id or text == run.last_progress_text:
+            return
+
+        try:
+            await self.bot.edit_message_text(
+                text, chat_id=broadcast.progress_chat_id, message_id=broadcast.progress_message_id)
+            run.last_progress_text = text
+        except BadRequest as e:
+            if 'not modified' not in str(e).lower():
+                logger.warning(f"Broadcast {broadcast.id}: cannot update progress message: {e}")
+        except TelegramError as e:
+            logger.warning(f"Broadcast {broadcast.id}: cannot update progress message: {e}")
+
+    @staticmethod
+    def progress_text(run: BroadcastRun, finished: bool) -> str:
+        total = run.broadcast.total
+        done = run.sent + run.failed
+        if not finished:
+            return f"📤 Рассылка: {done} из {total}\n✅ Доставлено: {run.sent}\n⚠️ Не доставлено: {run.failed}"
+
+        elapsed = time.monotonic() - run.started
+        rate = (done - run.resumed_from) / elapsed if elapsed > 0 else 0.0
+        return (
+            f"✅ Рассылка завершена\n"
+            f"Доставлено: {run.sent} из {total}\n"
+            f"Не доставлено: {run.failed}\n"
+            f"⏱️ {elapsed:.1f} с, {rate:.1f} сообщ./с"
+        )
+
+    async def _finish(self, run: BroadcastRun):
+        async with db.get_session() as session:
+            remaining = await session.scalar(
+                select(func.count()).select_from(BroadcastDelivery)
+                .filter_by(broadcast_id=run.broadcast.id, status='pending'))
+            if remaining:
+                # Some outcomes could not be saved; the next resume picks these recipients up again
+                logger.warning(f"Broadcast {run.broadcast.id}: {remaining} deliveries still pending")
+                return
+
+            await session.execute(
+                update(Broadcast).where(Broadcast.id == run.broadcast.id)
+                .values(status='done', finished_at=datetime.utcnow(), sent=run.sent, failed=run.failed)
+            )
+            await session.commit()
+
+        logger.info(f"Broadcast {run.broadcast.id} finished: {run.sent} sent, {run.failed} failed")
+        await self._edit_progress(run, self.progress_text(run, finished=True))
@@ -1,31 +1,236 @@
-import dateparser
+import asyncio
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
+from functools import lru_cache
 import pytz
+from config.settings import settings as app_settings
+from utils.fast_date_parser import FastDateParser, normalize_text
+from utils.tz_utils import get_timezone
+
+LANGUAGES = ['ru', 'en']
+BASE_SETTINGS = {
+    'PREFER_DATES_FROM': 'future',
+    'RETURN_AS_TIMEZONE_AWARE': True,
+    'SKIP_TOKENS': ['в', 'at', 'on', 'через', 'in'],
+}
+
+_MISS = object()
+
+
+@lru_cache(maxsize=None)
+def _timezone_settings(user_timezone: str) -> tuple:
+    return tuple({**BASE_SETTINGS, 'TIMEZONE': user_timezone, 'TO_TIMEZONE': 'UTC'}.items())
+
+
+def _hour_bucket(local_now: datetime) -> tuple:
+    return local_now.year, local_now.month, local_now.day, local_now.hour
+
+
+def _same_time_of_day(result: datetime, local_now: datetime, user_timezone: str) -> bool:
+    # Through the zone, not local_now.tzinfo: pytz pins that to the offset in effect at local_now
+    return result.astimezone(get_timezone(user_timezone)).time() == local_now.time()
+
+
+# Results keyed by (normalized text, timezone). A result that kept the reference time's seconds and
+# microseconds came from a relative phrase ("через 10 минут") and is stored as an offset to re-anchor
+# on every hit. Anything else depends on the clock ("завтра в 9", "в пятницу") and is only reused
+# within the same local hour, and only while it is still in the future. A max_size of 0 disables it.
+class ParseCache:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+
+    def get(self, key: tuple, user_now: datetime):
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISS
+
+        offset, bucket, result = entry
+        if offset is not None:
+            value = user_now.astimezone(pytz.utc) + offset
+        elif bucket == _hour_bucket(user_now) and (result is None or result > user_now):
+            value = result
+        else:
+            del self._entries[key]
+            return _MISS
+
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: tuple, user_now: datetime, result: datetime | None):
+        if not self.max_size:
+            return
+
+        if (result is not None and user_now.microsecond
+                and result.microsecond == user_now.microsecond and result.second == user_now.second):
+            # Whole days ahead: "завтра" keeps the wall clock, "через 24 часа" keeps the elapsed
+            # time, and across a DST change the two differ, so neither can be re-anchored safely
+            if _same_time_of_day(result, user_now, key[1]):
+                return
+            self._entries[key] = (result - user_now, None, None)
+        else:
+            self._entries[key] = (None, _hour_bucket(user_now), result)
+
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _warm_up_worker():
+    import dateparser
+
+    # Loads the language data in each worker up front, the first parse is otherwise ~100 ms
+    dateparser.parse('завтра в 10:00', languages=LANGUAGES)
+    dateparser.parse('tomorrow at 10 am', languages=LANGUAGES)
+
+
+def _ping():
+    return True
+
+
+def _parse_in_worker(text: str, settings: dict) -> datetime | None:
+    import dateparser
+
+    return dateparser.parse(text, settings=settings, languages=LANGUAGES)
 
 
 class DateParserService:
-    def __init__(self):
-        self.base_settings = {
-            'PREFER_DATES_FROM': 'future',
-            'RETURN_AS_TIMEZONE_AWARE': True,
-            'SKIP_TOKENS': ['в', 'at', 'on', 'через', 'in'],
-        }
+    def __init__(self, workers: int = None, timeout: float = None, cache_size: int = None):
+        self.fast_parser = FastDateParser()
+        self.cache = ParseCache(app_settings.DATE_PARSER_CACHE_SIZE if cache_size is None else cache_size)
+        self.hits = {'cache': 0, 'fast_path': 0, 'dateparser': 0, 'failed': 0, 'timeout': 0}
+        self.workers = workers or app_settings.DATE_PARSER_WORKERS
+        self.timeout = timeout or app_settings.DATE_PARSER_TIMEOUT
+        self._pool = None
+
+    @staticmethod
+    def _dateparser_settings(user_timezone: str, user_now: datetime) -> dict:
+        settings = dict(_timezone_settings(user_timezone))
+        settings['RELATIVE_BASE'] = user_now
+        return settings
+
+    def _parse_quickly(self, text: str, user_timezone: str, user_now: datetime):
+        key = (normalize_text(text), user_timezone)
+        result = self.cache.get(key, user_now)
+        if result is not _MISS:
+            self.hits['cache'] += 1
+            return key, result
 
-    def parse_natural_text(self, text: str, user_timezone: str) -> datetime | None:
+        result = self.fast_parser.parse(text, user_timezone, user_now)
+        if result is not None:
+            self.hits['fast_path'] += 1
+            self.cache.put(key, user_now, result)
+            return key, result
+        return key, _MISS
+
+    def _record(self, key: tuple, user_now: datetime, result: datetime | None) -> datetime | None:
+        self.hits['dateparser' if result is not None else 'failed'] += 1
+        self.cache.put(key, user_now, result)
+        return result
+
+    def parse_natural_text(self, text: str, user_timezone: str,
+                           relative_base: datetime = None) -> datetime | None:
         if not text:
             return None
 
         try:
-            settings = self.base_settings.copy()
-            settings['TIMEZONE'] = user_timezone
-            settings['TO_TIMEZONE'] = 'UTC'
+            user_tz = get_timezone(user_timezone)
+            user_now = relative_base.astimezone(user_tz) if relative_base else datetime.now(user_tz)
+            key, result = self._parse_quickly(text, user_timezone, user_now)
+            if result is not _MISS:
+                return result
+
+            # dateparser takes ~0.5 s to import, so the bot process only loads it if this path is used
+            import dateparser
+
+            settings = self._dateparser_settings(user_timezone, user_now)
+            return self._record(key, user_now, dateparser.parse(text, settings=settings, languages=LANGUAGES))
+
+        except Exception as e:
+            print(f"Error parsing date '{text}': {e}")
+            self.hits['failed'] += 1
+            return None
+
+    async def parse_natural_text_async(self, text: str, user_timezone: str,
+                                       relative_base: datetime = None) -> datetime | None:
+        if not text:
+            return None
 
-            user_tz = pytz.timezone(user_timezone)
-            user_now = datetime.now(user_tz)
-            settings['RELATIVE_BASE'] = user_now
+        pool = None
+        try:
+            user_tz = get_timezone(user_timezone)
+            user_now = relative_base.astimezone(user_tz) if relative_base else datetime.now(user_tz)
+            key, result = self._parse_quickly(text, user_timezone, user_now)
+            if result is not _MISS:
+                return result
 
-            return dateparser.parse(text, settings=settings, languages=['ru', 'en'])
+            pool = self._get_pool()
+            settings = self._dateparser_settings(user_timezone, user_now)
+            loop = asyncio.get_running_loop()
+            result = await asyncio.wait_for(
+                loop.run_in_executor(pool, _parse_in_worker, text, settings), self.timeout)
+            return self._record(key, user_now, result)
 
+        except asyncio.TimeoutError:
+            print(f"Parsing date '{text}' timed out after {self.timeout}s")
+            self.hits['timeout'] += 1
+            self._recycle_pool(pool)
+            return None
+        except BrokenProcessPool as e:
+            print(f"Date parser pool broke while parsing '{text}': {e}")
+            self.hits['failed'] += 1
+            self._recycle_pool(pool)
+            return None
         except Exception as e:
             print(f"Error parsing date '{text}': {e}")
-            return None
\ No newline at end of file
+            self.hits['failed'] += 1
+            return None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # forkserver: workers are forked from a clean single-threaded process with dateparser
+            # already imported, rather than from the bot process with its threads and event loop
+            context = multiprocessing.get_context('forkserver')
+            context.set_forkserver_preload(['dateparser'])
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=context,
+                initializer=_warm_up_worker
+            )
+        return self._pool
+
+    def _recycle_pool(self, pool: ProcessPoolExecutor | None):
+        if pool is None or pool is not self._pool:
+            return
+        self._pool = None
+        # A hung parse never returns, so its worker has to be killed rather than waited for.
+        # Other parses running in the same pool fail with BrokenProcessPool and return None.
+        for process in list((pool._processes or {}).values()):
+            process.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    async def start(self):
+        pool = self._get_pool()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(pool, _ping) for _ in range(self.workers)))
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> dict:
+        total = sum(self.hits.values())
+        return {
+            **self.hits,
+            'total': total,
+            'cache_rate': self.hits['cache'] / total if total else 0.0,
+            'fast_path_rate': self.hits['fast_path'] / total if total else 0.0,
+            'cache_size': len(self.cache),
+        }
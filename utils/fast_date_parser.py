@@ -0,0 +1,181 @@
+import re
+from datetime import datetime, timedelta
+import pytz
+from utils.tz_utils import get_timezone
+
+NUMBER_WORDS = {
+    'один': 1, 'одну': 1, 'одна': 1, 'два': 2, 'две': 2, 'три': 3, 'четыре': 4, 'пять': 5,
+    'шесть': 6, 'семь': 7, 'восемь': 8, 'девять': 9, 'десять': 10, 'пятнадцать': 15,
+    'двадцать': 20, 'тридцать': 30, 'сорок': 40, 'полтора': 1.5, 'полторы': 1.5,
+    'a': 1, 'an': 1, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6,
+    'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10, 'fifteen': 15, 'twenty': 20, 'thirty': 30,
+}
+
+UNIT_PATTERNS = (
+    ('minutes', r'мин\w*|minutes?|mins?'),
+    ('hours', r'час\w*|ч|hours?|hrs?|h'),
+    ('days', r'дн\w*|день|суток|сутки|days?'),
+    ('weeks', r'недел\w*|weeks?'),
+)
+
+DAY_OFFSETS = {
+    'сегодня': 0, 'today': 0,
+    'завтра': 1, 'tomorrow': 1,
+    'послезавтра': 2, 'day after tomorrow': 2,
+}
+
+WEEKDAYS = {
+    'понедельник': 0, 'вторник': 1, 'среду': 2, 'среда': 2, 'четверг': 3, 'пятницу': 4, 'пятница': 4,
+    'субботу': 5, 'суббота': 5, 'воскресенье': 6,
+    'monday': 0, 'tuesday': 1, 'wednesday': 2, 'thursday': 3, 'friday': 4, 'saturday': 5, 'sunday': 6,
+}
+
+_UNIT = '|'.join(f'(?P<{name}>{pattern})' for name, pattern in UNIT_PATTERNS)
+_NUMBER = r'\d+(?:[.,]\d+)?|' + '|'.join(sorted(NUMBER_WORDS, key=len, reverse=True))
+_TIME = (r'(?P<hour>\d{1,2})(?:[:.](?P<minute>\d{2}))?(?:\s*(?:час(?:а|ов)?|h))?'
+         r'(?:\s*(?P<meridiem>am|pm|a\.m\.|p\.m\.|утра|дня|вечера|ночи))?')
+_AT = r'(?:в|во|at|on|,)'
+_DAY = '|'.join(sorted(DAY_OFFSETS, key=len, reverse=True))
+_WEEKDAY = '|'.join(WEEKDAYS)
+
+RELATIVE_RE = re.compile(rf'(?:через|in|спустя)\s+(?:(?P<number>{_NUMBER})\s*)?(?:{_UNIT})')
+HALF_HOUR_RE = re.compile(r'(?:через|in)\s+(?:полчаса|half an hour|half hour)')
+DATE_RE = re.compile(rf'(?P<day>\d{{1,2}})\.(?P<month>\d{{1,2}})(?:\.(?P<year>\d{{4}}|\d{{2}}))?(?:\s+{_AT}?\s*{_TIME})?')
+DAY_TIME_RE = re.compile(rf'(?P<day_word>{_DAY})(?:\s+{_AT}?\s*{_TIME})?')
+TIME_DAY_RE = re.compile(rf'(?:{_AT}\s+)?{_TIME}\s+(?P<day_word>{_DAY})')
+WEEKDAY_RE = re.compile(rf'(?:(?:в|во|on)\s+)?(?P<weekday>{_WEEKDAY})(?:\s+{_AT}?\s*{_TIME})?')
+TIME_RE = re.compile(rf'(?P<preposition>{_AT}\s+)?{_TIME}')
+
+
+def normalize_text(text: str) -> str:
+    return ' '.join(text.lower().replace('ё', 'е').split())
+
+
+def _number(value: str | None) -> float:
+    if not value:
+        return 1
+    if value in NUMBER_WORDS:
+        return NUMBER_WORDS[value]
+    return float(value.replace(',', '.'))
+
+
+def _time_of_day(match: re.Match) -> tuple[int, int] | None:
+    hour = int(match['hour'])
+    minute = int(match['minute'] or 0)
+    meridiem = (match['meridiem'] or '').replace('.', '')
+
+    if meridiem in ('am', 'pm'):
+        if not 1 <= hour <= 12:
+            return None
+        hour = hour % 12 + (12 if meridiem == 'pm' else 0)
+    elif meridiem in ('дня', 'вечера'):
+        if hour < 12:
+            hour += 12
+    elif meridiem == 'ночи':
+        if hour == 12:
+            hour = 0
+        elif hour >= 9:
+            hour += 12
+    elif meridiem == 'утра' and hour == 12:
+        hour = 0
+
+    if hour > 23 or minute > 59:
+        return None
+    return hour, minute
+
+
+# Regex fast path for the phrasings the bot suggests to users; anything else returns None
+# and is left to dateparser. Results are aware UTC datetimes, like dateparser's.
+class FastDateParser:
+    def parse(self, text: str, user_timezone: str, relative_base: datetime = None) -> datetime | None:
+        text = normalize_text(text)
+        if not text:
+            return None
+
+        user_tz = get_timezone(user_timezone)
+        now = relative_base.astimezone(user_tz) if relative_base else datetime.now(user_tz)
+
+        match = RELATIVE_RE.fullmatch(text)
+        if match:
+            return self._relative(match, now)
+
+        if HALF_HOUR_RE.fullmatch(text):
+            return (now + timedelta(minutes=30)).astimezone(pytz.utc)
+
+        match = DATE_RE.fullmatch(text)
+        if match:
+            return self._date(match, now, user_tz)
+
+        match = DAY_TIME_RE.fullmatch(text) or TIME_DAY_RE.fullmatch(text)
+        if match:
+            date = now.date() + timedelta(days=DAY_OFFSETS[match['day_word']])
+            return self._at(date, match, now, user_tz)
+
+        match = WEEKDAY_RE.fullmatch(text)
+        if match:
+            days_ahead = (WEEKDAYS[match['weekday']] - now.weekday() - 1) % 7 + 1
+            date = now.date() + timedelta(days=days_ahead)
+            if match['hour'] is None:
+                return self._localize(datetime.combine(date, datetime.min.time()), user_tz)
+            return self._at(date, match, now, user_tz)
+
+        match = TIME_RE.fullmatch(text)
+        # A bare number is too ambiguous; require "в"/"at", minutes or a meridiem
+        if match and (match['preposition'] or match['minute'] or match['meridiem']):
+            time_of_day = _time_of_day(match)
+            if not time_of_day:
+                return None
+            result = now.replace(hour=time_of_day[0], minute=time_of_day[1], second=0, microsecond=0, tzinfo=None)
+            if result <= now.replace(tzinfo=None):
+                result += timedelta(days=1)
+            return self._localize(result, user_tz)
+
+        return None
+
+    @staticmethod
+    def _localize(local: datetime, user_tz) -> datetime:
+        return user_tz.localize(local).astimezone(pytz.utc)
+
+    @staticmethod
+    def _relative(match: re.Match, now: datetime) -> datetime | None:
+        amount = _number(match['number'])
+        for unit, _ in UNIT_PATTERNS:
+            if match[unit]:
+                # Offsets are applied to the absolute instant, so DST changes don't shift "через 2 часа"
+                return now.astimezone(pytz.utc) + timedelta(**{unit: amount})
+        return None
+
+    def _at(self, date, match: re.Match, now: datetime, user_tz) -> datetime | None:
+        if match['hour'] is None:
+            # No time given: keep the current time of day, as dateparser does for "завтра"
+            local = datetime.combine(date, now.time().replace(tzinfo=None))
+            return self._localize(local, user_tz)
+
+        time_of_day = _time_of_day(match)
+        if not time_of_day:
+            return None
+        return self._localize(datetime(date.year, date.month, date.day, *time_of_day), user_tz)
+
+    def _date(self, match: re.Match, now: datetime, user_tz) -> datetime | None:
+        day, month = int(match['day']), int(match['month'])
+        year = match['year']
+
+        if match['hour'] is not None:
+            time_of_day = _time_of_day(match)
+            if not time_of_day:
+                return None
+        else:
+            time_of_day = (0, 0)
+
+        try:
+            if year:
+                year = int(year) + (2000 if len(year) == 2 else 0)
+                local = datetime(year, month, day, *time_of_day)
+            else:
+                local = datetime(now.year, month, day, *time_of_day)
+                if local <= now.replace(tzinfo=None):
+                    local = local.replace(year=now.year + 1)
+        except ValueError:
+            return None
+
+        return self._localize(local, user_tz)
@@ -0,0 +1,286 @@
+import argparse
+import mmap
+import os
+import re
+import struct
+import threading
+import unicodedata
+from typing import Iterable, Iterator, NamedTuple
+from config.settings import settings
+
+# Index layout: header | cities | timezone offsets | names sorted by key | length-prefixed UTF-8 strings
+INDEX_MAGIC = b'GZT1'
+HEADER = struct.Struct('<4sIII')     # magic, city count, name count, timezone count
+CITY = struct.Struct('<ffIH')        # latitude, longitude, population, timezone index
+NAME = struct.Struct('<III')         # key offset, label offset, city index
+OFFSET = struct.Struct('<I')
+
+PREFIX_SCAN_LIMIT = 500
+
+_NON_WORD = re.compile(r'[\W_]+')
+_LATIN_OR_CYRILLIC = re.compile(r"^[A-Za-zÀ-ɏЀ-ӿ .'\-]+$")
+
+
+class City(NamedTuple):
+    name: str
+    latitude: float
+    longitude: float
+    population: int
+    timezone: str
+
+
+def normalize_name(name: str) -> str:
+    name = name.lower().replace('ё', 'е')
+    chars = []
+    for ch in unicodedata.normalize('NFD', name):
+        # Drop accents on Latin letters only: NFD would otherwise turn "й" into "и"
+        if unicodedata.combining(ch) and chars and chars[-1].isascii():
+            continue
+        chars.append(ch)
+    name = unicodedata.normalize('NFC', ''.join(chars))
+    return _NON_WORD.sub(' ', name).strip()
+
+
+def _bounded_distance(a: str, b: str, max_distance: int) -> int:
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+
+def read_bundled_cities(path: str) -> Iterator[tuple[str, list[str], float, float, int, str]]:
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip() or line.startswith('#'):
+                continue
+            name, alternate_names, latitude, longitude, _country, population, timezone = line.rstrip('\n').split('\t')
+            aliases = [alias.strip() for alias in alternate_names.split(',') if alias.strip()]
+            yield name, aliases, float(latitude), float(longitude), int(population), timezone
+
+
+def read_geonames_cities(path: str) -> Iterator[tuple[str, list[str], float, float, int, str]]:
+    # GeoNames cities*.txt dump: tab separated, 19 columns
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            fields = line.rstrip('\n').split('\t')
+            if len(fields) < 18 or not fields[17]:
+                continue
+            aliases = [fields[2]] + [
+                alias for alias in fields[3].split(',') if alias and _LATIN_OR_CYRILLIC.match(alias)
+            ]
+            yield fields[1], aliases, float(fields[4]), float(fields[5]), int(fields[14] or 0), fields[17]
+
+
+def build_index(entries: Iterable[tuple[str, list[str], float, float, int, str]], path: str):
+    strings = bytearray()
+    string_offsets: dict[str, int] = {}
+
+    def intern(value: str) -> int:
+        offset = string_offsets.get(value)
+        if offset is None:
+            data = value.encode('utf-8')[:255].decode('utf-8', 'ignore').encode('utf-8')
+            offset = len(strings)
+            strings.append(len(data))
+            strings.extend(data)
+            string_offsets[value] = offset
+        return offset
+
+    cities = []
+    timezones: dict[str, int] = {}
+    names = []
+    for name, aliases, latitude, longitude, population, timezone in entries:
+        city_index = len(cities)
+        cities.append((latitude, longitude, population, timezones.setdefault(timezone, len(timezones))))
+
+        seen = set()
+        for label in (name, *aliases):
+            key = normalize_name(label)
+            if key and key not in seen:
+                seen.add(key)
+                names.append((key.encode('utf-8'), label, city_index))
+
+    # Same key: most populous city first, so exact lookups can stop at the first hit
+    names.sort(key=lambda entry: (entry[0], -cities[entry[2]][2]))
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(INDEX_MAGIC, len(cities), len(names), len(timezones)))
+        for city in cities:
+            f.write(CITY.pack(*city))
+        for timezone in timezones:
+            f.write(OFFSET.pack(intern(timezone)))
+        name_records = [NAME.pack(intern(key.decode('utf-8')), intern(label), city_index)
+                        for key, label, city_index in names]
+        f.writelines(name_records)
+        f.write(strings)
+    os.replace(tmp_path, path)
+
+
+class Gazetteer:
+    def __init__(self, index_path: str, source_path: str = None):
+        self.index_path = index_path
+        self.source_path = source_path
+        self._file = None
+        self._mm = None
+        self._failed = False
+        # suggest() runs in a worker thread, so the first use may come from either side
+        self._load_lock = threading.Lock()
+
+    def _ensure_loaded(self) -> bool:
+        if self._mm is not None:
+            return True
+        with self._load_lock:
+            if self._mm is not None:
+                return True
+            if self._failed:
+                return False
+            return self._load()
+
+    def _load(self) -> bool:
+        try:
+            if self.source_path and os.path.exists(self.source_path) and (
+                    not os.path.exists(self.index_path)
+                    or os.path.getmtime(self.index_path) < os.path.getmtime(self.source_path)):
+                build_index(read_bundled_cities(self.source_path), self.index_path)
+
+            self._file = open(self.index_path, 'rb')
+            mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+            magic, self.city_count, self.name_count, self.timezone_count = HEADER.unpack_from(mm, 0)
+            if magic != INDEX_MAGIC:
+                mm.close()
+                raise ValueError(f"{self.index_path} is not a gazetteer index")
+
+            self._cities_base = HEADER.size
+            self._timezones_base = self._cities_base + self.city_count * CITY.size
+            self._names_base = self._timezones_base + self.timezone_count * OFFSET.size
+            self._strings_base = self._names_base + self.name_count * NAME.size
+            # Published last: readers skip the lock once _mm is set
+            self._mm = mm
+            return True
+        except Exception as e:
+            print(f"Error loading city gazetteer: {e}")
+            self.close()
+            self._failed = True
+            return False
+
+    def _string(self, offset: int) -> bytes:
+        position = self._strings_base + offset
+        length = self._mm[position]
+        return self._mm[position + 1:position + 1 + length]
+
+    def _key(self, name_index: int) -> bytes:
+        key_offset = OFFSET.unpack_from(self._mm, self._names_base + name_index * NAME.size)[0]
+        return self._string(key_offset)
+
+    def _lower_bound(self, key: bytes) -> int:
+        low, high = 0, self.name_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _city(self, name_index: int) -> City:
+        _, label_offset, city_index = NAME.unpack_from(self._mm, self._names_base + name_index * NAME.size)
+        latitude, longitude, population, timezone_index = CITY.unpack_from(
+            self._mm, self._cities_base + city_index * CITY.size)
+        timezone_offset = OFFSET.unpack_from(self._mm, self._timezones_base + timezone_index * OFFSET.size)[0]
+        return City(
+            self._string(label_offset).decode('utf-8'),
+            latitude,
+            longitude,
+            population,
+            self._string(timezone_offset).decode('utf-8')
+        )
+
+    def _city_index(self, name_index: int) -> int:
+        return NAME.unpack_from(self._mm, self._names_base + name_index * NAME.size)[2]
+
+    def lookup(self, name: str) -> City | None:
+        key = normalize_name(name).encode('utf-8')
+        if not key or not self._ensure_loaded():
+            return None
+
+        index = self._lower_bound(key)
+        if index < self.name_count and self._key(index) == key:
+            return self._city(index)
+        return None
+
+    def suggest(self, query: str, limit: int = 5) -> list[City]:
+        key = normalize_name(query)
+        if not key or not self._ensure_loaded():
+            return []
+
+        key_bytes = key.encode('utf-8')
+        matches: dict[int, tuple[tuple[int, int], int]] = {}
+
+        def consider(name_index: int, distance: int):
+            city_index = self._city_index(name_index)
+            population = CITY.unpack_from(self._mm, self._cities_base + city_index * CITY.size)[2]
+            rank = (distance, -population)
+            if city_index not in matches or rank < matches[city_index][0]:
+                matches[city_index] = (rank, name_index)
+
+        index = self._lower_bound(key_bytes)
+        end = min(index + PREFIX_SCAN_LIMIT, self.name_count)
+        while index < end and self._key(index).startswith(key_bytes):
+            consider(index, 0)
+            index += 1
+
+        if len(matches) < limit and len(key) >= 3:
+            # Typo tolerance: candidates share the first letter, compared whole and as a prefix of the same length
+            max_distance = 1 if len(key) <= 5 else 2
+            start = self._lower_bound(key[0].encode('utf-8'))
+            end = self._lower_bound(chr(ord(key[0]) + 1).encode('utf-8'))
+            for index in range(start, end):
+                candidate = self._key(index).decode('utf-8')
+                if len(candidate) < len(key) - max_distance:
+                    continue
+                # Too long to match whole: only the prefix comparison below can succeed
+                if len(candidate) > len(key) + max_distance:
+                    distance = max_distance + 1
+                else:
+                    distance = _bounded_distance(key, candidate, max_distance)
+                if distance > max_distance:
+                    # A typo in what is only the start of a longer name ranks below whole-name matches
+                    distance = _bounded_distance(key, candidate[:len(key)], max_distance) + 1
+                if distance <= max_distance + 1:
+                    consider(index, distance)
+
+        best = sorted(matches.values())[:limit]
+        return [self._city(name_index) for _, name_index in best]
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+gazetteer = Gazetteer(settings.GAZETTEER_INDEX_PATH, settings.GAZETTEER_SOURCE_PATH)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the offline city index')
+    parser.add_argument('--geonames', help='GeoNames cities*.txt dump to index instead of the bundled dataset')
+    parser.add_argument('--output', default=settings.GAZETTEER_INDEX_PATH)
+    args = parser.parse_args()
+
+    if args.geonames:
+        build_index(read_geonames_cities(args.geonames), args.output)
+    else:
+        build_index(read_bundled_cities(settings.GAZETTEER_SOURCE_PATH), args.output)
+    print(f"Gazetteer index written to {args.output}")
@@ -0,0 +1,70 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+
+class GeocodingQueue:
+    def __init__(self, geocode: Callable[[str], Any], min_interval: float):
+        self._geocode = geocode
+        self.min_interval = min_interval
+        # geopy's geocoders are blocking; one dedicated thread keeps them off the default executor
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='geocoder')
+        self._queue: asyncio.Queue | None = None
+        self._worker: asyncio.Task | None = None
+        self._pending: dict[str, asyncio.Future] = {}
+        self._last_request = 0.0
+
+    async def geocode(self, query: str, key: str = None) -> Any:
+        # key groups spellings of the same place ("Нью-Йорк", "нью йорк"); the first caller's query is sent
+        key = key or query
+        future = self._pending.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._pending[key] = future
+            self._ensure_worker()
+            self._queue.put_nowait((key, query))
+
+        # Identical keys share one upstream request; shield so one caller's cancellation doesn't cancel it for all
+        return await asyncio.shield(future)
+
+    def _ensure_worker(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            key, query = await self._queue.get()
+            future = self._pending.get(key)
+
+            delay = self.min_interval - (time.monotonic() - self._last_request)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            try:
+                result = await loop.run_in_executor(self._executor, self._geocode, query)
+                if not future.done():
+                    future.set_result(result)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self._last_request = time.monotonic()
+                self._pending.pop(key, None)
+
+    async def close(self):
+        if self._worker:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        for future in self._pending.values():
+            future.cancel()
+        self._pending.clear()
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,171 @@
+from datetime import datetime
+from typing import BinaryIO, Iterable, Iterator, NamedTuple
+
+# Minimal iCalendar (RFC 5545) support: enough to read events exported by Google Calendar, Outlook
+# and Apple Calendar line by line, and to write events one at a time, without holding the whole file
+
+PRODID = '-//Smart Planner Bot//RU'
+# Content lines are limited to 75 octets, not counting the CRLF
+MAX_LINE_OCTETS = 75
+
+
+class IcsProperty(NamedTuple):
+    params: dict[str, str]
+    value: str
+
+
+class IcsEvent(NamedTuple):
+    # Line of BEGIN:VEVENT, for error messages
+    line: int
+    properties: dict[str, IcsProperty]
+
+
+def unfold(lines: Iterable[str]) -> Iterator[tuple[int, str]]:
+    # Long lines are folded by inserting CRLF plus one space or tab; yields logical lines with their first line number
+    current, start = None, 0
+    for number, raw in enumerate(lines, 1):
+        line = raw.rstrip('\r\n')
+        if line[:1] in (' ', '\t') and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield start, current
+        current, start = line, number
+    if current is not None:
+        yield start, current
+
+
+def parse_property(line: str) -> tuple[str, IcsProperty]:
+    # NAME;PARAM=value;PARAM="quoted:value":VALUE — the value starts at the first colon outside quotes
+    in_quotes = False
+    for index, char in enumerate(line):
+        if char == '"':
+            in_quotes = not in_quotes
+        elif char == ':' and not in_quotes:
+            head, value = line[:index], line[index + 1:]
+            break
+    else:
+        raise ValueError(f"no value in '{line[:40]}'")
+
+    name, *raw_params = head.split(';')
+    params = {}
+    for raw_param in raw_params:
+        key, _, param_value = raw_param.partition('=')
+        params[key.upper()] = param_value.strip('"')
+    return name.upper(), IcsProperty(params, value)
+
+
+def unescape_text(value: str) -> str:
+    result, chars = [], iter(value)
+    for char in chars:
+        if char == '\\':
+            escaped = next(chars, '')
+            result.append('\n' if escaped in ('n', 'N') else escaped)
+        else:
+            result.append(char)
+    return ''.join(result)
+
+
+def parse_datetime(prop: IcsProperty) -> tuple[datetime, str | None, bool]:
+    # Returns (naive wall time, TZID or 'UTC' or None for floating time, all-day flag)
+    value = prop.value.strip()
+    if prop.params.get('VALUE') == 'DATE' or len(value) == 8:
+        return datetime.strptime(value, '%Y%m%d'), prop.params.get('TZID'), True
+    if value.endswith('Z'):
+        return datetime.strptime(value[:-1], '%Y%m%dT%H%M%S'), 'UTC', False
+    return datetime.strptime(value, '%Y%m%dT%H%M%S'), prop.params.get('TZID'), False
+
+
+def parse_rrule(value: str) -> dict[str, str]:
+    return {key.upper(): part_value for key, _, part_value in (part.partition('=') for part in value.split(';'))}
+
+
+def iter_events(lines: Iterable[str]) -> Iterator[IcsEvent]:
+    # Only the first occurrence of each property is kept; nested components (VALARM) are skipped
+    properties, start, depth = None, 0, 0
+    for number, line in unfold(lines):
+        if not line:
+            continue
+        upper = line.upper()
+        if upper == 'BEGIN:VEVENT':
+            properties, start, depth = {}, number, 0
+        elif properties is None:
+            continue
+        elif upper.startswith('BEGIN:'):
+            depth += 1
+        elif upper.startswith('END:'):
+            if depth:
+                depth -= 1
+            elif upper == 'END:VEVENT':
+                yield IcsEvent(start, properties)
+                properties = None
+        elif not depth:
+            try:
+                name, prop = parse_property(line)
+            except ValueError:
+                continue
+            properties.setdefault(name, prop)
+
+
+def escape_text(value: str) -> str:
+    return (value.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def format_utc(dt: datetime) -> str:
+    # dt is naive UTC
+    return dt.strftime('%Y%m%dT%H%M%SZ')
+
+
+def fold(line: str) -> bytes:
+    encoded = line.encode('utf-8')
+    if len(encoded) <= MAX_LINE_OCTETS:
+        return encoded + b'\r\n'
+
+    # Continuation lines start with a space, which counts towards their 75 octets; never split a UTF-8 sequence
+    parts, start, limit = [], 0, MAX_LINE_OCTETS
+    while len(encoded) - start > limit:
+        end = start + limit
+        while encoded[end] & 0xC0 == 0x80:
+            end -= 1
+        parts.append(encoded[start:end])
+        start, limit = end, MAX_LINE_OCTETS - 1
+    parts.append(encoded[start:])
+    return b'\r\n '.join(parts) + b'\r\n'
+
+
+class IcsWriter:
+    def __init__(self, stream: BinaryIO):
+        self.stream = stream
+        self.events = 0
+
+    def _line(self, line: str):
+        self.stream.write(fold(line))
+
+    def begin(self, calendar_name: str = None):
+        for line in ('BEGIN:VCALENDAR', 'VERSION:2.0', f'PRODID:{PRODID}', 'CALSCALE:GREGORIAN', 'METHOD:PUBLISH'):
+            self._line(line)
+        if calendar_name:
+            self._line(f'X-WR-CALNAME:{escape_text(calendar_name)}')
+
+    def event(self, uid: str, start: datetime, summary: str, description: str = None, rrule: str = None,
+              stamp: datetime = None, alarm: bool = True):
+        self._line('BEGIN:VEVENT')
+        self._line(f'UID:{uid}')
+        self._line(f'DTSTAMP:{format_utc(stamp or datetime.utcnow())}')
+        self._line(f'DTSTART:{format_utc(start)}')
+        if rrule:
+            self._line(f'RRULE:{rrule}')
+        self._line(f'SUMMARY:{escape_text(summary)}')
+        if description:
+            self._line(f'DESCRIPTION:{escape_text(description)}')
+        if alarm:
+            # Calendar apps notify at the event start, like the bot does
+            for line in ('BEGIN:VALARM', 'ACTION:DISPLAY', f'DESCRIPTION:{escape_text(summary)}', 'TRIGGER:PT0S',
+                         'END:VALARM'):
+                self._line(line)
+        self._line('END:VEVENT')
+        self.events += 1
+
+    def end(self):
+        self._line('END:VCALENDAR')
@@ -0,0 +1,76 @@
+import asyncio
+from collections import OrderedDict
+from sqlalchemy import select
+from config.settings import settings
+from database.database import db
+from database.models import Group, GroupMember
+
+
+class CachedGroup:
+    __slots__ = ('id', 'name', 'description', 'creator_id', 'is_active', 'members')
+
+    def __init__(self, group: Group, members: dict[int, bool]):
+        self.id = group.id
+        self.name = group.name
+        self.description = group.description
+        self.creator_id = group.creator_id
+        self.is_active = group.is_active
+        # user_id -> is_admin
+        self.members = members
+
+    def is_member(self, user_id: int) -> bool:
+        return user_id in self.members
+
+    def is_admin(self, user_id: int) -> bool:
+        return self.members.get(user_id, False)
+
+
+# Groups and their member sets, loaded on first use. The bot is the only writer, so handlers that
+# change membership call invalidate() after committing instead of the cache expiring on a timer.
+class MembershipCache:
+    def __init__(self, max_groups: int):
+        self.max_groups = max_groups
+        self._groups: OrderedDict[int, CachedGroup] = OrderedDict()
+        self._loads: dict[int, asyncio.Task] = {}
+
+    async def get(self, group_id: int) -> CachedGroup | None:
+        if group_id in self._groups:
+            self._groups.move_to_end(group_id)
+            return self._groups[group_id]
+
+        # Concurrent misses for the same group share one load
+        load = self._loads.get(group_id)
+        if load is None:
+            load = asyncio.create_task(self._load(group_id))
+            self._loads[group_id] = load
+            load.add_done_callback(lambda task: self._forget_load(group_id, task))
+        return await asyncio.shield(load)
+
+    def _forget_load(self, group_id: int, task: asyncio.Task):
+        if self._loads.get(group_id) is task:
+            del self._loads[group_id]
+
+    async def _load(self, group_id: int) -> CachedGroup | None:
+        async with db.get_session() as session:
+            group = await session.get(Group, group_id)
+            if group is None:
+                # Not cached: ids that don't exist (typos, deleted groups) would only fill the cache
+                return None
+            rows = await session.execute(
+                select(GroupMember.user_id, GroupMember.is_admin).filter_by(group_id=group_id))
+            cached = CachedGroup(group, {user_id: bool(is_admin) for user_id, is_admin in rows})
+
+        self._groups[group_id] = cached
+        if len(self._groups) > self.max_groups:
+            self._groups.popitem(last=False)
+        return cached
+
+    def invalidate(self, group_id: int):
+        self._groups.pop(group_id, None)
+        load = self._loads.pop(group_id, None)
+        if load is not None:
+            # A load racing with the write may have read the old rows; don't let it populate the cache
+            load.add_done_callback(lambda _: self._groups.pop(group_id, None))
+
+
+membership_cache = MembershipCache(settings.MEMBERSHIP_CACHE_MAX_GROUPS)
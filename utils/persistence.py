@@ -0,0 +1,249 @@
+import asyncio
+import json
+import logging
+import os
+import pickle
+from datetime import datetime
+from sqlalchemy import delete, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from telegram.ext import BasePersistence, PersistenceInput
+from config.settings import settings
+from database.database import db
+from database.models import PersistenceEntry
+
+logger = logging.getLogger(__name__)
+
+UPSERT_CHUNK = 500
+
+# Rows are keyed by (kind, key): kind is 'user', 'chat', 'bot' or 'conv:<handler name>'
+Changes = dict[tuple[str, str], bytes | None]
+
+
+class PostgresStore:
+    async def load(self) -> dict[tuple[str, str], bytes]:
+        async with db.get_session() as session:
+            rows = await session.execute(select(PersistenceEntry.kind, PersistenceEntry.key, PersistenceEntry.data))
+            return {(kind, key): data for kind, key, data in rows}
+
+    async def load_one(self, kind: str, key: str) -> bytes | None:
+        async with db.get_session() as session:
+            return await session.scalar(select(PersistenceEntry.data).filter_by(kind=kind, key=key))
+
+    async def write(self, changes: Changes):
+        upserts = [
+            {'kind': kind, 'key': key, 'data': data, 'updated_at': datetime.utcnow()}
+            for (kind, key), data in changes.items() if data is not None
+        ]
+        deletes = [entry for entry, data in changes.items() if data is None]
+
+        async with db.get_session() as session:
+            for start in range(0, len(upserts), UPSERT_CHUNK):
+                stmt = insert(PersistenceEntry).values(upserts[start:start + UPSERT_CHUNK])
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=['kind', 'key'],
+                    set_={'data': stmt.excluded.data, 'updated_at': stmt.excluded.updated_at}
+                )
+                await session.execute(stmt)
+            if deletes:
+                await session.execute(
+                    delete(PersistenceEntry).where(tuple_(PersistenceEntry.kind, PersistenceEntry.key).in_(deletes)))
+            await session.commit()
+
+
+# For development without a database: the whole state in one pickle file, replaced atomically on every write
+class FileStore:
+    def __init__(self, path: str):
+        self.path = path
+        self.rows: dict[tuple[str, str], bytes] = {}
+
+    async def load(self) -> dict[tuple[str, str], bytes]:
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                self.rows = pickle.load(f)
+        return dict(self.rows)
+
+    async def load_one(self, kind: str, key: str) -> bytes | None:
+        # Single process by design: nobody else writes the file
+        return self.rows.get((kind, key))
+
+    async def write(self, changes: Changes):
+        rows = dict(self.rows)
+        for entry, data in changes.items():
+            if data is None:
+                rows.pop(entry, None)
+            else:
+                rows[entry] = data
+        await asyncio.to_thread(self._dump, rows)
+        self.rows = rows
+
+    def _dump(self, rows: dict[tuple[str, str], bytes]):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(rows, f)
+        os.replace(tmp_path, self.path)
+
+
+# The Application hands over every user it saw since the last run of update_persistence, one call each.
+# Those calls only stage entries whose pickled value differs from what is stored; a single delayed
+# flush then writes everything staged by that run in one transaction.
+class WriteBehindPersistence(BasePersistence):
+    def __init__(self, store, update_interval: float, flush_delay: float):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=True, chat_data=True, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self.store = store
+        self.flush_delay = flush_delay
+        self._stored: dict[tuple[str, str], bytes] | None = None
+        self._pending: Changes = {}
+        self._flush_task: asyncio.Task | None = None
+        self._write_lock = asyncio.Lock()
+
+    async def _rows(self) -> dict[tuple[str, str], bytes]:
+        if self._stored is None:
+            self._stored = await self.store.load()
+            logger.info(f"Loaded {len(self._stored)} persisted entries")
+        return self._stored
+
+    async def _load_kind(self, kind: str) -> dict:
+        return {int(key): pickle.loads(data) for (row_kind, key), data in (await self._rows()).items()
+                if row_kind == kind}
+
+    async def get_user_data(self) -> dict[int, dict]:
+        return await self._load_kind('user')
+
+    async def get_chat_data(self) -> dict[int, dict]:
+        return await self._load_kind('chat')
+
+    async def get_bot_data(self) -> dict:
+        data = (await self._rows()).get(('bot', ''))
+        return pickle.loads(data) if data else {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str) -> dict:
+        kind = f"conv:{name}"
+        return {tuple(json.loads(key)): pickle.loads(data) for (row_kind, key), data in (await self._rows()).items()
+                if row_kind == kind}
+
+    async def update_conversation(self, name: str, key: tuple, new_state: object | None):
+        data = pickle.dumps(new_state) if new_state is not None else None
+        self._stage(f"conv:{name}", json.dumps(list(key)), data)
+
+    async def update_user_data(self, user_id: int, data: dict):
+        # Empty data is not stored, so users who never started a conversation cost nothing
+        self._stage('user', str(user_id), pickle.dumps(data) if data else None)
+
+    async def update_chat_data(self, chat_id: int, data: dict):
+        self._stage('chat', str(chat_id), pickle.dumps(data) if data else None)
+
+    async def update_bot_data(self, data: dict):
+        self._stage('bot', '', pickle.dumps(data) if data else None)
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_user_data(self, user_id: int):
+        self._stage('user', str(user_id), None)
+
+    async def drop_chat_data(self, chat_id: int):
+        self._stage('chat', str(chat_id), None)
+
+    # Called before every update: another instance (or a replica behind the webhook) may have changed the row
+    # since it was loaded. Conversation states have no such hook in PTB and are only read at startup
+    async def refresh_user_data(self, user_id: int, user_data: dict):
+        await self._refresh('user', str(user_id), user_data)
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict):
+        await self._refresh('chat', str(chat_id), chat_data)
+
+    async def refresh_bot_data(self, bot_data: dict):
+        await self._refresh('bot', '', bot_data)
+
+    async def _refresh(self, kind: str, key: str, target: dict):
+        entry = (kind, key)
+        if entry in self._pending:
+            # Staged here and not written yet, so newer than the stored row
+            return
+
+        try:
+            data = await self.store.load_one(kind, key)
+        except Exception as e:
+            logger.warning(f"Failed to refresh persisted {kind} data {key}: {e}")
+            return
+
+        rows = await self._rows()
+        if data == rows.get(entry):
+            return
+        if data is None:
+            rows.pop(entry, None)
+        else:
+            rows[entry] = data
+        # PTB keeps references to this dict (context.user_data), so it is updated in place
+        target.clear()
+        if data:
+            target.update(pickle.loads(data))
+
+    def _stage(self, kind: str, key: str, data: bytes | None):
+        entry = (kind, key)
+        if data == (self._stored or {}).get(entry):
+            # Back to the stored value: drop any pending change instead of writing the same bytes
+            self._pending.pop(entry, None)
+            return
+
+        self._pending[entry] = data
+        self._schedule_flush(self.flush_delay)
+
+    def _schedule_flush(self, delay: float):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later(delay))
+
+    async def _flush_later(self, delay: float):
+        # Entries staged while a write is in progress are picked up by the next round
+        while self._pending:
+            await asyncio.sleep(delay)
+            delay = self.flush_delay if await self._write() else self.update_interval
+
+    async def _write(self) -> bool:
+        async with self._write_lock:
+            if not self._pending:
+                return True
+
+            changes, self._pending = self._pending, {}
+            try:
+                await self.store.write(changes)
+            except Exception as e:
+                logger.error(f"Failed to persist {len(changes)} entries, retrying later: {e}")
+                # Newer values staged while the write was running take precedence
+                self._pending = {**changes, **self._pending}
+                return False
+
+            rows = await self._rows()
+            for entry, data in changes.items():
+                if data is None:
+                    rows.pop(entry, None)
+                else:
+                    rows[entry] = data
+            return True
+
+    async def flush(self):
+        await self._write()
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+
+
+def build_persistence() -> WriteBehindPersistence | None:
+    if settings.PERSISTENCE_BACKEND == 'postgres':
+        store = PostgresStore()
+    elif settings.PERSISTENCE_BACKEND == 'file':
+        store = FileStore(settings.PERSISTENCE_FILE_PATH)
+    else:
+        return None
+
+    return WriteBehindPersistence(
+        store,
+        update_interval=settings.PERSISTENCE_UPDATE_INTERVAL,
+        flush_delay=settings.PERSISTENCE_FLUSH_DELAY
+    )
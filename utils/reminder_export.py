@@ -0,0 +1,47 @@
+import asyncio
+from datetime import datetime
+from typing import BinaryIO, NamedTuple
+from sqlalchemy import select
+from config.settings import settings
+from database.database import db
+from database.models import Reminder
+from utils.ics import IcsWriter
+
+# Reminders repeat by adding a fixed step to the UTC time (ReminderScheduler.handle_recurrence), so events are
+# written in UTC as well and calendar apps repeat them at the same instants as the bot. The exception is
+# "monthly": the scheduler steps 30 days, calendars step to the same date next month. FREQ=MONTHLY keeps what the
+# user asked for and comes back as "monthly" through /import; the caller tells the user about the drift
+RRULES = {'daily': 'FREQ=DAILY', 'weekly': 'FREQ=WEEKLY', 'monthly': 'FREQ=MONTHLY'}
+UID_DOMAIN = 'smart-planner-bot'
+
+
+class ExportSummary(NamedTuple):
+    events: int
+    monthly: int
+
+
+async def write_calendar(user_id: int, stream: BinaryIO, calendar_name: str = None) -> ExportSummary:
+    # Pending reminders only: a sent one-off is history, and a recurring one is exported as its next occurrence
+    stmt = (
+        select(Reminder.id, Reminder.title, Reminder.description, Reminder.reminder_time, Reminder.recurring_pattern)
+        .filter_by(user_id=user_id, is_sent=False)
+        .order_by(Reminder.reminder_time, Reminder.id)
+        .execution_options(yield_per=settings.EXPORT_BATCH_SIZE)
+    )
+    writer = IcsWriter(stream)
+    writer.begin(calendar_name)
+    stamp = datetime.utcnow()
+    monthly = 0
+
+    # Server-side cursor: one batch of rows is in memory at a time, and each is serialized before the next is fetched
+    async with db.get_session() as session:
+        result = await session.stream(stmt)
+        async for batch in result.partitions():
+            for reminder_id, title, description, reminder_time, pattern in batch:
+                writer.event(f'reminder-{reminder_id}@{UID_DOMAIN}', reminder_time, title, description,
+                             RRULES.get(pattern), stamp)
+                monthly += pattern == 'monthly'
+            await asyncio.sleep(0)
+
+    writer.end()
+    return ExportSummary(writer.events, monthly)
@@ -0,0 +1,285 @@
+import asyncio
+import csv
+import io
+import math
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import BinaryIO, Iterator, NamedTuple
+import pytz
+from sqlalchemy import insert
+from config.settings import settings
+from database.database import db
+from database.models import Reminder
+from utils.ics import IcsEvent, IcsProperty, iter_events, parse_datetime, parse_rrule, unescape_text
+from utils.tz_utils import get_timezone
+
+TITLE_MAX_LENGTH = 200
+
+CSV_COLUMNS = {
+    'title': ('title', 'name', 'summary', 'subject', 'название', 'заголовок', 'тема'),
+    'time': ('time', 'datetime', 'date', 'start', 'when', 'время', 'дата', 'когда', 'начало'),
+    'description': ('description', 'notes', 'details', 'описание', 'заметки'),
+    'recurrence': ('recurrence', 'repeat', 'recurring', 'повтор', 'повторение'),
+}
+# Without a recognised header the columns are read in this order
+CSV_POSITIONAL = ('title', 'time', 'description', 'recurrence')
+
+CSV_TIME_FORMATS = ('%d.%m.%Y %H:%M', '%d.%m.%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%Y/%m/%d %H:%M')
+
+RECURRENCE_VALUES = {
+    '': None, 'none': None, 'no': None, 'нет': None,
+    'daily': 'daily', 'ежедневно': 'daily',
+    'weekly': 'weekly', 'еженедельно': 'weekly',
+    'monthly': 'monthly', 'ежемесячно': 'monthly',
+}
+# Same steps as ReminderScheduler.handle_recurrence
+RECURRENCE_PERIODS = {'daily': timedelta(days=1), 'weekly': timedelta(weeks=1), 'monthly': timedelta(days=30)}
+RRULE_PATTERNS = {'DAILY': 'daily', 'WEEKLY': 'weekly', 'MONTHLY': 'monthly'}
+# The scheduler repeats forever at a fixed step, so only open-ended rules made of these parts map onto it
+PLAIN_RRULE_PARTS = {'FREQ', 'INTERVAL', 'WKST'}
+WEEKDAYS = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+
+
+class ImportRow(NamedTuple):
+    line: int
+    title: str
+    description: str | None
+    # Naive UTC, like Reminder.reminder_time
+    reminder_time: datetime
+    pattern: str | None
+    # A calendar series the scheduler can't repeat, imported as its first occurrence only
+    simplified: bool = False
+
+
+class RowError(NamedTuple):
+    line: int
+    reason: str
+
+
+class ImportSummary:
+    def __init__(self):
+        self.accepted = 0
+        self.rejected = 0
+        self.simplified = 0
+        self.errors: list[RowError] = []
+
+    def reject(self, error: RowError):
+        self.rejected += 1
+        if len(self.errors) < settings.IMPORT_ERRORS_SHOWN:
+            self.errors.append(error)
+
+
+class ReminderImporter:
+    def __init__(self, user_id: int, tz_name: str, now: datetime = None):
+        self.user_id = user_id
+        self.tz_name = tz_name
+        self.tz = get_timezone(tz_name)
+        # Naive UTC
+        self.now = now or datetime.utcnow()
+
+    def _to_utc(self, local: datetime, tz=None) -> datetime:
+        if local.tzinfo is None:
+            local = (tz or self.tz).localize(local)
+        return local.astimezone(pytz.utc).replace(tzinfo=None)
+
+    def _validate(self, line: int, title: str, description: str | None, reminder_time: datetime,
+                  pattern: str | None, simplified: bool = False) -> ImportRow | RowError:
+        title = title.strip()
+        if not title:
+            return RowError(line, "нет названия")
+        if len(title) > TITLE_MAX_LENGTH:
+            return RowError(line, f"название длиннее {TITLE_MAX_LENGTH} символов")
+
+        if reminder_time <= self.now and pattern:
+            # A series that started in the past continues from its next occurrence
+            period = RECURRENCE_PERIODS[pattern]
+            reminder_time += period * math.ceil((self.now - reminder_time) / period + 1e-9)
+        if reminder_time <= self.now:
+            return RowError(line, "время в прошлом")
+
+        return ImportRow(line, title, (description or '').strip() or None, reminder_time, pattern, simplified)
+
+    def csv_rows(self, stream: BinaryIO) -> Iterator[ImportRow | RowError]:
+        text = io.TextIOWrapper(stream, encoding='utf-8-sig', errors='replace', newline='')
+        sample = text.read(4096)
+        text.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+        except csv.Error:
+            dialect = csv.excel
+
+        reader = csv.reader(text, dialect)
+        header = next(reader, None)
+        if header is None:
+            return
+
+        columns = self._csv_columns(header)
+        if columns is None:
+            columns = {name: index for index, name in enumerate(CSV_POSITIONAL)}
+            yield self._csv_row(reader.line_num, header, columns)
+        for row in reader:
+            if any(cell.strip() for cell in row):
+                yield self._csv_row(reader.line_num, row, columns)
+
+    @staticmethod
+    def _csv_columns(header: list[str]) -> dict[str, int] | None:
+        columns = {}
+        for index, cell in enumerate(header):
+            name = cell.strip().lower()
+            for column, aliases in CSV_COLUMNS.items():
+                if name in aliases and column not in columns:
+                    columns[column] = index
+        return columns if 'title' in columns and 'time' in columns else None
+
+    def _csv_row(self, line: int, row: list[str], columns: dict[str, int]) -> ImportRow | RowError:
+        def cell(column: str) -> str:
+            index = columns.get(column)
+            return row[index].strip() if index is not None and index < len(row) else ''
+
+        reminder_time = self._parse_csv_time(cell('time'))
+        if reminder_time is None:
+            return RowError(line, f"не удалось распознать время '{cell('time')[:30]}'")
+
+        recurrence = cell('recurrence').lower()
+        if recurrence not in RECURRENCE_VALUES:
+            return RowError(line, f"неизвестный повтор '{recurrence[:20]}'")
+
+        return self._validate(line, cell('title'), cell('description'), reminder_time, RECURRENCE_VALUES[recurrence])
+
+    def _parse_csv_time(self, value: str) -> datetime | None:
+        if not value:
+            return None
+        try:
+            # ISO 8601, with or without an offset
+            return self._to_utc(datetime.fromisoformat(value))
+        except ValueError:
+            pass
+        for fmt in CSV_TIME_FORMATS:
+            try:
+                return self._to_utc(datetime.strptime(value, fmt))
+            except ValueError:
+                continue
+        return None
+
+    def ics_rows(self, stream: BinaryIO) -> Iterator[ImportRow | RowError]:
+        text = io.TextIOWrapper(stream, encoding='utf-8-sig', errors='replace', newline='')
+        for event in iter_events(text):
+            yield self._ics_row(event)
+
+    def _ics_row(self, event: IcsEvent) -> ImportRow | RowError:
+        props = event.properties
+        if 'DTSTART' not in props:
+            return RowError(event.line, "нет времени начала (DTSTART)")
+
+        try:
+            start, tzid, all_day = parse_datetime(props['DTSTART'])
+        except ValueError:
+            return RowError(event.line, f"не удалось распознать время '{props['DTSTART'].value[:30]}'")
+
+        if all_day:
+            # All-day events become a reminder on the morning of that day
+            start = start.replace(hour=settings.IMPORT_ALL_DAY_HOUR)
+        reminder_time = self._to_utc(start, self._ics_timezone(tzid))
+
+        pattern, simplified = None, False
+        if 'RRULE' in props:
+            rule = parse_rrule(props['RRULE'].value)
+            series_end = self._series_end(rule, reminder_time, tzid)
+            if series_end is not None and series_end <= self.now:
+                return RowError(event.line, "серия повторений уже закончилась")
+
+            pattern = self._plain_pattern(rule, start)
+            if pattern is None:
+                # Counted, bounded or BY* rules (every Mon/Wed/Fri, yearly, ...) keep only their first occurrence
+                if reminder_time <= self.now:
+                    return RowError(event.line, f"повторение '{props['RRULE'].value[:40]}' не поддерживается, "
+                                                f"а первое событие уже прошло")
+                simplified = True
+
+        title = unescape_text(props['SUMMARY'].value) if 'SUMMARY' in props else ''
+        description = unescape_text(props['DESCRIPTION'].value) if 'DESCRIPTION' in props else None
+        return self._validate(event.line, title, description, reminder_time, pattern, simplified)
+
+    @staticmethod
+    def _plain_pattern(rule: dict[str, str], start: datetime) -> str | None:
+        pattern = RRULE_PATTERNS.get(rule.get('FREQ', '').upper())
+        if pattern is None or rule.get('INTERVAL', '1') != '1':
+            return None
+
+        parts = set(rule) - PLAIN_RRULE_PARTS
+        # Calendar apps write weekly events as FREQ=WEEKLY;BYDAY=<the start's weekday>, which is still plain
+        if pattern == 'weekly' and rule.get('BYDAY', '').upper() == WEEKDAYS[start.weekday()]:
+            parts.discard('BYDAY')
+        return None if parts else pattern
+
+    def _series_end(self, rule: dict[str, str], reminder_time: datetime, tzid: str | None) -> datetime | None:
+        # Last occurrence (naive UTC) of a bounded series, when it can be told
+        if 'UNTIL' in rule:
+            try:
+                until, until_tzid, _ = parse_datetime(IcsProperty({}, rule['UNTIL']))
+            except ValueError:
+                return None
+            return self._to_utc(until, self._ics_timezone(until_tzid or tzid))
+
+        pattern = RRULE_PATTERNS.get(rule.get('FREQ', '').upper())
+        if 'COUNT' in rule and pattern:
+            try:
+                count, interval = int(rule['COUNT']), int(rule.get('INTERVAL', '1'))
+            except ValueError:
+                return None
+            # BY* parts add occurrences within a period but never extend the series beyond COUNT periods
+            return reminder_time + RECURRENCE_PERIODS[pattern] * interval * max(count - 1, 0)
+        return None
+
+    def _ics_timezone(self, tzid: str | None):
+        if tzid == 'UTC':
+            return pytz.utc
+        if tzid:
+            try:
+                return get_timezone(tzid)
+            except pytz.UnknownTimeZoneError:
+                # Windows zone names from Outlook are not in the tz database; the user's own zone is the best guess
+                pass
+        return self.tz
+
+    async def run(self, rows: Iterator[ImportRow | RowError]) -> ImportSummary:
+        summary = ImportSummary()
+        created_at = datetime.utcnow()
+        limit = settings.IMPORT_MAX_ROWS
+
+        async with db.get_session() as session:
+            while True:
+                # Parsing a chunk is synchronous; the event loop gets control back between chunks
+                chunk = list(islice(rows, settings.IMPORT_CHUNK_SIZE))
+                if not chunk:
+                    break
+
+                values = []
+                for row in chunk:
+                    if isinstance(row, RowError):
+                        summary.reject(row)
+                    elif summary.accepted + len(values) >= limit:
+                        summary.reject(RowError(row.line, f"превышен лимит в {limit} напоминаний"))
+                    else:
+                        summary.simplified += row.simplified
+                        values.append({
+                            'user_id': self.user_id,
+                            'title': row.title,
+                            'description': row.description,
+                            'reminder_time': row.reminder_time,
+                            'timezone': self.tz_name,
+                            'is_recurring': row.pattern is not None,
+                            'recurring_pattern': row.pattern,
+                            'is_sent': False,
+                            'created_at': created_at
+                        })
+
+                if values:
+                    # Core executemany on the table: compiled once, and asyncpg sends the whole chunk in one batch.
+                    # The ORM bulk path would insert row by row, and .values(list) recompiles for every chunk.
+                    await session.execute(insert(Reminder.__table__), values)
+                    summary.accepted += len(values)
+                await asyncio.sleep(0)
+
+            await session.commit()
+        return summary
@@ -2,10 +2,12 @@ import asyncio
 from datetime import datetime, timedelta
 from telegram import Bot
 from telegram.error import TelegramError
+from config.settings import settings
 from database.database import db
 from database.models import Reminder, User
 from weather.weather_service import WeatherService
 from utils.timezone_service import TimezoneService
+from utils.tz_utils import format_local_time
 from sqlalchemy import select
 from sqlalchemy.orm import selectinload
 import pytz
@@ -13,11 +15,13 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+WEATHER_HISTORY_MAINTENANCE_INTERVAL = 24 * 3600
+
 class ReminderScheduler:
-    def __init__(self):
+    def __init__(self, weather_service: WeatherService = None, timezone_service: TimezoneService = None):
         self.bot = None
-        self.weather_service = WeatherService()
-        self.timezone_service = TimezoneService()
+        self.weather_service = weather_service or WeatherService()
+        self.timezone_service = timezone_service or TimezoneService()
         self.running = False
 
     def set_bot(self, bot: Bot):
@@ -34,6 +38,9 @@ class ReminderScheduler:
         logger.info("Reminder scheduler started")
 
         asyncio.create_task(self.reminder_check_loop())
+        asyncio.create_task(self.forecast_refresh_loop())
+        if self.weather_service.history_enabled:
+            asyncio.create_task(self.weather_history_loop())
 
     async def stop(self):
         self.running = False
@@ -69,6 +76,26 @@ class ReminderScheduler:
 
             await asyncio.sleep(30)
 
+    async def forecast_refresh_loop(self):
+        while self.running:
+            await asyncio.sleep(settings.WEATHER_FORECAST_REFRESH_INTERVAL)
+            if not self.running:
+                break
+
+            try:
+                await self.weather_service.refresh_forecasts()
+            except Exception as e:
+                logger.error(f"Error refreshing weather forecasts: {e}")
+
+    async def weather_history_loop(self):
+        while self.running:
+            try:
+                await self.weather_service.maintain_weather_history()
+            except Exception as e:
+                logger.error(f"Error maintaining weather history: {e}")
+
+            await asyncio.sleep(WEATHER_HISTORY_MAINTENANCE_INTERVAL)
+
     async def process_reminder(self, reminder_id: int, user_id: int):
         try:
             await self.send_reminder_message(reminder_id, user_id)
@@ -147,7 +174,8 @@ class ReminderScheduler:
                 weather_data = await self.weather_service.get_current_weather(user.city)
                 if weather_data:
                     time_of_day = self.weather_service.get_time_of_day()
-                    recommendation = await self.weather_service.get_weather_recommendation(user.city, time_of_day)
+                    recommendation = await self.weather_service.get_weather_recommendation(
+                        user.city, time_of_day, weather_data)
             except Exception as e:
                 logger.error(f"Weather error for {user.city}: {e}")
 
@@ -156,9 +184,8 @@ class ReminderScheduler:
                 message += f"{reminder.description}\n\n"
 
             try:
-                reminder_time_utc_aware = reminder.reminder_time.replace(tzinfo=pytz.utc)
-                local_time = reminder_time_utc_aware.astimezone(pytz.timezone(reminder.timezone))
-                message += f"Время: {local_time.strftime('%d.%m.%Y %H:%M')} ({reminder.timezone})\n"
+                local_time = format_local_time(reminder.reminder_time, reminder.timezone)
+                message += f"Время: {local_time} ({reminder.timezone})\n"
             except Exception:
                 message += f"Время: {reminder.reminder_time} (UTC)\n"
 
@@ -166,6 +193,8 @@ class ReminderScheduler:
                 message += f"\n🌤️ Погода в {user.city}: \n"
                 message += f"🌡️ {weather_data['temperature']}°C\n"
                 message += f"☁️ {weather_data['description']}\n"
+                if weather_data.get('stale'):
+                    message += "_(данные могут быть устаревшими)_\n"
 
             if recommendation:
                 message += f"\n💡 {recommendation}"
@@ -0,0 +1,127 @@
+import logging
+import math
+import time
+from collections import Counter
+from telegram import Update
+from telegram.error import TelegramError
+from telegram.ext import ApplicationHandlerStop, ContextTypes
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+SWEEP_INTERVAL = 60
+ANY_UPDATE = '*'
+
+
+# One token bucket per user as a (tokens, last refill) pair. A bucket that has refilled completely is
+# indistinguishable from a new one, so sweep() drops it and memory only holds recently active users.
+class TokenBuckets:
+    __slots__ = ('rate', 'burst', '_state')
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._state: dict[int, tuple[float, float]] = {}
+
+    def take(self, user_id: int, now: float) -> float:
+        tokens, last = self._state.get(user_id, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        if tokens >= 1:
+            self._state[user_id] = (tokens - 1, now)
+            return 0.0
+
+        self._state[user_id] = (tokens, now)
+        # Seconds until the next token
+        return (1 - tokens) / self.rate
+
+    def is_full(self, user_id: int, now: float) -> bool:
+        state = self._state.get(user_id)
+        return state is None or state[0] + (now - state[1]) * self.rate >= self.burst
+
+    def sweep(self, now: float):
+        self._state = {user_id: state for user_id, state in self._state.items()
+                       if state[0] + (now - state[1]) * self.rate < self.burst}
+
+    def __len__(self):
+        return len(self._state)
+
+
+# Runs before every handler (TypeHandler in group -1). Each user has a bucket for all updates plus a
+# stricter one for each expensive command. A throttled update is dropped with a single notice, and later
+# drops stay silent until the user gets through again.
+class Throttler:
+    def __init__(self, rate: float = None, burst: int = None, command_limits: dict[str, tuple[float, int]] = None):
+        self.updates = TokenBuckets(rate or settings.THROTTLE_RATE, burst or settings.THROTTLE_BURST)
+        self.commands = {
+            command: TokenBuckets(command_rate, command_burst)
+            for command, (command_rate, command_burst) in (command_limits or settings.THROTTLE_COMMAND_LIMITS).items()
+        }
+        self.dropped: Counter[str] = Counter()
+        self._notified: set[int] = set()
+        self._next_sweep = time.monotonic() + SWEEP_INTERVAL
+        self._reported_drops = 0
+
+    @staticmethod
+    def command_of(update: Update) -> str | None:
+        message = update.message
+        if not message or not message.text or not message.text.startswith('/'):
+            return None
+        return message.text.split(maxsplit=1)[0][1:].split('@')[0].lower()
+
+    async def check(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        user = update.effective_user
+        if not user:
+            return
+
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self._sweep(now)
+
+        bucket_name, wait = ANY_UPDATE, self.updates.take(user.id, now)
+        command = self.command_of(update)
+        if not wait and command in self.commands:
+            bucket_name, wait = command, self.commands[command].take(user.id, now)
+
+        if not wait:
+            self._notified.discard(user.id)
+            return
+
+        self.dropped[bucket_name] += 1
+        if user.id not in self._notified:
+            self._notified.add(user.id)
+            logger.info(f"Throttling user {user.id} ({bucket_name})")
+            await self._notify(update, bucket_name, wait)
+        raise ApplicationHandlerStop
+
+    @staticmethod
+    async def _notify(update: Update, bucket_name: str, wait: float):
+        seconds = max(1, math.ceil(wait))
+        if bucket_name == ANY_UPDATE:
+            text = f"⏳ Слишком много запросов. Попробуйте через {seconds} с."
+        else:
+            text = f"⏳ Команду /{bucket_name} нельзя использовать так часто. Попробуйте через {seconds} с."
+
+        try:
+            if update.callback_query:
+                await update.callback_query.answer(text)
+            elif update.effective_message:
+                await update.effective_message.reply_text(text)
+        except TelegramError:
+            pass
+
+    def _sweep(self, now: float):
+        self._next_sweep = now + SWEEP_INTERVAL
+        self.updates.sweep(now)
+        for buckets in self.commands.values():
+            buckets.sweep(now)
+
+        # A user whose buckets have all refilled gets a fresh notice next time
+        self._notified = {
+            user_id for user_id in self._notified
+            if not all(buckets.is_full(user_id, now) for buckets in (self.updates, *self.commands.values()))
+        }
+
+        total = sum(self.dropped.values())
+        if total > self._reported_drops:
+            logger.warning(f"Throttled updates dropped so far: {dict(self.dropped)}")
+            self._reported_drops = total
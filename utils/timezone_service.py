@@ -1,30 +1,169 @@
-import pytz
-from geopy.geocoders import Nominatim
-from timezonefinderL import TimezoneFinder
 import asyncio
+import threading
+from collections import OrderedDict
+import pytz
 from typing import Optional
+from sqlalchemy.dialects.postgresql import insert
+from config.settings import settings
+from database.database import db
+from database.models import GeocodeCache
+from utils.gazetteer import gazetteer, normalize_name
+from utils.geocoding import GeocodingQueue
+from utils.tz_utils import get_timezone
 
-class TimezoneService:
+# Resolved cities by normalized name, least recently used evicted first: keys come from user input
+class LocationCache:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict[str, tuple[float, float, str]] = OrderedDict()
+
+    def get(self, key: str) -> Optional[tuple[float, float, str]]:
+        location = self._entries.get(key)
+        if location is not None:
+            self._entries.move_to_end(key)
+        return location
+
+    def put(self, key: str, location: tuple[float, float, str]):
+        self._entries[key] = location
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Process-wide owner of the timezone polygons, the geocoder and its rate-limited queue.
+# TimezoneFinder loads its polygon data on construction, so it is only built on first use or warm_up().
+class TimezoneResolver:
     def __init__(self):
-        self.geolocator = Nominatim(user_agent="smart_planner_bot")
-        self.tf = TimezoneFinder()
-    
+        self._finder = None
+        self._geolocator = None
+        self._lock = threading.Lock()
+        self.geocoding_queue = GeocodingQueue(self.locate, settings.GEOCODER_MIN_INTERVAL)
+        self.locations = LocationCache(settings.GEOCODER_MEMORY_CACHE_SIZE)
+
+    @property
+    def finder(self):
+        if self._finder is None:
+            with self._lock:
+                if self._finder is None:
+                    from timezonefinderL import TimezoneFinder
+                    self._finder = TimezoneFinder()
+        return self._finder
+
+    @property
+    def geolocator(self):
+        if self._geolocator is None:
+            with self._lock:
+                if self._geolocator is None:
+                    from geopy.geocoders import Nominatim
+                    self._geolocator = Nominatim(user_agent="smart_planner_bot")
+        return self._geolocator
+
+    def timezone_at(self, latitude: float, longitude: float) -> Optional[str]:
+        return self.finder.timezone_at(lng=longitude, lat=latitude)
+
+    def locate(self, query: str) -> Optional[tuple[float, float, str]]:
+        # Runs on the geocoding thread, so the first polygon load never blocks the event loop
+        geocoded = self.geolocator.geocode(query)
+        if not geocoded:
+            return None
+
+        timezone_name = self.timezone_at(geocoded.latitude, geocoded.longitude)
+        if not timezone_name:
+            return None
+        return geocoded.latitude, geocoded.longitude, timezone_name
+
+    async def warm_up(self):
+        await asyncio.to_thread(lambda: self.finder)
+
+    async def close(self):
+        await self.geocoding_queue.close()
+
+
+timezone_resolver = TimezoneResolver()
+
+
+class TimezoneService:
+    def __init__(self, resolver: TimezoneResolver = None):
+        self.resolver = resolver or timezone_resolver
+        self.locations = self.resolver.locations
+        self.mode = settings.GEOCODER_MODE
+
+    async def resolve_city(self, city_name: str) -> Optional[tuple[float, float, str]]:
+        key = normalize_name(city_name)
+        if not key:
+            return None
+
+        location = self.locations.get(key)
+        if location:
+            return location
+
+        if self.mode != 'online':
+            city = gazetteer.lookup(key)
+            if city:
+                location = (city.latitude, city.longitude, city.timezone)
+                self.locations.put(key, location)
+                return location
+            if self.mode == 'offline':
+                return None
+
+        location = await self._load_cached_location(key)
+        if location:
+            self.locations.put(key, location)
+            return location
+
+        # Nominatim gets what the user typed: the key has lost the hyphens and accents it matches on
+        location = await self.resolver.geocoding_queue.geocode(city_name.strip(), key)
+        if not location:
+            return None
+
+        self.locations.put(key, location)
+        await self._save_cached_location(key, location)
+        return location
+
+    async def _load_cached_location(self, key: str) -> Optional[tuple[float, float, str]]:
+        try:
+            async with db.get_session() as session:
+                cached = await session.get(GeocodeCache, key)
+                if cached:
+                    return cached.latitude, cached.longitude, cached.timezone
+        except Exception as e:
+            print(f"Error reading geocode cache for {key}: {e}")
+        return None
+
+    async def _save_cached_location(self, key: str, location: tuple[float, float, str]):
+        latitude, longitude, timezone_name = location
+        try:
+            async with db.get_session() as session:
+                stmt = insert(GeocodeCache).values(
+                    query=key,
+                    latitude=latitude,
+                    longitude=longitude,
+                    timezone=timezone_name
+                ).on_conflict_do_nothing()
+                await session.execute(stmt)
+                await session.commit()
+        except Exception as e:
+            print(f"Error saving geocode cache for {key}: {e}")
+
     async def get_timezone_by_city(self, city_name: str) -> Optional[str]:
         try:
-            location = await asyncio.get_event_loop().run_in_executor(
-                None, self.geolocator.geocode, city_name
-            )
-            
-            if location:
-                timezone_name = self.tf.timezone_at(lng=location.longitude, lat=location.latitude)
-                return timezone_name
-            else:
-                return None
-                
+            location = await self.resolve_city(city_name)
+            return location[2] if location else None
         except Exception as e:
             print(f"Error getting timezone for city {city_name}: {e}")
             return None
     
+    async def suggest_cities(self, city_name: str, limit: int = 5) -> list[str]:
+        # A pure-Python edit distance over every name with the same first letter; kept off the event loop
+        cities = await asyncio.to_thread(gazetteer.suggest, city_name, limit)
+        return [city.name for city in cities]
+
+    async def close(self):
+        await self.resolver.close()
+
     def get_default_timezone(self) -> str:
         return 'Europe/Minsk'
     
@@ -34,7 +173,7 @@ class TimezoneService:
                 user_timezone = self.get_default_timezone()
             
             utc = pytz.UTC
-            user_tz = pytz.timezone(user_timezone)
+            user_tz = get_timezone(user_timezone)
             
             if dt.tzinfo is None:
                 dt = utc.localize(dt)
@@ -49,7 +188,7 @@ class TimezoneService:
             if not user_timezone:
                 user_timezone = self.get_default_timezone()
             
-            user_tz = pytz.timezone(user_timezone)
+            user_tz = get_timezone(user_timezone)
             
             if dt.tzinfo is None:
                 dt = user_tz.localize(dt)
@@ -57,4 +196,4 @@ class TimezoneService:
             return dt.astimezone(pytz.UTC)
         except Exception as e:
             print(f"Error converting from user timezone: {e}")
-            return dt
\ No newline at end of file
+            return dt
@@ -0,0 +1,65 @@
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Iterable
+import pytz
+
+DISPLAY_FORMAT = '%d.%m.%Y %H:%M'
+
+
+@lru_cache(maxsize=None)
+def get_timezone(name: str):
+    return pytz.timezone(name)
+
+
+# UTC offsets of one zone as a sorted list of transition instants, so converting
+# a naive UTC datetime is a bisect plus an addition instead of a full astimezone()
+class TransitionTable:
+    __slots__ = ('transitions', 'offsets')
+
+    def __init__(self, tz):
+        transitions = getattr(tz, '_utc_transition_times', None)
+        if transitions:
+            self.transitions = list(transitions)
+            self.offsets = [info[0] for info in tz._transition_info]
+        else:
+            self.transitions = []
+            self.offsets = [tz.utcoffset(datetime(2000, 1, 1)) or timedelta(0)]
+
+    def offset_at(self, utc_naive: datetime) -> timedelta:
+        index = bisect_right(self.transitions, utc_naive) - 1
+        return self.offsets[index if index > 0 else 0]
+
+    def to_local(self, utc_naive: datetime) -> datetime:
+        return utc_naive + self.offset_at(utc_naive)
+
+
+@lru_cache(maxsize=None)
+def get_transition_table(name: str) -> TransitionTable:
+    return TransitionTable(get_timezone(name))
+
+
+def _as_utc_naive(dt: datetime) -> datetime:
+    if dt.tzinfo is None:
+        return dt
+    return dt.astimezone(pytz.utc).replace(tzinfo=None)
+
+
+def _format(local: datetime, fmt: str) -> str:
+    if fmt == DISPLAY_FORMAT:
+        return f"{local.day:02d}.{local.month:02d}.{local.year:04d} {local.hour:02d}:{local.minute:02d}"
+    return local.strftime(fmt)
+
+
+def to_local_times(utc_times: Iterable[datetime], tz_name: str) -> list[datetime]:
+    table = get_transition_table(tz_name)
+    return [table.to_local(_as_utc_naive(dt)) for dt in utc_times]
+
+
+def format_local_times(utc_times: Iterable[datetime], tz_name: str, fmt: str = DISPLAY_FORMAT) -> list[str]:
+    table = get_transition_table(tz_name)
+    return [_format(table.to_local(_as_utc_naive(dt)), fmt) for dt in utc_times]
+
+
+def format_local_time(utc_time: datetime, tz_name: str, fmt: str = DISPLAY_FORMAT) -> str:
+    return format_local_times((utc_time,), tz_name, fmt)[0]
@@ -0,0 +1,52 @@
+import asyncio
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+# Runs updates concurrently, but each user's updates one at a time and in arrival order, so conversation
+# steps never race each other. Updates without a user or chat are not serialized.
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self._locks: dict[int, asyncio.Lock] = {}
+        self._queued: dict[int, int] = {}
+
+    @staticmethod
+    def ordering_key(update: object) -> int | None:
+        if not isinstance(update, Update):
+            return None
+        if update.effective_user:
+            return update.effective_user.id
+        if update.effective_chat:
+            return update.effective_chat.id
+        return None
+
+    async def process_update(self, update: object, coroutine):
+        key = self.ordering_key(update)
+        if key is None:
+            await super().process_update(update, coroutine)
+            return
+
+        # The user's lock is taken before a concurrency slot, so a user with a backlog waits without
+        # holding slots other users could run in
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        self._queued[key] = self._queued.get(key, 0) + 1
+        try:
+            async with lock:
+                await super().process_update(update, coroutine)
+        finally:
+            self._queued[key] -= 1
+            if not self._queued[key]:
+                del self._queued[key]
+                del self._locks[key]
+
+    async def do_process_update(self, update: object, coroutine):
+        await coroutine
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
@@ -0,0 +1,107 @@
+import asyncio
+import hmac
+import json
+import logging
+import secrets
+from typing import TYPE_CHECKING
+from telegram import Update
+from telegram.ext import Application
+from config.settings import settings
+
+if TYPE_CHECKING:
+    from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+SECRET_TOKEN_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+# The Application calls task_done() once an update has been handled, so updates between put_update() and
+# task_done() are the ones in flight. Past the limit the webhook request waits, and Telegram waits with it:
+# it sends the next update on a connection only after the previous one is answered
+class InFlightLimitedQueue(asyncio.Queue):
+    def __init__(self, max_in_flight: int):
+        super().__init__()
+        self.max_in_flight = max_in_flight
+        self._slots = asyncio.Semaphore(max_in_flight)
+
+    async def put_update(self, update: Update):
+        await self._slots.acquire()
+        await self.put(update)
+
+    def task_done(self):
+        super().task_done()
+        # Also called for the Application's own stop signal; one extra slot at shutdown is harmless
+        self._slots.release()
+
+
+# Receives updates pushed by Telegram and hands them to the Application's update queue, the same queue
+# the polling updater fills, so handlers run identically in both modes
+class WebhookServer:
+    def __init__(self, application: Application, url: str = None, path: str = None, listen: str = None,
+                 port: int = None, secret_token: str = None, max_connections: int = None):
+        self.application = application
+        self.path = '/' + (path or settings.WEBHOOK_PATH).strip('/')
+        self.url = (url or settings.WEBHOOK_URL or '').rstrip('/')
+        self.listen = listen or settings.WEBHOOK_LISTEN
+        self.port = port or settings.WEBHOOK_PORT
+        # Telegram echoes the token back in a header; without one configured, a fresh token is registered each start
+        self.secret_token = secret_token or settings.WEBHOOK_SECRET_TOKEN or secrets.token_urlsafe(32)
+        self.max_connections = max_connections or settings.WEBHOOK_MAX_CONNECTIONS
+        self.runner = None
+        self.received = 0
+        self.rejected = 0
+
+    async def start(self):
+        # aiohttp is imported on first use to keep it out of bot startup in polling mode
+        from aiohttp import web
+
+        app = web.Application()
+        app.router.add_post(self.path, self.handle_update)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.listen, self.port)
+        await site.start()
+        logger.info(f"Webhook server listening on {self.listen}:{self.port}{self.path}")
+
+    async def set_webhook(self):
+        if not self.url:
+            raise RuntimeError("WEBHOOK_URL must be set to run in webhook mode.")
+
+        await self.application.bot.set_webhook(
+            url=f"{self.url}{self.path}",
+            secret_token=self.secret_token,
+            max_connections=self.max_connections,
+            allowed_updates=Update.ALL_TYPES
+        )
+        logger.info(f"Webhook set to {self.url}{self.path} (max_connections={self.max_connections})")
+
+    async def handle_update(self, request: 'web.Request') -> 'web.Response':
+        from aiohttp import web
+
+        token = request.headers.get(SECRET_TOKEN_HEADER, '')
+        if not hmac.compare_digest(token.encode(), self.secret_token.encode()):
+            self.rejected += 1
+            return web.Response(status=403)
+
+        try:
+            update = Update.de_json(json.loads(await request.read()), self.application.bot)
+        except (ValueError, TypeError, KeyError) as e:
+            logger.warning(f"Malformed update rejected: {e}")
+            return web.Response(status=400)
+
+        # Answer as soon as the update is queued: Telegram waits for the response before sending the next update
+        # on this connection. With InFlightLimitedQueue that also waits while too many updates are in flight
+        queue = self.application.update_queue
+        if isinstance(queue, InFlightLimitedQueue):
+            await queue.put_update(update)
+        else:
+            await queue.put(update)
+        self.received += 1
+        return web.Response()
+
+    async def stop(self):
+        # The webhook stays registered, so Telegram holds updates until the bot is back
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
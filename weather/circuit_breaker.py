@@ -0,0 +1,71 @@
+import time
+
+
+class UpstreamUnavailableError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_started_at = 0.0
+
+    def allow_request(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+
+        now = time.monotonic()
+        if self.state == self.OPEN and now - self.opened_at >= self.reset_timeout:
+            # Let a single probe through; its outcome decides whether the circuit closes again
+            self.state = self.HALF_OPEN
+            self.probe_started_at = now
+            return True
+
+        if self.state == self.HALF_OPEN and now - self.probe_started_at >= self.reset_timeout:
+            # The probe never reported back; give its slot to another request
+            self.probe_started_at = now
+            return True
+
+        return False
+
+    def release_probe(self):
+        # The granted request was never sent; the next one may probe straight away
+        if self.state == self.HALF_OPEN:
+            self.probe_started_at = 0.0
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+class RequestBudget:
+    def __init__(self, requests_per_minute: int):
+        self.requests_per_minute = requests_per_minute
+        self.window_start = 0.0
+        self.used = 0
+
+    def try_acquire(self) -> bool:
+        now = time.monotonic()
+        if now - self.window_start >= 60:
+            self.window_start = now
+            self.used = 0
+
+        if self.used >= self.requests_per_minute:
+            return False
+
+        self.used += 1
+        return True
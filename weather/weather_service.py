@@ -1,138 +1,459 @@
-from typing import Any
-import aiohttp
-from datetime import datetime, timedelta
-from sqlalchemy import select, delete
+import asyncio
+import time
+from collections import defaultdict
+from typing import TYPE_CHECKING, Any
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, text
+from sqlalchemy.dialects.postgresql import insert
 from config.settings import settings
-from database.database import db
-from database.models import WeatherData
+from database.database import db, month_start, weather_history_partitions
+from database.models import WeatherData, WeatherHistory
+from weather.circuit_breaker import CircuitBreaker, RequestBudget, UpstreamUnavailableError
+
+if TYPE_CHECKING:
+    import aiohttp
+
+FORECAST_SLOT_SECONDS = 3 * 3600
+FORECAST_IDLE_EVICTION = 24 * 3600
+
+
+# 5-day forecast for one location stored as a list indexed by 3-hour slot
+class ForecastSlots:
+    __slots__ = ('start_ts', 'slots', 'fetched_at', 'last_used')
+
+    def __init__(self, start_ts: int, slots: list, fetched_at: float):
+        self.start_ts = start_ts
+        self.slots = slots
+        self.fetched_at = fetched_at
+        self.last_used = fetched_at
+
+    def _index(self, when: datetime) -> int:
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        # Round to the nearest slot rather than the previous one
+        return int((when.timestamp() - self.start_ts + FORECAST_SLOT_SECONDS / 2) // FORECAST_SLOT_SECONDS)
+
+    def at(self, when: datetime) -> dict[str, Any] | None:
+        index = self._index(when)
+        if 0 <= index < len(self.slots):
+            return self.slots[index]
+        return None
+
+    def between(self, start: datetime, end: datetime) -> list:
+        first = max(self._index(start), 0)
+        last = min(self._index(end), len(self.slots) - 1)
+        return [slot for slot in self.slots[first:last + 1] if slot]
+
 
 class WeatherService:
-    def __init__(self):
+    def __init__(self, api_root: str = None):
         self.api_key = settings.OPENWEATHER_API_KEY
-        self.base_url = settings.WEATHER_API_URL
-        self.forecast_url = settings.WEATHER_FORECAST_URL
+        if api_root:
+            api_root = api_root.rstrip('/')
+            self.base_url = f"{api_root}/weather"
+            self.forecast_url = f"{api_root}/forecast"
+            self.group_url = f"{api_root}/group"
+        else:
+            self.base_url = settings.WEATHER_API_URL
+            self.forecast_url = settings.WEATHER_FORECAST_URL
+            self.group_url = settings.WEATHER_GROUP_URL
         self.cache_duration = timedelta(seconds=settings.WEATHER_CHECK_INTERVAL)
+        self.group_size = settings.WEATHER_GROUP_SIZE
+        self.batch_concurrency = settings.WEATHER_BATCH_CONCURRENCY
+        # OpenWeather city ids learned from single-city responses; the group endpoint only accepts ids
+        self.city_ids: dict[str, int] = {}
+        self.forecast_refresh_interval = settings.WEATHER_FORECAST_REFRESH_INTERVAL
+        self.forecasts: dict[str, ForecastSlots] = {}
+        self._forecast_refreshes: dict[str, asyncio.Future] = {}
+        self._weather_refreshes: dict[str, asyncio.Task] = {}
+        self.request_timeout = settings.WEATHER_REQUEST_TIMEOUT
+        self.circuit_breaker = CircuitBreaker(
+            settings.WEATHER_CIRCUIT_FAILURE_THRESHOLD,
+            settings.WEATHER_CIRCUIT_RESET_TIMEOUT
+        )
+        self.request_budget = RequestBudget(settings.WEATHER_REQUESTS_PER_MINUTE)
+        self.history_enabled = settings.WEATHER_HISTORY_ENABLED
+        self.history_retention_days = settings.WEATHER_HISTORY_RETENTION_DAYS
+
+    def _params(self, **extra) -> dict[str, Any]:
+        return {
+            **extra,
+            'appid': self.api_key,
+            'units': 'metric',
+            'lang': 'ru'
+        }
+
+    @staticmethod
+    def _parse_current(data: dict) -> dict[str, Any]:
+        return {
+            'temperature': data['main']['temp'],
+            'description': data['weather'][0]['description'],
+            'humidity': data['main']['humidity'],
+            'wind_speed': data['wind']['speed'],
+            'condition': data['weather'][0]['main'].lower()
+        }
+
+    @staticmethod
+    def _record_to_weather(weather_record: WeatherData, stale: bool = False) -> dict[str, Any]:
+        return {
+            'temperature': weather_record.temperature,
+            'description': weather_record.weather_condition,
+            'humidity': weather_record.humidity,
+            'wind_speed': weather_record.wind_speed,
+            'condition': weather_record.weather_condition,
+            'stale': stale
+        }
+
+    def _session(self) -> 'aiohttp.ClientSession':
+        # aiohttp is imported on first use to keep it out of bot startup
+        import aiohttp
+        return aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.request_timeout))
+
+    async def _get_json(self, session: 'aiohttp.ClientSession', url: str, params: dict) -> tuple[int, dict | None]:
+        # Circuit first: calls rejected while it is open never reach OpenWeather and must not spend the budget
+        if not self.circuit_breaker.allow_request():
+            raise UpstreamUnavailableError("OpenWeather circuit is open")
+        if not self.request_budget.try_acquire():
+            self.circuit_breaker.release_probe()
+            raise UpstreamUnavailableError("OpenWeather request budget exhausted")
+
+        recorded = False
+        try:
+            async with session.get(url, params=params) as response:
+                # 4xx such as an unknown city mean the upstream itself is healthy
+                if response.status >= 500 or response.status == 429:
+                    self.circuit_breaker.record_failure()
+                    recorded = True
+                    return response.status, None
+
+                self.circuit_breaker.record_success()
+                recorded = True
+                if response.status != 200:
+                    return response.status, None
+                return response.status, await response.json()
+        finally:
+            # Network errors, timeouts, cancellation or anything unexpected: without an outcome a half-open
+            # circuit would wait for its probe forever
+            if not recorded:
+                self.circuit_breaker.record_failure()
+
+    async def _fetch_current(self, session: 'aiohttp.ClientSession', city: str) -> dict | None:
+        status, data = await self._get_json(session, self.base_url, self._params(q=city))
+        if data is None:
+            print(f"Weather API error: {status}")
+            return None
+
+        if 'id' in data:
+            self.city_ids[city] = data['id']
+        return data
+
+    async def _fetch_group(self, session: 'aiohttp.ClientSession', cities: list[str]) -> dict[str, dict]:
+        cities_by_id = defaultdict(list)
+        for city in cities:
+            cities_by_id[self.city_ids[city]].append(city)
+
+        params = self._params(id=','.join(str(city_id) for city_id in cities_by_id))
+        status, data = await self._get_json(session, self.group_url, params)
+        if data is None:
+            print(f"Weather group API error: {status}")
+            return {}
+
+        fetched = {}
+        for item in data.get('list', []):
+            for city in cities_by_id.get(item.get('id'), []):
+                fetched[city] = item
+        return fetched
 
     async def get_current_weather(self, city: str) -> dict[str, Any] | None:
-        cached_weather = await self.get_cached_weather(city)
+        cached_weather = await self.get_cached_weather(city, allow_stale=True)
         if cached_weather:
+            if cached_weather['stale']:
+                # Serve what we have right away and let the refresh happen off the caller's path
+                self.refresh_in_background(city)
             return cached_weather
 
+        return await self.fetch_current_weather(city)
+
+    async def fetch_current_weather(self, city: str) -> dict[str, Any] | None:
         try:
-            params = {
-                'q': city,
-                'appid': self.api_key,
-                'units': 'metric',
-                'lang': 'ru'
-            }
-
-            async with aiohttp.ClientSession() as session:
-                async with session.get(self.base_url, params=params) as response:
-                    if response.status == 200:
-                        data = await response.json()
-
-                        weather_data = {
-                            'temperature': data['main']['temp'],
-                            'description': data['weather'][0]['description'],
-                            'humidity': data['main']['humidity'],
-                            'wind_speed': data['wind']['speed'],
-                            'condition': data['weather'][0]['main'].lower()
-                        }
-
-                        await self.save_weather_data(city, data)
-                        return weather_data
-                    else:
-                        print(f"Weather API error: {response.status}")
-                        return None
+            async with self._session() as session:
+                data = await self._fetch_current(session, city)
+
+            if data:
+                await self.save_weather_data(city, data)
+                return {**self._parse_current(data), 'stale': False}
+            return None
+        except UpstreamUnavailableError:
+            return None
         except Exception as e:
             print(f"Error getting weather data: {e}")
             return None
 
-    async def get_cached_weather(self, city: str) -> dict[str, Any] | None:
+    def refresh_in_background(self, city: str):
+        if city in self._weather_refreshes:
+            return
+
+        task = asyncio.create_task(self.fetch_current_weather(city))
+        self._weather_refreshes[city] = task
+        task.add_done_callback(lambda _: self._weather_refreshes.pop(city, None))
+
+    async def get_current_weather_batch(self, cities: list[str]) -> dict[str, dict[str, Any] | None]:
+        cities = list(dict.fromkeys(cities))
+        cached = await self.get_cached_weather_batch(cities, allow_stale=True)
+        results: dict[str, dict[str, Any] | None] = {
+            city: weather for city, weather in cached.items() if not weather['stale']
+        }
+        missing = [city for city in cities if city not in results]
+        if not missing:
+            return results
+
+        fetched: dict[str, dict] = {}
+        semaphore = asyncio.Semaphore(self.batch_concurrency)
+
+        async def fetch_group(chunk: list[str]) -> dict[str, dict]:
+            async with semaphore:
+                try:
+                    return await self._fetch_group(session, chunk)
+                except UpstreamUnavailableError:
+                    return {}
+                except Exception as e:
+                    print(f"Error getting group weather data: {e}")
+                    return {}
+
+        async def fetch_one(city: str) -> tuple[str, dict | None]:
+            async with semaphore:
+                try:
+                    return city, await self._fetch_current(session, city)
+                except UpstreamUnavailableError:
+                    return city, None
+                except Exception as e:
+                    print(f"Error getting weather data for {city}: {e}")
+                    return city, None
+
+        try:
+            async with self._session() as session:
+                known = [city for city in missing if city in self.city_ids]
+                chunks = [known[i:i + self.group_size] for i in range(0, len(known), self.group_size)]
+                for chunk_result in await asyncio.gather(*(fetch_group(chunk) for chunk in chunks)):
+                    fetched.update(chunk_result)
+
+                # Unknown ids and anything the group endpoint did not return fall back to single-city calls
+                rest = [city for city in missing if city not in fetched]
+                for city, data in await asyncio.gather(*(fetch_one(city) for city in rest)):
+                    if data:
+                        fetched[city] = data
+        except Exception as e:
+            print(f"Error getting batch weather data: {e}")
+
+        if fetched:
+            await self.save_weather_data_batch(fetched)
+
+        for city in missing:
+            data = fetched.get(city)
+            # Fall back to the stale cached observation when the upstream could not provide a fresh one
+            results[city] = {**self._parse_current(data), 'stale': False} if data else cached.get(city)
+        return results
+
+    async def get_cached_weather(self, city: str, allow_stale: bool = False) -> dict[str, Any] | None:
         try:
             async with db.get_session() as session:
-                stmt = select(WeatherData).filter_by(city=city).order_by(WeatherData.timestamp.desc()).limit(1)
+                stmt = select(WeatherData).filter_by(city=city)
                 weather_record = await session.scalar(stmt)
 
-                if weather_record:
-                    if datetime.utcnow() - weather_record.timestamp < self.cache_duration:
-                        return {
-                            'temperature': weather_record.temperature,
-                            'description': weather_record.weather_condition,
-                            'humidity': weather_record.humidity,
-                            'wind_speed': weather_record.wind_speed,
-                            'condition': weather_record.weather_condition
-                        }
-                    else:
-                        await self.cleanup_old_weather(city)
+            if weather_record:
+                stale = datetime.utcnow() - weather_record.timestamp >= self.cache_duration
+                if not stale or allow_stale:
+                    return self._record_to_weather(weather_record, stale)
         except Exception as e:
             print(f"Error checking cached weather: {e}")
         return None
 
+    async def get_cached_weather_batch(self, cities: list[str], allow_stale: bool = False) -> dict[str, dict[str, Any]]:
+        if not cities:
+            return {}
+
+        cached = {}
+        try:
+            async with db.get_session() as session:
+                stmt = select(WeatherData).where(WeatherData.city.in_(cities))
+                weather_records = (await session.scalars(stmt)).all()
+
+            fresh_after = datetime.utcnow() - self.cache_duration
+            for weather_record in weather_records:
+                stale = weather_record.timestamp <= fresh_after
+                if not stale or allow_stale:
+                    cached[weather_record.city] = self._record_to_weather(weather_record, stale)
+        except Exception as e:
+            print(f"Error checking cached weather: {e}")
+        return cached
+
+    @staticmethod
+    def _build_row(city: str, data: dict, observed_at: datetime) -> dict[str, Any]:
+        return {
+            'city': city,
+            'temperature': data['main']['temp'],
+            'weather_condition': data['weather'][0]['main'].lower(),
+            'humidity': data['main']['humidity'],
+            'wind_speed': data['wind']['speed'],
+            'timestamp': observed_at
+        }
+
     async def save_weather_data(self, city: str, data: dict):
+        await self.save_weather_data_batch({city: data})
+
+    async def save_weather_data_batch(self, items: dict[str, dict]):
+        observed_at = datetime.utcnow()
+        rows = [self._build_row(city, data, observed_at) for city, data in items.items()]
+
         try:
             async with db.get_session() as session:
-                await session.execute(delete(WeatherData).where(WeatherData.city == city))
-
-                weather_record = WeatherData(
-                    city=city,
-                    temperature=data['main']['temp'],
-                    weather_condition=data['weather'][0]['main'].lower(),
-                    humidity=data['main']['humidity'],
-                    wind_speed=data['wind']['speed'],
-                    timestamp=datetime.utcnow()
+                stmt = insert(WeatherData).values(rows)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[WeatherData.city],
+                    set_={
+                        column: stmt.excluded[column]
+                        for column in ('temperature', 'weather_condition', 'humidity', 'wind_speed', 'timestamp')
+                    }
                 )
-                session.add(weather_record)
+                await session.execute(stmt)
                 await session.commit()
         except Exception as e:
             print(f"Error saving weather data: {e}")
+            return
+
+        if self.history_enabled:
+            await self._save_weather_history(rows, observed_at)
 
-    async def cleanup_old_weather(self, city: str):
+    async def _save_weather_history(self, rows: list[dict], observed_at: datetime):
+        # A separate transaction: a missing partition or any other history failure must not lose current weather
+        history_rows = [
+            {'observed_at': observed_at, **{k: v for k, v in row.items() if k != 'timestamp'}}
+            for row in rows
+        ]
         try:
             async with db.get_session() as session:
-                await session.execute(delete(WeatherData).where(WeatherData.city == city))
+                await session.execute(insert(WeatherHistory).values(history_rows).on_conflict_do_nothing())
                 await session.commit()
-        except Exception:
-            pass
+        except Exception as e:
+            print(f"Error saving weather history: {e}")
+
+    async def maintain_weather_history(self):
+        if not self.history_enabled:
+            return
+
+        now = datetime.utcnow()
+        retention_cutoff = now - timedelta(days=self.history_retention_days)
 
-    async def get_weather_forecast(self, city: str, hours_ahead: int = 24) -> list:
         try:
-            params = {
-                'q': city,
-                'appid': self.api_key,
-                'units': 'metric',
-                'lang': 'ru'
-            }
-
-            async with aiohttp.ClientSession() as session:
-                async with session.get(self.forecast_url, params=params) as response:
-                    if response.status == 200:
-                        data = await response.json()
-
-                        forecast = []
-                        current_time = datetime.now()
-                        target_time = current_time + timedelta(hours=hours_ahead)
-
-                        for item in data['list']:
-                            forecast_time = datetime.fromtimestamp(item['dt'])
-                            if forecast_time <= target_time:
-                                forecast.append({
-                                    'time': forecast_time,
-                                    'temperature': item['main']['temp'],
-                                    'description': item['weather'][0]['description'],
-                                    'condition': item['weather'][0]['main'].lower(),
-                                    'humidity': item['main']['humidity'],
-                                    'wind_speed': item['wind']['speed']
-                                })
-
-                        return forecast
-                    else:
-                        print(f"Weather forecast API error: {response.status}")
-                        return []
+            async with db.get_session() as session:
+                for statement in weather_history_partitions(now):
+                    await session.execute(text(statement))
+
+                partitions = await session.scalars(text(
+                    "SELECT child.relname FROM pg_inherits "
+                    "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+                    "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+                    "WHERE parent.relname = 'weather_history'"
+                ))
+
+                for partition in partitions.all():
+                    try:
+                        start = datetime.strptime(partition.rsplit('_', 1)[-1], '%Y%m')
+                    except ValueError:
+                        continue
+
+                    # Whole partitions are dropped once every row in them is past retention
+                    if month_start(start.year, start.month + 1) <= retention_cutoff:
+                        await session.execute(text(f'DROP TABLE IF EXISTS "{partition}"'))
+
+                await session.commit()
+        except Exception as e:
+            print(f"Error maintaining weather history: {e}")
+
+    @staticmethod
+    def _parse_forecast_item(item: dict) -> dict[str, Any]:
+        return {
+            'time': datetime.fromtimestamp(item['dt'], tz=timezone.utc),
+            'temperature': item['main']['temp'],
+            'description': item['weather'][0]['description'],
+            'condition': item['weather'][0]['main'].lower(),
+            'humidity': item['main']['humidity'],
+            'wind_speed': item['wind']['speed']
+        }
+
+    async def refresh_forecast(self, city: str) -> ForecastSlots | None:
+        try:
+            async with self._session() as session:
+                status, data = await self._get_json(session, self.forecast_url, self._params(q=city))
+            if data is None:
+                print(f"Weather forecast API error: {status}")
+                return None
+
+            items = data.get('list') or []
+            if not items:
+                return None
+
+            start_ts = items[0]['dt']
+            slots = [None] * ((items[-1]['dt'] - start_ts) // FORECAST_SLOT_SECONDS + 1)
+            for item in items:
+                slots[(item['dt'] - start_ts) // FORECAST_SLOT_SECONDS] = self._parse_forecast_item(item)
+
+            forecast = ForecastSlots(start_ts, slots, time.time())
+            previous = self.forecasts.get(city)
+            if previous:
+                forecast.last_used = previous.last_used
+            self.forecasts[city] = forecast
+            return forecast
+        except UpstreamUnavailableError:
+            return None
         except Exception as e:
             print(f"Error getting weather forecast: {e}")
+            return None
+
+    async def get_forecast(self, city: str) -> ForecastSlots | None:
+        forecast = self.forecasts.get(city)
+        if forecast and time.time() - forecast.fetched_at < self.forecast_refresh_interval:
+            forecast.last_used = time.time()
+            return forecast
+
+        # Concurrent callers for the same city share one upstream request
+        task = self._forecast_refreshes.get(city)
+        if task is None:
+            task = asyncio.ensure_future(self.refresh_forecast(city))
+            self._forecast_refreshes[city] = task
+            task.add_done_callback(lambda _: self._forecast_refreshes.pop(city, None))
+
+        fresh = await asyncio.shield(task)
+        if fresh:
+            fresh.last_used = time.time()
+        return fresh or forecast
+
+    async def get_forecast_at(self, city: str, when: datetime) -> dict[str, Any] | None:
+        forecast = await self.get_forecast(city)
+        return forecast.at(when) if forecast else None
+
+    async def get_weather_forecast(self, city: str, hours_ahead: int = 24) -> list:
+        forecast = await self.get_forecast(city)
+        if not forecast:
             return []
 
+        now = datetime.now(timezone.utc)
+        return forecast.between(now, now + timedelta(hours=hours_ahead))
+
+    async def refresh_forecasts(self):
+        now = time.time()
+        for city, forecast in list(self.forecasts.items()):
+            if now - forecast.last_used > FORECAST_IDLE_EVICTION:
+                del self.forecasts[city]
+
+        semaphore = asyncio.Semaphore(self.batch_concurrency)
+
+        async def refresh(city: str):
+            async with semaphore:
+                await self.refresh_forecast(city)
+
+        await asyncio.gather(*(refresh(city) for city in list(self.forecasts)))
+
     def get_time_of_day(self, hour: int = None) -> str:
         if hour is None:
             hour = datetime.now().hour
@@ -146,8 +467,10 @@ class WeatherService:
         else:
             return "night"
 
-    async def get_weather_recommendation(self, city: str, time_of_day: str = None) -> str:
-        current_weather = await self.get_current_weather(city)
+    async def get_weather_recommendation(self, city: str, time_of_day: str = None,
+                                         current_weather: dict[str, Any] = None) -> str:
+        if current_weather is None:
+            current_weather = await self.get_current_weather(city)
 
         if not current_weather:
             return "Не удалось получить данные о погоде."